@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+推論バックエンド。検出関数は ``backend.predict(frame, seq=, imgsz=, classes=)`` で PerceptionResult を受け取り、
+どの形式のモデル (.pt / NCNN / ONNX) が動いているかを意識しない。
+
+    UltralyticsBackend : ultralytics の YOLO (.pt は torch、NCNN は ncnn で実行)
+    OnnxBackend        : ultralytics でエクスポートした ONNX を onnxruntime または cv2.dnn で実行する。
+                         torch も ultralytics も import しないため、起動が速くメモリも少ない
+
+ONNXの前処理 (レターボックス) と後処理 (YOLO11 の生出力のデコード・NMS・座標の復元) は
+NumPy と OpenCV だけで書いてあり、人物検出 (detect) と姿勢推定 (pose) で共通。
+"""
+import cv2
+import numpy as np
+
+from event_log import events
+from perception import PerceptionResult
+
+# ultralytics の predict の既定値に合わせる
+CONF_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.7
+MAX_DETECTIONS = 300
+LETTERBOX_COLOR = (114, 114, 114)
+NUM_KEYPOINTS = 17
+
+
+class InferenceBackend:
+    """バックエンドの共通インターフェース"""
+    name = "base"
+    batch_capable = False # 複数フレームを1回のフォワードで推論できるか
+
+    def predict(self, frame, seq: int = -1, imgsz: int = None, classes=None) -> PerceptionResult:
+        """
+        1フレームを推論する。
+        :param imgsz: 推論の入力サイズ (Noneならモデルの既定値)。固定サイズのモデルでは無視する
+        :param classes: 残すクラスIDのリスト (Noneなら全クラス)
+        """
+        raise NotImplementedError
+
+    def predict_batch(self, frames, seqs=None, classes=None):
+        """複数フレームを推論する。バッチ推論に対応していなければ1枚ずつ推論する"""
+        seqs = seqs if seqs is not None else [-1] * len(frames)
+        return [self.predict(frame, seq, classes=classes) for frame, seq in zip(frames, seqs)]
+
+
+class UltralyticsBackend(InferenceBackend):
+    """ultralytics の YOLO モデル (.pt / NCNN) のラッパー"""
+    def __init__(self, model, name: str = "pt", batch_capable: bool = True):
+        self.model = model
+        self.name = name
+        # NCNNバックエンドはバッチ入力の先頭画像しか推論しないため、1枚ずつ呼ぶ必要がある
+        self.batch_capable = batch_capable
+
+    def _kwargs(self, imgsz, classes):
+        kwargs = {"verbose": False}
+        if imgsz:
+            kwargs["imgsz"] = imgsz
+        if classes is not None:
+            kwargs["classes"] = classes
+        return kwargs
+
+    def predict(self, frame, seq: int = -1, imgsz: int = None, classes=None) -> PerceptionResult:
+        results = self.model(frame, **self._kwargs(imgsz, classes))
+        return PerceptionResult.from_ultralytics(results[0], seq)
+
+    def predict_batch(self, frames, seqs=None, classes=None):
+        if not self.batch_capable:
+            return super().predict_batch(frames, seqs, classes)
+        seqs = seqs if seqs is not None else [-1] * len(frames)
+        results = self.model(list(frames), **self._kwargs(None, classes))
+        return [PerceptionResult.from_ultralytics(r, seq) for r, seq in zip(results, seqs)]
+
+
+def letterbox(frame, imgsz: int):
+    """
+    縦横比を保って imgsz x imgsz に収め、余白を灰色で埋める (ultralytics の LetterBox と同じ配置)。
+    :return: (画像, 倍率, (左の余白, 上の余白))
+    """
+    h, w = frame.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    if (new_w, new_h) != (w, h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (imgsz - new_w) / 2, (imgsz - new_h) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+    return image, scale, (left, top)
+
+
+def preprocess(frame, imgsz: int):
+    """BGRフレーム -> (1, 3, imgsz, imgsz) float32 RGB 0-1 のブロブと、座標の復元に使う (倍率, 余白)"""
+    image, scale, pad = letterbox(frame, imgsz)
+    blob = cv2.dnn.blobFromImage(image, 1.0 / 255.0, swapRB=True)
+    return blob, scale, pad
+
+
+def decode(output, scale: float, pad, frame_shape, num_keypoints: int = 0, classes=None, seq: int = -1,
+           conf_threshold: float = CONF_THRESHOLD, iou_threshold: float = IOU_THRESHOLD) -> PerceptionResult:
+    """
+    YOLO11 の生出力をデコードする。
+    :param output: (4 + クラス数 + 関節数*3, アンカー数) の配列 (バッチの1枚分)。
+                   行は cx, cy, w, h, 各クラスのスコア, 各関節の x, y, 信頼度 (入力画像の座標)
+    :param num_keypoints: 姿勢推定なら17、人物検出なら0
+    """
+    pred = np.asarray(output, dtype=np.float32).T # (アンカー数, チャンネル数)
+    num_classes = pred.shape[1] - 4 - num_keypoints * 3
+    class_scores = pred[:, 4:4 + num_classes]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(pred)), class_ids]
+
+    keep = scores > conf_threshold
+    if classes is not None:
+        keep &= np.isin(class_ids, classes)
+    pred, scores, class_ids = pred[keep], scores[keep], class_ids[keep]
+
+    if len(pred):
+        # xywh (中心) -> 左上xywh。クラスごとにNMSするため、クラスIDに応じて座標をずらす
+        xywh = pred[:, :4].copy()
+        xywh[:, :2] -= xywh[:, 2:] / 2
+        shifted = np.hstack([xywh[:, :2] + (class_ids * 7680.0)[:, None], xywh[:, 2:]])
+        indices = cv2.dnn.NMSBoxes(shifted.tolist(), scores.tolist(), conf_threshold, iou_threshold)
+        indices = np.asarray(indices, dtype=np.intp).reshape(-1)[:MAX_DETECTIONS]
+        pred, scores, xywh = pred[indices], scores[indices], xywh[indices]
+        boxes = np.hstack([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]])
+    else:
+        boxes = np.zeros((0, 4), dtype=np.float32)
+
+    # レターボックスを外して元フレームの座標に戻す
+    h, w = frame_shape[:2]
+    pad_x, pad_y = pad
+    boxes = (boxes - (pad_x, pad_y, pad_x, pad_y)) / scale
+    np.clip(boxes[:, 0::2], 0, w, out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0, h, out=boxes[:, 1::2])
+
+    keypoints = None
+    if num_keypoints:
+        keypoints = pred[:, 4 + num_classes:].reshape(-1, num_keypoints, 3).copy()
+        keypoints[:, :, 0] = (keypoints[:, :, 0] - pad_x) / scale
+        keypoints[:, :, 1] = (keypoints[:, :, 1] - pad_y) / scale
+    return PerceptionResult(boxes.astype(np.float32, copy=False), keypoints, scores.astype(np.float32, copy=False),
+                            seq=seq)
+
+
+class OnnxBackend(InferenceBackend):
+    """
+    ONNXモデルを onnxruntime ("onnxruntime") または OpenCV DNN ("opencv") で実行する。
+    エクスポート時の入力サイズに固定される (cv2.dnn が動的な入力サイズに対応しないため) ので、predict の imgsz は無視する。
+    カスケードの1段目 (CASCADE_STAGE1_IMGSZ) やガバナーの推論サイズの縮小はONNXでは効かないため、
+    異なる imgsz を初めて受け取ったときに警告を出す。
+    """
+    def __init__(self, path: str, task: str, imgsz: int, engine: str = "onnxruntime"):
+        """
+        :param path: .onnx ファイル
+        :param task: "pose" または "detect"
+        :param imgsz: エクスポート時の入力サイズ
+        """
+        self.name = engine
+        self.imgsz = imgsz
+        self.num_keypoints = NUM_KEYPOINTS if task == "pose" else 0
+        self._ignored_imgsz = set() # 警告済みの imgsz
+        self.session = None
+        self.net = None
+        if engine == "onnxruntime":
+            import onnxruntime # 任意の依存。インストールされていなければ ImportError
+            self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+            self.input_name = self.session.get_inputs()[0].name
+        elif engine == "opencv":
+            self.net = cv2.dnn.readNetFromONNX(path)
+        else:
+            raise ValueError(f"unknown ONNX engine '{engine}' (expected 'onnxruntime' or 'opencv')")
+
+    def forward(self, blob):
+        """(1, 3, imgsz, imgsz) のブロブ -> (1, チャンネル数, アンカー数) の生出力"""
+        if self.session is not None:
+            return self.session.run(None, {self.input_name: blob})[0]
+        self.net.setInput(blob)
+        return self.net.forward()
+
+    def predict(self, frame, seq: int = -1, imgsz: int = None, classes=None) -> PerceptionResult:
+        if imgsz and imgsz != self.imgsz and imgsz not in self._ignored_imgsz:
+            self._ignored_imgsz.add(imgsz)
+            events.log("onnx_imgsz_ignored", f"ONNXモデルの入力サイズは {self.imgsz} 固定のため、imgsz={imgsz} は無視します",
+                       level="warning", requested=imgsz, model_imgsz=self.imgsz)
+        blob, scale, pad = preprocess(frame, self.imgsz)
+        output = self.forward(blob)
+        return decode(output[0], scale, pad, frame.shape, self.num_keypoints, classes, seq)
@@ -2,6 +2,8 @@
 import cv2
 import numpy as np
 
+from yuyv_capture import as_gray
+
 class FixedBackgroundSubtractor:
     """
     固定された単一の背景画像と比較して差分を検出するクラス。
@@ -18,22 +20,22 @@ class FixedBackgroundSubtractor:
     def set_background(self, background_frame):
         """
         比較の基準となる背景画像を設定します。
-        :param background_frame: 背景として設定するカラーフレーム
+        :param background_frame: 背景として設定するフレーム (カラー、グレースケール、または YuyvFrame)
         """
-        gray = cv2.cvtColor(background_frame, cv2.COLOR_BGR2GRAY)
+        gray = as_gray(background_frame)
         self.background_gray = cv2.GaussianBlur(gray, self.blur_ksize, 0)
         print("固定背景を設定しました。")
 
     def get_foreground_mask(self, frame):
         """
         現在のフレームと固定背景を比較し、前景マスク（動きがあった部分）を取得します。
-        :param frame: 現在のカラーフレーム
+        :param frame: 現在のフレーム (カラー、グレースケール、または YuyvFrame)
         :return: 前景マスク (二値化画像)
         """
         if self.background_gray is None:
             raise ValueError("背景が設定されていません。set_background()を先に呼び出してください。")
 
-        current_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        current_gray = as_gray(frame)
         current_gray = cv2.GaussianBlur(current_gray, self.blur_ksize, 0)
         
         frame_delta = cv2.absdiff(self.background_gray, current_gray)
@@ -62,9 +64,9 @@ class AdaptiveBackgroundSubtractor:
     def initialize_background(self, initial_frame):
         """
         最初のフレームで背景モデルを初期化します。
-        :param initial_frame: 最初のカラーフレーム
+        :param initial_frame: 最初のフレーム (カラー、グレースケール、または YuyvFrame)
         """
-        gray_frame = cv2.cvtColor(initial_frame, cv2.COLOR_BGR2GRAY)
+        gray_frame = as_gray(initial_frame)
         gray_frame = cv2.GaussianBlur(gray_frame, self.blur_ksize, 0)
         self.background_model = gray_frame.astype("float")
         print("適応的背景モデルを初期化しました。")
@@ -72,13 +74,13 @@ class AdaptiveBackgroundSubtractor:
     def get_foreground_mask(self, frame):
         """
         現在のフレームから前景マスク（動きがあった部分）を取得し、背景モデルを更新します。
-        :param frame: 現在のカラーフレーム
+        :param frame: 現在のフレーム (カラー、グレースケール、または YuyvFrame)
         :return: 前景マスク (二値化画像)
         """
         if self.background_model is None:
             raise ValueError("背景モデルが初期化されていません。initialize_background()を先に呼び出してください。")
 
-        current_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        current_gray = as_gray(frame)
         current_gray = cv2.GaussianBlur(current_gray, self.blur_ksize, 0)
 
         # 背景モデルをゆっくり更新
@@ -98,3 +100,104 @@ class AdaptiveBackgroundSubtractor:
         thresh = cv2.dilate(thresh, kernel, iterations=2)
 
         return thresh
+
+class StatisticalBackgroundSubtractor:
+    """
+    画素ごとの平均と分散を縮小した解像度で持ち、画素ごとに閾値を変える背景差分。
+
+    AdaptiveBackgroundSubtractor との違い:
+      - 閾値は一律ではなく、画素ごとの標準偏差の k 倍 (ちらつく場所は鈍く、安定した場所は敏感に)
+      - 背景モデルは float32 で縮小解像度 (既定1/4) に持ち、事前確保したバッファをその場で更新する
+      - フラッシュや日差しで画面全体の明るさが変わったとき (差分の中央値が大きくずれたとき) は、
+        全体を前景にせず、背景の平均をずれの分だけ平行移動する (rebase)
+      - 前景と判定した画素は更新率を下げて (alpha * foreground_rate) 背景に取り込む。
+        立ち止まった人はすぐには背景に溶けないが、画面の一部だけの照明の変化 (片側の日差し、点けたランプ) は
+        rebase されないので、前景のまま固まらないよう時間をかけて背景に戻す
+    get_foreground_mask() の入出力は他の差分器と同じ (入力フレームと同じ大きさの二値マスクを返す)。
+    """
+    def __init__(self, scale=0.25, alpha=0.02, k=3.0, min_std=8.0, initial_std=12.0, blur_ksize=(7, 7),
+                 illumination_jump=20.0, foreground_rate=0.1):
+        """
+        :param scale: 背景モデルの解像度 (入力に対する倍率)
+        :param alpha: 背景モデル (平均・分散) の更新率
+        :param k: 前景とみなす差分 (標準偏差の何倍か)
+        :param min_std: 標準偏差の下限 (ノイズの少ない画素が過敏になるのを防ぐ)
+        :param initial_std: 初期化直後の標準偏差
+        :param blur_ksize: 縮小後に掛けるガウシアンブラーのカーネルサイズ
+        :param illumination_jump: 差分の中央値がこれを超えたら照明の変化とみなして rebase する
+        :param foreground_rate: 前景と判定した画素の更新率 (alpha に対する倍率)
+        """
+        self.scale = scale
+        self.alpha = alpha
+        self.foreground_alpha = alpha * foreground_rate
+        self.k = k
+        self.min_var = min_std ** 2
+        self.initial_var = initial_std ** 2
+        self.blur_ksize = blur_ksize
+        self.illumination_jump = illumination_jump
+        self.mean = None
+        self.var = None
+        self.rebases = 0
+        self._full_size = None
+
+    def _small(self, frame):
+        gray = as_gray(frame)
+        h, w = gray.shape[:2]
+        small_size = (max(int(w * self.scale), 1), max(int(h * self.scale), 1))
+        small = cv2.resize(gray, small_size, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, self.blur_ksize, 0), (w, h)
+
+    def initialize_background(self, initial_frame):
+        """
+        最初のフレームで背景モデルを初期化し、作業用バッファを確保します。
+        :param initial_frame: 最初のフレーム (カラー、グレースケール、または YuyvFrame)
+        """
+        small, self._full_size = self._small(initial_frame)
+        self.mean = small.astype(np.float32)
+        self.var = np.full_like(self.mean, self.initial_var)
+        self._current = np.empty_like(self.mean)
+        self._diff = np.empty_like(self.mean)
+        self._sq = np.empty_like(self.mean)
+        self._limit = np.empty_like(self.mean)
+        self._foreground = np.empty(self.mean.shape, dtype=bool)
+        self._mask = np.empty(self.mean.shape, dtype=np.uint8)
+        self._background_mask = np.empty(self.mean.shape, dtype=np.uint8)
+        self._kernel = np.ones((3, 3), np.uint8)
+        print("統計的背景モデルを初期化しました。")
+
+    def get_foreground_mask(self, frame):
+        """
+        現在のフレームから前景マスク（動きがあった部分）を取得し、背景モデルを更新します。
+        :param frame: 現在のフレーム (カラー、グレースケール、または YuyvFrame)
+        :return: 前景マスク (二値化画像、入力フレームと同じ大きさ)
+        """
+        if self.mean is None:
+            raise ValueError("背景モデルが初期化されていません。initialize_background()を先に呼び出してください。")
+
+        small, full_size = self._small(frame)
+        np.copyto(self._current, small, casting="unsafe")
+        np.subtract(self._current, self.mean, out=self._diff)
+
+        # 画面全体の明るさが変わった: 背景の平均をずらして合わせる (前景で埋め尽くさない)
+        shift = float(np.median(self._diff))
+        if abs(shift) > self.illumination_jump:
+            self.mean += shift
+            self._diff -= shift
+            self.rebases += 1
+
+        # 差分^2 > k^2 * max(分散, 下限) を前景とする (平方根を取らずに比較する)
+        np.multiply(self._diff, self._diff, out=self._sq)
+        np.maximum(self.var, self.min_var, out=self._limit)
+        self._limit *= self.k * self.k
+        np.greater(self._sq, self._limit, out=self._foreground)
+        np.multiply(self._foreground, 255, out=self._mask, casting="unsafe")
+
+        # 背景と判定した画素は平均と分散を更新する。前景の画素は平均だけをゆっくり寄せる
+        # (前景の大きな差分を分散に入れると、閾値が広がって一気に背景に取り込まれてしまう)
+        cv2.bitwise_not(self._mask, dst=self._background_mask)
+        cv2.accumulateWeighted(self._current, self.mean, self.alpha, mask=self._background_mask)
+        cv2.accumulateWeighted(self._sq, self.var, self.alpha, mask=self._background_mask)
+        cv2.accumulateWeighted(self._current, self.mean, self.foreground_alpha, mask=self._mask)
+
+        mask = cv2.dilate(self._mask, self._kernel, iterations=1)
+        return cv2.resize(mask, full_size, interpolation=cv2.INTER_NEAREST)
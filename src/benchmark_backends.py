@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+推論バックエンド (.pt / NCNN / ONNX) の起動時間・メモリ・1フレームあたりのレイテンシを
+このマシンで比較し、最速のバックエンドを backend_benchmark.json に記録する。
+model_loader.load_model (backend="auto") は記録があればそれを使う。
+
+バックエンドごとに別プロセスで計測するため、torch の import 時間やメモリも含めて比べられる。
+
+使用例:
+    python src/export_logic.py --onnx        # ONNXも書き出しておく
+    python src/benchmark_backends.py --frames calibration_frames --count 50
+
+計測項目:
+    startup  : ライブラリの import とモデルのロードにかかった時間 (プロセス起動からの時間)
+    first    : 1回目の推論の時間 (初期化・メモリ確保を含む)
+    latency  : 2回目以降の推論時間の中央値と95パーセンタイル
+    rss      : 計測後のプロセスの常駐メモリ
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+
+_STARTED = time.perf_counter() # import の時間も起動時間に含める
+
+import numpy as np
+
+from model_loader import BACKEND_BENCHMARK_FILE, available_backends
+
+MODELS = {"yolo11n-pose": "pose", "yolo11n": "detect"}
+
+
+def load_frames(frames_dir: str, count: int):
+    """録画フレームがあればそれを、なければ合成フレームを使う"""
+    import cv2
+    from evaluate_variants import load_frames as load_recorded
+    frames = load_recorded(frames_dir, count) if os.path.isdir(frames_dir) else []
+    if not frames:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(count)]
+        for frame in frames:
+            cv2.rectangle(frame, (220, 60), (420, 470), (90, 60, 40), -1)
+    return frames
+
+
+def run_child(model_basename: str, task: str, backend: str, frames_dir: str, count: int, warmup: int):
+    """子プロセス側: 1つのバックエンドを計測し、結果をJSONで標準出力の最終行に書く"""
+    import psutil
+    from model_loader import load_model
+
+    frames = load_frames(frames_dir, count)
+    classes = [0] if task == "detect" else None
+    model = load_model(model_basename, task=task, backend=backend)
+    startup = time.perf_counter() - _STARTED
+
+    start = time.perf_counter()
+    model.predict(frames[0], classes=classes)
+    first_ms = (time.perf_counter() - start) * 1000.0
+    for frame in frames[1:1 + warmup]:
+        model.predict(frame, classes=classes)
+
+    latencies, people = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        result = model.predict(frame, classes=classes)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        people.append(len(result))
+
+    print(json.dumps({
+        "startup_sec": round(startup, 3),
+        "first_ms": round(first_ms, 2),
+        "latency_ms": round(float(np.median(latencies)), 2),
+        "latency_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "rss_mb": round(psutil.Process().memory_info().rss / 2 ** 20, 1),
+        "people_mean": round(float(np.mean(people)), 2),
+    }))
+
+
+def measure(model_basename: str, task: str, backend: str, args):
+    """親プロセス側: バックエンドごとに子プロセスを起動して結果を集める"""
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", model_basename, task, backend,
+           "--frames", args.frames, "--count", str(args.count), "--warmup", str(args.warmup)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        print(f"  {backend:<12} 失敗しました (exit {proc.returncode})")
+        print("    " + (proc.stderr.strip().splitlines() or ["(no output)"])[-1])
+        return None
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推論バックエンドの起動時間・メモリ・レイテンシを比較する")
+    parser.add_argument("--frames", default="calibration_frames", help="計測に使う録画フレームのフォルダ")
+    parser.add_argument("--count", type=int, default=50, help="計測するフレーム数")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--no-record", action="store_true", help=f"{BACKEND_BENCHMARK_FILE} に書き込まない")
+    parser.add_argument("--child", nargs=3, metavar=("MODEL", "TASK", "BACKEND"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child, args.frames, args.count, args.warmup)
+        return
+
+    record = {
+        "machine": platform.machine(),
+        "measured_at": datetime.now().isoformat(timespec="seconds"),
+        "results": {},
+        "winner": {},
+    }
+    for model_basename, task in MODELS.items():
+        backends = available_backends(model_basename)
+        if not backends:
+            print(f"{model_basename}: モデルが見つかりません。スキップします。")
+            continue
+        print(f"{model_basename}:")
+        results = {}
+        for backend in backends:
+            result = measure(model_basename, task, backend, args)
+            if result is None:
+                continue
+            results[backend] = result
+            print(f"  {backend:<12} startup={result['startup_sec']:.2f}s first={result['first_ms']:.0f}ms "
+                  f"latency={result['latency_ms']:.1f}ms (p95 {result['latency_p95_ms']:.1f}ms) "
+                  f"rss={result['rss_mb']:.0f}MB people={result['people_mean']}")
+        if not results:
+            continue
+        # 1フレームあたりのレイテンシが最も小さいものを勝者とする (起動時間とメモリは参考値)
+        winner = min(results, key=lambda b: results[b]["latency_ms"])
+        print(f"  -> winner: {winner}")
+        record["results"][model_basename] = results
+        record["winner"][model_basename] = winner
+
+    if record["winner"] and not args.no_record:
+        with open(BACKEND_BENCHMARK_FILE, "w") as f:
+            json.dump(record, f, indent=2)
+        print(f"記録しました: {BACKEND_BENCHMARK_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+単一プロセスのループとマルチプロセス・パイプラインのFPS/遅延を比較するベンチマーク。
+
+使用例:
+    python src/benchmark_pipeline.py --source synthetic --simulate-ms 120
+    python src/benchmark_pipeline.py --source 0 --duration 20
+
+計測項目:
+    fps          : 表示 (描画完了) したフレーム数 / 経過時間
+    latency      : キャプチャ時刻から描画完了までの時間 (end-to-end)
+    result_age   : 表示に使った推論結果の元フレームのキャプチャ時刻からの経過時間
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from multiprocess_pipeline import MultiProcessPipeline, TASK_GESTURE, open_source, _busy_wait
+from renderer import draw_gesture
+
+INFERENCE_INTERVAL = 5  # main.py と同じく5フレームに1回推論
+
+
+def _summarize(name, frames, elapsed, latencies, result_ages):
+    lat = np.array(latencies) * 1000.0
+    age = np.array(result_ages) * 1000.0 if result_ages else np.array([np.nan])
+    print(f"{name:<15} fps={frames / elapsed:6.1f}  "
+          f"latency p50={np.percentile(lat, 50):6.1f}ms p95={np.percentile(lat, 95):6.1f}ms  "
+          f"result_age p50={np.nanpercentile(age, 50):6.1f}ms")
+    return {"fps": frames / elapsed, "latency_p50_ms": float(np.percentile(lat, 50)),
+            "latency_p95_ms": float(np.percentile(lat, 95)),
+            "result_age_p50_ms": float(np.nanpercentile(age, 50))}
+
+
+def _draw(frame, index):
+    """main.py の UI 描画相当の負荷"""
+    cv2.putText(frame, f"Phase: READY {index}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    cv2.putText(frame, "Make a Circle to Start", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+
+
+def bench_single_process(args, camera_settings):
+    cap = open_source(args.source, camera_settings)
+    if args.simulate_ms is None:
+        from detect_circle_gesture import detect_circle_gesture
+
+    latencies, result_ages = [], []
+    result_capture_time = None
+    result = None
+    frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.duration:
+        ret, frame = cap.read()
+        capture_time = time.perf_counter()
+        if not ret:
+            continue
+        frame = cv2.flip(frame, 1)
+
+        if frames % INFERENCE_INTERVAL == 0:
+            if args.simulate_ms is not None:
+                _busy_wait(args.simulate_ms / 1000.0)
+            else:
+                result = detect_circle_gesture(frame)
+            result_capture_time = capture_time
+        draw_gesture(frame, result)
+        _draw(frame, frames)
+        if args.show:
+            cv2.imshow("benchmark", frame)
+            cv2.waitKey(1)
+
+        done = time.perf_counter()
+        latencies.append(done - capture_time)
+        if result_capture_time is not None:
+            result_ages.append(done - result_capture_time)
+        frames += 1
+    cap.release()
+    return _summarize("single-process", frames, time.perf_counter() - start, latencies, result_ages)
+
+
+def bench_multi_process(args, camera_settings):
+    shape = (camera_settings["height"], camera_settings["width"], 3)
+    pipeline = MultiProcessPipeline(args.source, camera_settings, shape=shape, simulate_ms=args.simulate_ms)
+    pipeline.start()
+    try:
+        # 子プロセスの起動とモデルロードを待つ
+        pipeline.read_latest(timeout=60.0)
+        pipeline.task.value = TASK_GESTURE
+        time.sleep(args.settle)
+
+        latencies, result_ages = [], []
+        result = None
+        frames = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < args.duration:
+            ret, frame = pipeline.read_latest()
+            if not ret:
+                continue
+            capture_ns = pipeline.capture_ns()
+            frame = cv2.flip(frame, 1)
+            if frames % INFERENCE_INTERVAL == 0:
+                result = pipeline.detect_circle_gesture(frame)
+            draw_gesture(frame, result)
+            _draw(frame, frames)
+            if args.show:
+                cv2.imshow("benchmark", frame)
+                cv2.waitKey(1)
+
+            done_ns = time.monotonic_ns()
+            if capture_ns is not None:
+                latencies.append((done_ns - capture_ns) / 1e9)
+            latest = pipeline.latest_result(TASK_GESTURE)
+            if latest is not None and latest["capture_ns"] is not None:
+                result_ages.append((done_ns - latest["capture_ns"]) / 1e9)
+            frames += 1
+        return _summarize("multi-process", frames, time.perf_counter() - start, latencies, result_ages)
+    finally:
+        pipeline.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="単一プロセス/マルチプロセスのFPS・遅延比較")
+    parser.add_argument("--source", default="synthetic", help='カメラインデックス または "synthetic"')
+    parser.add_argument("--fps", type=float, default=30.0, help="ソースのFPS")
+    parser.add_argument("--duration", type=float, default=10.0, help="各モードの計測時間 (秒)")
+    parser.add_argument("--settle", type=float, default=1.0, help="マルチプロセス計測前の待機時間 (秒)")
+    parser.add_argument("--simulate-ms", type=float, default=None,
+                        help="実モデルの代わりにこの時間CPUを消費する (モデルなしで比較する場合)")
+    parser.add_argument("--show", action="store_true", help="imshowも含めて計測する")
+    args = parser.parse_args()
+    if args.source != "synthetic":
+        args.source = int(args.source)
+
+    camera_settings = {"width": 640, "height": 480, "fps": args.fps, "buffersize": 1}
+    single = bench_single_process(args, camera_settings)
+    multi = bench_multi_process(args, camera_settings)
+    print(f"FPS比: x{multi['fps'] / single['fps']:.2f}  "
+          f"遅延p50: {single['latency_p50_ms']:.1f}ms -> {multi['latency_p50_ms']:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
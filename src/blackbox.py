@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+直近N秒のフレームと推論メタデータを記録し続けるブラックボックス・レコーダー。
+
+「撮ってくれなかった」と言われたときに後から確認できるよう、縮小したフレームと
+状態・ジェスチャー判定・bbox・処理時間を固定サイズのリングファイルへ書き込む。
+ファイルは np.memmap で開いておき、1フレームの記録は
+  - 縮小 (cv2.resize の出力先をmemmapのスロットに直接指定)
+  - 構造化配列1要素への代入
+だけで、エンコードやシステムコールは行わない。書き出しはOSのページキャッシュに任せるため、
+プロセスが落ちてもファイルには直前までの内容が残る。
+
+ファイルの構成: [ヘッダ (64バイト)] [メタデータ capacity件] [フレーム capacity枚]
+状態ごとのキャプチャ設定でFPSが変わるため、書き出し・再生のフレーム間隔は固定のFPSではなく
+各フレームの記録時刻 (timestamp) から求める。
+
+使用例:
+    python src/blackbox.py dump blackbox.ring --out blackbox_dump   # 動画とJSONタイムラインに書き出す
+    python src/blackbox.py replay blackbox.ring --show              # PhotoBoothAppに流し直して状態遷移を比較する
+"""
+import os
+import sys
+import json
+import argparse
+
+import cv2
+import numpy as np
+
+MAGIC = b"ASBOX001"
+MAX_PEOPLE = 4 # 1フレームあたりに記録する人数の上限
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"), ("capacity", "<u4"), ("width", "<u4"), ("height", "<u4"),
+    ("fps", "<f4"), ("count", "<u8"), # fps: 容量を決めた最大FPS。count: これまでに書き込んだ総フレーム数
+])
+HEADER_SIZE = 64
+
+META_DTYPE = np.dtype([
+    ("seq", "<i8"),             # PhotoBoothApp.frame_seq
+    ("timestamp", "<f8"),       # time.time()
+    ("state", "u1"),            # AppState の値
+    ("source", "u1"),           # bboxの出典 (0: なし, 1: ジェスチャー推論, 2: 人物検出)
+    ("people", "u1"),           # 検出人数 (MAX_PEOPLEを超える分は記録しない)
+    ("result_seq", "<i8"),      # 表示中の推論結果がどのフレーム由来か
+    ("boxes", "<f4", (MAX_PEOPLE, 4)), # 左右反転後の画像に対する正規化座標 (0-1) の xyxy
+    ("gesture_flags", "u1", (MAX_PEOPLE,)),
+    ("edge_flags", "u1", (MAX_PEOPLE,)),
+    ("frame_ms", "<f4"),        # process_frame の処理時間
+])
+
+SOURCE_NONE, SOURCE_GESTURE, SOURCE_DISTANCE = 0, 1, 2
+
+
+def _layout(capacity: int, width: int, height: int):
+    """(メタデータの位置, フレームの位置, ファイルサイズ)"""
+    meta_offset = HEADER_SIZE
+    frames_offset = meta_offset + META_DTYPE.itemsize * capacity
+    frames_offset = (frames_offset + 4095) // 4096 * 4096 # ページ境界にそろえる
+    return meta_offset, frames_offset, frames_offset + capacity * height * width * 3
+
+
+class BlackBoxRing:
+    """リングファイルのmemmap。レコーダーとリーダーの共通部分"""
+    def __init__(self, path: str, mode: str):
+        self.path = path
+        self.header = np.memmap(path, dtype=HEADER_DTYPE, mode=mode, shape=(1,))
+        if self.header["magic"][0] != MAGIC:
+            raise ValueError(f"{path} is not a black-box ring file")
+        self.capacity = int(self.header["capacity"][0])
+        self.width = int(self.header["width"][0])
+        self.height = int(self.header["height"][0])
+        self.fps = float(self.header["fps"][0])
+        meta_offset, frames_offset, _ = _layout(self.capacity, self.width, self.height)
+        self.meta = np.memmap(path, dtype=META_DTYPE, mode=mode, offset=meta_offset, shape=(self.capacity,))
+        self.frames = np.memmap(path, dtype=np.uint8, mode=mode, offset=frames_offset,
+                                shape=(self.capacity, self.height, self.width, 3))
+
+    @property
+    def count(self) -> int:
+        return int(self.header["count"][0])
+
+    def chronological_slots(self):
+        """古い順のスロット番号"""
+        count = self.count
+        n = min(count, self.capacity)
+        return [(count - n + i) % self.capacity for i in range(n)]
+
+
+class BlackBoxRecorder(BlackBoxRing):
+    """
+    常時記録用のレコーダー。同じ構成の既存ファイルがあれば続きから書く (再起動前の記録も残る)。
+    """
+    def __init__(self, path: str = "blackbox.ring", seconds: float = 60.0, fps: float = 5.0,
+                 size=(160, 120)):
+        """
+        :param seconds: 記録する秒数 (容量 = seconds * fps フレーム)
+        :param fps: 記録するフレームの最大FPS (状態によってFPSが変わる場合は最も高い値)
+        :param size: 縮小後のフレームサイズ (幅, 高さ)
+        """
+        capacity = max(1, int(seconds * fps))
+        width, height = size
+        if not self._compatible(path, capacity, width, height):
+            self._create(path, capacity, width, height, fps)
+        super().__init__(path, "r+")
+
+    @staticmethod
+    def _compatible(path, capacity, width, height) -> bool:
+        if not os.path.exists(path) or os.path.getsize(path) != _layout(capacity, width, height)[2]:
+            return False
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        return (header["magic"][0] == MAGIC and int(header["capacity"][0]) == capacity
+                and int(header["width"][0]) == width and int(header["height"][0]) == height)
+
+    @staticmethod
+    def _create(path, capacity, width, height, fps):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.truncate(_layout(capacity, width, height)[2])
+        header = np.memmap(path, dtype=HEADER_DTYPE, mode="r+", shape=(1,))
+        header[0] = (MAGIC, capacity, width, height, fps, 0)
+        header.flush()
+        del header
+
+    def record(self, frame, seq: int, timestamp: float, state: int, result=None, source: int = SOURCE_NONE,
+               frame_ms: float = 0.0):
+        """
+        1フレーム分を記録する。メタデータを書き終えてからカウンタを進めるので、
+        読み出し側がカウンタ以下のスロットを読めば書きかけのデータは見えない。
+        :param frame: 元のフレーム (BGR)。縮小してスロットへ直接書き込む
+        :param result: 表示中の PerceptionResult (なければNone)
+        """
+        count = self.count
+        slot = count % self.capacity
+        cv2.resize(frame, (self.width, self.height), dst=self.frames[slot], interpolation=cv2.INTER_NEAREST)
+
+        meta = self.meta[slot]
+        meta["seq"] = seq
+        meta["timestamp"] = timestamp
+        meta["state"] = state
+        meta["frame_ms"] = frame_ms
+        if result is None or len(result) == 0:
+            meta["source"] = SOURCE_NONE if result is None else source
+            meta["people"] = 0
+            meta["result_seq"] = -1 if result is None else result.seq
+        else:
+            n = min(len(result), MAX_PEOPLE)
+            meta["source"] = source
+            meta["people"] = n
+            meta["result_seq"] = result.seq
+            h, w = frame.shape[:2]
+            meta["boxes"][:n] = result.boxes[:n] / (w, h, w, h)
+            meta["gesture_flags"][:n] = result.gesture_flags[:n]
+            meta["edge_flags"][:n] = result.edge_flags[:n]
+        self.header["count"][0] = count + 1
+
+    def close(self):
+        self.header.flush()
+        self.meta.flush()
+        self.frames.flush()
+
+
+class BlackBoxReader(BlackBoxRing):
+    """記録済みリングの読み出し (読み取り専用)"""
+    def __init__(self, path: str):
+        super().__init__(path, "r")
+
+    def __iter__(self):
+        """(メタデータ, フレーム) を古い順に返す"""
+        for slot in self.chronological_slots():
+            yield self.meta[slot], self.frames[slot]
+
+    def timeline(self, state_names=None):
+        """JSONに書き出せる形のタイムライン"""
+        events = []
+        for meta, _ in self:
+            n = int(meta["people"])
+            state = int(meta["state"])
+            events.append({
+                "seq": int(meta["seq"]),
+                "timestamp": float(meta["timestamp"]),
+                "state": state_names.get(state, state) if state_names else state,
+                "source": ["none", "gesture", "distance"][int(meta["source"])],
+                "result_seq": int(meta["result_seq"]),
+                "boxes": meta["boxes"][:n].astype(float).round(4).tolist(),
+                "gesture_flags": meta["gesture_flags"][:n].astype(bool).tolist(),
+                "edge_flags": meta["edge_flags"][:n].astype(bool).tolist(),
+                "frame_ms": round(float(meta["frame_ms"]), 2),
+            })
+        return events
+
+
+def frame_durations(timestamps, fps: float, max_gap_sec: float = 1.0):
+    """
+    各フレームを表示しておく時間 (秒)。次のフレームの記録時刻との差で、最後のフレームは 1/fps。
+    再起動などで記録が途切れた間隔は max_gap_sec に切り詰める
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if len(timestamps) == 0:
+        return np.zeros(0)
+    durations = np.append(np.diff(timestamps), 1.0 / fps)
+    return np.clip(durations, 0.0, max_gap_sec)
+
+
+def state_fps(timeline) -> dict:
+    """記録時刻の間隔から求めた状態ごとのFPS (中央値)。{状態: fps}"""
+    intervals = {}
+    for event, following in zip(timeline, timeline[1:]):
+        dt = following["timestamp"] - event["timestamp"]
+        if event["state"] == following["state"] and 0 < dt < 1.0:
+            intervals.setdefault(event["state"], []).append(dt)
+    return {state: 1.0 / float(np.median(dts)) for state, dts in intervals.items()}
+
+
+def _state_names():
+    from main import AppState
+    return {s.value: s.name for s in AppState}
+
+
+def dump(path: str, out_dir: str, scale: int = 4):
+    """リングを動画 (mp4) とJSONタイムラインに書き出す。動画はUIと同じく左右反転し、bboxと状態を描く"""
+    reader = BlackBoxReader(path)
+    names = _state_names()
+    os.makedirs(out_dir, exist_ok=True)
+
+    timeline = reader.timeline(names)
+    with open(os.path.join(out_dir, "timeline.json"), "w") as f:
+        json.dump({"fps": reader.fps, "frames": timeline}, f, indent=1)
+
+    size = (reader.width * scale, reader.height * scale)
+    # 動画は最大FPSで書き、記録時刻の間隔に合わせて同じフレームを繰り返す (FPSが変わっても実時間で再生される)
+    writer = cv2.VideoWriter(os.path.join(out_dir, "blackbox.mp4"), cv2.VideoWriter_fourcc(*"mp4v"),
+                             reader.fps, size)
+    durations = frame_durations([event["timestamp"] for event in timeline], reader.fps)
+    written = 0.0 # 書き込んだ動画の長さ (フレーム数)
+    elapsed = 0.0 # 記録上の経過時間をフレーム数に換算したもの
+    for event, duration, (_, frame) in zip(timeline, durations, reader):
+        view = cv2.flip(cv2.resize(frame, size, interpolation=cv2.INTER_NEAREST), 1)
+        for box, edge, gesture in zip(event["boxes"], event["edge_flags"], event["gesture_flags"]):
+            color = (0, 0, 255) if edge else ((0, 255, 255) if gesture else (0, 255, 0))
+            x1, y1, x2, y2 = (int(v * s) for v, s in zip(box, size * 2))
+            cv2.rectangle(view, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(view, f"{event['state']} seq={event['seq']} {event['frame_ms']:.0f}ms", (10, 25),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        elapsed += duration * reader.fps
+        while written < round(elapsed) or written == 0:
+            writer.write(view)
+            written += 1
+    writer.release()
+    print(f"{len(timeline)} frames -> {out_dir}/blackbox.mp4, {out_dir}/timeline.json")
+
+
+def replay(path: str, show: bool = False):
+    """記録したフレームを PhotoBoothApp.process_frame に流し直し、状態遷移を記録と比較する"""
+    from main import Config, PhotoBoothApp
+
+    reader = BlackBoxReader(path)
+    names = _state_names()
+    config = Config(METRICS_PORT=0, GOVERNOR_ENABLED=False, BLACKBOX_ENABLED=False)
+    app = PhotoBoothApp(config)
+    size = (config.RESOLUTION_WIDTH, config.RESOLUTION_HEIGHT)
+
+    # 記録時と同じFPSでタイマーを換算する (状態ごとのキャプチャ設定で記録中のFPSは変わる)
+    timeline = reader.timeline(names)
+    fps_by_state = state_fps(timeline)
+    durations = frame_durations([event["timestamp"] for event in timeline], reader.fps)
+
+    mismatches = 0
+    for (meta, frame), duration in zip(reader, durations):
+        app.active_fps = fps_by_state.get(app.state.name, float(config.FPS))
+        shown = app.process_frame(cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR))
+        recorded = names.get(int(meta["state"]), int(meta["state"]))
+        if app.state.name != recorded:
+            mismatches += 1
+            print(f"seq={int(meta['seq'])}: recorded {recorded}, replayed {app.state.name}")
+        if show:
+            cv2.imshow("Black-box replay", shown)
+            if cv2.waitKey(max(1, int(duration * 1000))) & 0xFF == ord('q'):
+                break
+    print(f"replay finished: {mismatches} state mismatches")
+    cv2.destroyAllWindows()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ブラックボックスのリングファイルを書き出す/再生する")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_dump = sub.add_parser("dump", help="動画とJSONタイムラインに書き出す")
+    p_dump.add_argument("path")
+    p_dump.add_argument("--out", default="blackbox_dump")
+    p_replay = sub.add_parser("replay", help="PhotoBoothAppに流し直して状態遷移を比較する")
+    p_replay.add_argument("path")
+    p_replay.add_argument("--show", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "dump":
+        dump(args.path, args.out)
+    else:
+        replay(args.path, args.show)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+連写してベストショットを選ぶ。
+
+カウントダウン終了の瞬間は体が動いていてブレやすい。シャッターの前後 K フレームを連写し、
+一番良いものを保存する。
+  - フレームは事前確保したバッファ (FramePool) にコピーするだけで、描画ループでは判定しない
+  - 判定はスレッドプールで並列に行う (OpenCVの処理はGILを解放する)。
+    対象は人物の範囲 (ROI) だけで、ラプラシアンの分散 (ピントの鋭さ) と、
+    関節点による判定 (顔が見えているか・画面端にいないか) を組み合わせる
+  - 描画ループは poll() で完了を確かめるだけで、判定を待たない
+選定にかかった時間 (シャッター -> 保存) はメトリクス (autoshutter_stage_seconds{stage="burst_select"}) に記録する。
+
+関節点は各フレームでは推論せず、シャッター直前の推論結果を使う
+(K枚すべてを姿勢推定するとRaspberry Piではクールダウン中に終わらないため)。
+"""
+import os
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import metrics
+from event_log import events
+
+# COCOの関節番号: 鼻, 左目, 右目
+FACE_KEYPOINTS = (0, 1, 2)
+KEYPOINT_CONF = 0.5
+EDGE_PENALTY = 0.5 # 画面端にいる人がいるフレームのスコアに掛ける
+
+
+class FramePool:
+    """
+    同じ形のフレームバッファを事前に確保して使い回す。
+    acquire() で借り、使い終わったら release() で返す。空きがなければNone
+    """
+    def __init__(self, shape, count: int):
+        self.shape = tuple(shape)
+        self._buffers = [np.empty(self.shape, dtype=np.uint8) for _ in range(count)]
+        self._free = list(range(count))
+
+    def acquire(self):
+        if not self._free:
+            return None
+        return self._free.pop()
+
+    def release(self, index: int):
+        self._free.append(index)
+
+    def buffer(self, index: int) -> np.ndarray:
+        return self._buffers[index]
+
+    @property
+    def available(self) -> int:
+        return len(self._free)
+
+
+def laplacian_variance(gray) -> float:
+    """ピントの鋭さ。ブレ・ピンボケで小さくなる"""
+    _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+    return float(std[0, 0] ** 2)
+
+
+def subject_roi(result, shape, pad: int = 10):
+    """全員を囲む範囲 (x1, y1, x2, y2)。人がいなければフレーム全体"""
+    h, w = shape[:2]
+    if result is None or len(result) == 0:
+        return 0, 0, w, h
+    boxes = result.boxes
+    x1 = max(int(boxes[:, 0].min()) - pad, 0)
+    y1 = max(int(boxes[:, 1].min()) - pad, 0)
+    x2 = min(int(boxes[:, 2].max()) + pad, w)
+    y2 = min(int(boxes[:, 3].max()) + pad, h)
+    if x2 - x1 < 8 or y2 - y1 < 8:
+        return 0, 0, w, h
+    return x1, y1, x2, y2
+
+
+def face_patches(result, shape):
+    """顔が見えている人 (鼻と両目の信頼度が高い) ごとの顔の範囲のリストと、見えていない人の数"""
+    if result is None or result.keypoints is None or len(result) == 0:
+        return [], 0
+    h, w = shape[:2]
+    face = result.keypoints[:, FACE_KEYPOINTS, :]
+    visible = (face[:, :, 2] >= KEYPOINT_CONF).all(axis=1)
+    patches = []
+    for points in face[visible]:
+        # 目の間隔を基準に顔の大きさを見積もる
+        size = max(int(abs(points[1, 0] - points[2, 0]) * 2.5), 12)
+        cx, cy = int(points[0, 0]), int(points[0, 1])
+        x1, y1 = max(cx - size, 0), max(cy - size, 0)
+        x2, y2 = min(cx + size, w), min(cy + size, h)
+        if x2 - x1 >= 4 and y2 - y1 >= 4:
+            patches.append((x1, y1, x2, y2))
+    return patches, int((~visible).sum())
+
+
+def at_edge(result, width: int, margin: int) -> bool:
+    """bbox が画面の左右端から margin 以内に入っている人がいるか (measure_distance の判定と同じ)"""
+    x1, x2 = result.boxes[:, 0], result.boxes[:, 2]
+    return bool(((x1 < margin) | (x2 > width - margin)).any())
+
+
+def score_frame(frame, result, margin: int = 50) -> float:
+    """
+    1枚のスコア (大きいほど良い)。
+    人物範囲のピントの鋭さに、顔が見えている人の顔の鋭さを混ぜ、
+    顔が見えていない人の割合と画面端にいる人の有無で減点する。
+    端の判定は bbox から行う (シャッター直前の結果は姿勢推定なので edge_flags を持たない)。
+    :param margin: 画面端とみなす幅 (px)
+    """
+    x1, y1, x2, y2 = subject_roi(result, frame.shape)
+    gray = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+    score = laplacian_variance(gray)
+
+    patches, hidden = face_patches(result, frame.shape)
+    # ROI内の座標に直して、ROIからはみ出した部分は切り捨てる
+    faces = [gray[max(py1 - y1, 0):py2 - y1, max(px1 - x1, 0):px2 - x1] for px1, py1, px2, py2 in patches]
+    faces = [face for face in faces if min(face.shape) >= 4]
+    if faces:
+        score = 0.5 * score + 0.5 * float(np.mean([laplacian_variance(face) for face in faces]))
+    if result is not None and len(result):
+        score *= 1.0 - 0.5 * hidden / len(result)
+        if at_edge(result, frame.shape[1], margin):
+            score *= EDGE_PENALTY
+    return float(score)
+
+
+class BurstCapture:
+    """
+    シャッターの前 before フレームと、シャッター以降の (frames - before) フレームを連写して、ベストショットを保存する。
+
+    使い方 (描画ループ):
+        burst.arm(result)       # カウントダウン開始時
+        burst.add(frame)        # 毎フレーム (描画前のフレーム。armしていなければ何もしない)
+        burst.shutter(result)   # シャッターの瞬間 (そのフレームを add した後)
+        burst.poll()            # 毎フレーム。選定が終わっていれば保存先のパスを返す
+    """
+    def __init__(self, shape, frames: int = 5, before: int = 2, workers: int = 2, out_dir: str = "photos",
+                 margin: int = 50):
+        """
+        :param shape: フレームの形 (H, W, 3)
+        :param frames: 連写する枚数
+        :param before: そのうちシャッターより前のフレーム数
+        :param margin: 画面端とみなす幅 (px)。この範囲に入っている人がいるフレームは減点する
+        """
+        self.frames = frames
+        self.before = before
+        self.margin = margin
+        self.out_dir = out_dir
+        # 選定・保存中に次の連写が始まっても足りるように2回分確保する
+        self.pool = FramePool(shape, frames * 2)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="burst")
+        self.result = None
+        self.collecting = False
+        self._slots = [] # 連写したフレームのバッファ番号 (古い順)
+        self._remaining = None # シャッター後にあと何枚撮るか (シャッター前はNone)
+        self._shutter_at = None
+        self._scoring = None # (シャッター時刻, バッファ番号のリスト, スコアのFuture)
+        self._saving = None
+        self.last_path = None
+        self.last_elapsed = None
+
+    def arm(self, result=None):
+        """シャッター前のフレームの記録を始める"""
+        self.disarm()
+        self.result = result
+        self.collecting = True
+
+    def disarm(self):
+        """記録中のフレームを捨てる (カウントダウンの中断など)"""
+        for slot in self._slots:
+            self.pool.release(slot)
+        self._slots = []
+        self._remaining = None
+        self.collecting = False
+
+    def add(self, frame):
+        """フレームをバッファへコピーする。シャッター前は直近 before + 1 枚だけを残す"""
+        if not self.collecting or frame.shape != self.pool.shape:
+            return
+        if self._remaining is None and len(self._slots) > self.before:
+            slot = self._slots.pop(0) # 一番古いバッファを使い回す
+        else:
+            slot = self.pool.acquire()
+            if slot is None:
+                return # 前回の選定がまだバッファを使っている
+        np.copyto(self.pool.buffer(slot), frame)
+        self._slots.append(slot)
+        if self._remaining is not None:
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._submit()
+
+    def shutter(self, result=None):
+        """シャッターの瞬間。直前に add したフレームまでが「前」になる"""
+        if not self.collecting:
+            return
+        if result is not None:
+            self.result = result
+        self._shutter_at = time.monotonic()
+        self._remaining = self.frames - len(self._slots)
+        if self._remaining <= 0:
+            self._submit()
+
+    def _submit(self):
+        slots, self._slots = self._slots, []
+        self.collecting = False
+        self._remaining = None
+        futures = [self.executor.submit(score_frame, self.pool.buffer(slot), self.result, self.margin)
+                   for slot in slots]
+        self._scoring = (self._shutter_at, slots, futures)
+
+    def poll(self):
+        """
+        選定が終わっていれば、ベストショットの保存を依頼して他のバッファを返す。描画ループから毎フレーム呼ぶ。
+        :return: 保存が完了したファイルのパス (それ以外はNone)
+        """
+        if self._scoring is not None and all(f.done() for f in self._scoring[2]):
+            shutter_at, slots, futures = self._scoring
+            self._scoring = None
+            scores = [f.result() for f in futures]
+            best = int(np.argmax(scores))
+            for i, slot in enumerate(slots):
+                if i != best:
+                    self.pool.release(slot)
+            self._saving = (shutter_at, slots[best], self.executor.submit(self._save, slots[best]))
+            events.log("burst_select", f"{len(scores)}枚から{best + 1}枚目を選びました", scores=[round(s) for s in scores])
+
+        if self._saving is not None and self._saving[2].done():
+            shutter_at, slot, future = self._saving
+            self._saving = None
+            self.pool.release(slot)
+            self.last_elapsed = time.monotonic() - shutter_at
+            metrics.observe_stage("burst_select", self.last_elapsed)
+            try:
+                self.last_path = future.result()
+            except Exception as e:
+                events.log("burst_save_failed", "保存に失敗しました", level="error", error=repr(e))
+                return None
+            return self.last_path
+        return None
+
+    @property
+    def busy(self) -> bool:
+        return self.collecting or self._scoring is not None or self._saving is not None
+
+    def _save(self, slot: int) -> str:
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, datetime.now().strftime("photo_%Y%m%d_%H%M%S_%f.jpg"))
+        if not cv2.imwrite(path, self.pool.buffer(slot)):
+            raise OSError(f"cv2.imwrite failed: {path}")
+        return path
+
+    def wait(self, timeout: float = 5.0):
+        """選定と保存が終わるまで待つ (終了時・テスト用)"""
+        deadline = time.monotonic() + timeout
+        while (self._scoring is not None or self._saving is not None) and time.monotonic() < deadline:
+            self.poll()
+            time.sleep(0.005)
+        return self.last_path
+
+    def close(self):
+        self.wait()
+        self.executor.shutdown(wait=True)
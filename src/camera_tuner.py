@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+カメラのフォーマット (FOURCC)・解像度・FPS の自動チューニング。
+
+カメラは set() した値をそのまま受け入れるとは限らず、YUYV と MJPG のどちらが
+CPU負荷が低く実FPSが高いかも機種によって異なる。そこで候補の組み合わせごとに
+  - 実際に配信されたFPS
+  - 1フレームあたりの read() の待ち時間
+  - 1フレームあたりのCPU時間 (デコード負荷)
+を計測し、最良のプロファイルをデバイスごとにローカルファイルへキャッシュする。
+次回以降の起動ではキャッシュを読むだけなので計測は行わない。
+
+使用例:
+    python src/camera_tuner.py --camera 0            # 計測してキャッシュを更新
+    python src/camera_tuner.py --camera 0 --all      # 解像度も含めて全組み合わせを計測
+"""
+import os
+import json
+import time
+import glob
+import argparse
+from dataclasses import dataclass, asdict
+
+import cv2
+
+PROFILE_CACHE_FILE = ".camera_profiles.json"
+FOURCC_CANDIDATES = ["MJPG", "YUYV"]
+FPS_CANDIDATES = [5, 15, 30]
+RESOLUTION_CANDIDATES = [(640, 480), (800, 600), (1280, 720)]
+
+
+@dataclass
+class CameraProfile:
+    fourcc: str
+    width: int
+    height: int
+    fps: int                     # 要求したFPS
+    measured_fps: float = 0.0    # 実際に配信されたFPS
+    read_latency_ms: float = 0.0 # read() 1回あたりの平均時間
+    cpu_ms_per_frame: float = 0.0
+    honored: bool = False        # 要求した解像度で配信されたか
+
+    def apply(self, cap):
+        """プロファイルをカメラに設定する"""
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        cap.set(cv2.CAP_PROP_FPS, self.fps)
+
+
+def device_identity(camera_index: int) -> str:
+    """
+    デバイスを識別するキー。/dev/v4l/by-id のシンボリックリンク名 (機種とシリアル番号を含む) を優先し、
+    なければ sysfs のデバイス名、それもなければインデックスを使う。
+    """
+    dev = os.path.realpath(f"/dev/video{camera_index}")
+    for link in sorted(glob.glob("/dev/v4l/by-id/*")):
+        if os.path.realpath(link) == dev:
+            return os.path.basename(link)
+    try:
+        with open(f"/sys/class/video4linux/video{camera_index}/name", "r") as f:
+            return f"{f.read().strip()}@video{camera_index}"
+    except OSError:
+        return f"index:{camera_index}"
+
+
+def load_cached_profile(identity: str, path: str = PROFILE_CACHE_FILE):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            data = json.load(f).get(identity)
+        return CameraProfile(**data) if data else None
+    except (OSError, ValueError, TypeError) as e:
+        print(f"[CameraTuner] Warning: failed to read {path}: {e}")
+        return None
+
+
+def save_cached_profile(identity: str, profile: CameraProfile, path: str = PROFILE_CACHE_FILE):
+    data = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+    data[identity] = asdict(profile)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def measure_profile(cap, profile: CameraProfile, frames: int = 20, warmup: int = 5) -> CameraProfile:
+    """プロファイルを適用し、実FPS・read時間・CPU時間を計測する"""
+    profile.apply(cap)
+    for _ in range(warmup):
+        cap.read()
+
+    received = 0
+    shape = None
+    read_total = 0.0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(frames):
+        t0 = time.perf_counter()
+        ret, frame = cap.read()
+        read_total += time.perf_counter() - t0
+        if ret:
+            received += 1
+            shape = frame.shape
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    profile.measured_fps = received / wall if wall > 0 else 0.0
+    profile.read_latency_ms = read_total / frames * 1000.0
+    profile.cpu_ms_per_frame = cpu / received * 1000.0 if received else float("inf")
+    profile.honored = shape is not None and shape[1] == profile.width and shape[0] == profile.height
+    return profile
+
+
+def select_best(profiles, target_size, target_fps: float):
+    """
+    要求解像度で配信され、目標FPS (の9割) を満たすものの中からCPU時間が最小のものを選ぶ。
+    満たすものがなければ、要求解像度で配信されたものの中で最もFPSが高いものを選ぶ。
+    """
+    valid = [p for p in profiles if p.honored and (p.width, p.height) == tuple(target_size)]
+    good = [p for p in valid if p.measured_fps >= target_fps * 0.9]
+    if good:
+        return min(good, key=lambda p: (p.cpu_ms_per_frame, p.fps))
+    if valid:
+        return max(valid, key=lambda p: p.measured_fps)
+    return None
+
+
+def tune(cap, target_size, target_fps: int, resolutions=None, frames: int = 20, verbose: bool = True):
+    """候補の組み合わせをすべて計測し、最良のプロファイルを返す (見つからなければNone)"""
+    resolutions = resolutions or [tuple(target_size)]
+    fps_candidates = sorted(set(FPS_CANDIDATES + [target_fps]))
+    profiles = []
+    for fourcc in FOURCC_CANDIDATES:
+        for width, height in resolutions:
+            for fps in fps_candidates:
+                if fps < target_fps:
+                    continue
+                p = measure_profile(cap, CameraProfile(fourcc, width, height, fps), frames)
+                profiles.append(p)
+                if verbose:
+                    print(f"[CameraTuner] {fourcc} {width}x{height}@{fps}: "
+                          f"{p.measured_fps:5.1f}fps read={p.read_latency_ms:5.1f}ms "
+                          f"cpu={p.cpu_ms_per_frame:5.2f}ms {'OK' if p.honored else 'NOT HONORED'}")
+    return select_best(profiles, target_size, target_fps)
+
+
+def get_or_tune_profile(cap, camera_index: int, target_size, target_fps: int, force: bool = False):
+    """
+    キャッシュ済みのプロファイルがあればそれを、なければ計測して保存したものを返す。
+    """
+    identity = device_identity(camera_index)
+    if not force:
+        profile = load_cached_profile(identity)
+        if profile is not None and (profile.width, profile.height) == tuple(target_size) and profile.fps >= target_fps:
+            print(f"[CameraTuner] キャッシュ済みプロファイルを使用: {identity} -> "
+                  f"{profile.fourcc} {profile.width}x{profile.height}@{profile.fps}")
+            return profile
+
+    print(f"[CameraTuner] カメラ {identity} の最適な設定を計測中...")
+    profile = tune(cap, target_size, target_fps)
+    if profile is not None:
+        save_cached_profile(identity, profile)
+        print(f"[CameraTuner] 選択: {profile.fourcc} {profile.width}x{profile.height}@{profile.fps} "
+              f"({profile.measured_fps:.1f}fps, cpu {profile.cpu_ms_per_frame:.2f}ms/frame)")
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="カメラのFOURCC/解像度/FPSを計測して最良の設定をキャッシュする")
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--fps", type=int, default=5, help="目標FPS")
+    parser.add_argument("--frames", type=int, default=20, help="1つの組み合わせあたりの計測フレーム数")
+    parser.add_argument("--all", action="store_true", help="目標以外の解像度も計測して一覧表示する")
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.camera)
+    if not cap.isOpened():
+        print(f"エラー: カメラ(インデックス: {args.camera})を開けませんでした。")
+        return
+    try:
+        target = (args.width, args.height)
+        resolutions = RESOLUTION_CANDIDATES if args.all else None
+        if args.all and target not in resolutions:
+            resolutions = resolutions + [target]
+        profile = tune(cap, target, args.fps, resolutions, args.frames)
+        if profile is None:
+            print("要求解像度で配信できる設定が見つかりませんでした。")
+            return
+        identity = device_identity(args.camera)
+        save_cached_profile(identity, profile)
+        print(f"{identity}: {profile.fourcc} {profile.width}x{profile.height}@{profile.fps} を保存しました "
+              f"({PROFILE_CACHE_FILE})")
+    finally:
+        cap.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+状態ごとのキャプチャ設定 (解像度・FPS・露出)。
+
+READYで待っている間は低いFPSで十分だが、撮影前のカウントダウンでは鏡のように滑らかに映したい。
+そこで状態ごとにプロファイルを宣言し、状態遷移のたびにカメラへ適用する。
+
+カメラは set() した値を受け入れるとは限らず、設定の変更にはストリームの再起動を伴うことが多い。
+  - 起動時に全プロファイルを一度ずつ適用して、実際に配信された解像度・FPSを確かめ (検証)、
+    結果をデバイスごとにローカルファイルへキャッシュする。次回以降の起動では検証を省略する
+  - 切り替えでは現在の設定と異なる項目だけを set() する
+  - 解像度を受け入れなかったプロファイルは使わず、FPSはカメラが実際に出せる値 (有効FPS) を使う
+切り替えにかかった時間は profiler (capture_switch) で計測し、メトリクスにも流れる。
+"""
+import os
+import json
+import time
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import cv2
+
+from profiler import profiler
+from camera_tuner import device_identity
+
+PROFILE_CACHE_FILE = ".capture_profiles.json"
+
+
+@dataclass(frozen=True)
+class CaptureProfile:
+    width: int
+    height: int
+    fps: int
+    exposure: Optional[int] = None # Noneなら base の露出 (Config.EXPOSURE_VAL)
+
+    @property
+    def key(self) -> str:
+        return f"{self.width}x{self.height}@{self.fps}" + (f"/e{self.exposure}" if self.exposure is not None else "")
+
+
+# AppState の名前 -> プロファイル。ここにない状態は Config の解像度・FPS を使う
+STATE_PROFILES = {
+    "READY": CaptureProfile(640, 480, 5),            # 待機中は省電力
+    "ADJUST": CaptureProfile(640, 480, 10),
+    "TAKE_PICTURE": CaptureProfile(640, 480, 15),    # カウントダウン中は滑らかに
+    "PICTURE_COOLDOWN": CaptureProfile(640, 480, 15),
+    "RESULT": CaptureProfile(640, 480, 5),
+}
+
+
+def _load_cache(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[CaptureProfiles] Warning: failed to read {path}: {e}")
+        return {}
+
+
+class CaptureProfileSwitcher:
+    """
+    検証済みのプロファイルをカメラへ適用する。
+    """
+    def __init__(self, cap, identity: str, base: CaptureProfile, profiles: dict = None,
+                 cache_path: str = PROFILE_CACHE_FILE, verify_frames: int = 3):
+        """
+        :param identity: デバイスを識別するキー (camera_tuner.device_identity)
+        :param base: 現在カメラに設定されているプロファイル (open_camera で適用したもの)
+        :param profiles: 状態名 -> CaptureProfile。省略時は STATE_PROFILES
+        :param verify_frames: 検証時に読み捨てるフレーム数
+        """
+        self.cap = cap
+        self.identity = identity
+        self.base = base
+        self.profiles = STATE_PROFILES if profiles is None else profiles
+        self.cache_path = cache_path
+        self.verify_frames = verify_frames
+        self.current = base
+        self.validated = {} # key -> {"honored": bool, "fps": 実FPS}
+        self.switch_times = []
+
+    @classmethod
+    def for_camera(cls, cap, camera_index: int, base: CaptureProfile, **kwargs):
+        return cls(cap, device_identity(camera_index), base, **kwargs)
+
+    def validate_all(self, force: bool = False):
+        """
+        全プロファイルを検証する (キャッシュ済みのものは省略)。終わったら base に戻す。
+        """
+        cache = _load_cache(self.cache_path)
+        known = {} if force else cache.get(self.identity, {})
+        pending = [p for p in set(self.profiles.values()) if p.key not in known]
+        self.validated = dict(known)
+        if not pending:
+            return self.validated
+
+        print(f"[CaptureProfiles] {len(pending)} 個のプロファイルを検証中...")
+        for profile in sorted(pending, key=lambda p: p.key):
+            self._set(profile)
+            # 数フレーム読んで設定を反映させてから、実際の値を確かめる
+            # (生YUYVキャプチャではフレームの形が (1, N) になるため、プロパティで判定する)
+            received = sum(bool(self.cap.read()[0]) for _ in range(self.verify_frames))
+            size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            honored = received > 0 and size == (profile.width, profile.height)
+            reported = self.cap.get(cv2.CAP_PROP_FPS) or profile.fps
+            self.validated[profile.key] = {"honored": honored, "fps": min(float(reported), float(profile.fps))}
+            print(f"[CaptureProfiles] {profile.key}: {'OK' if honored else 'NOT HONORED'} "
+                  f"({self.validated[profile.key]['fps']:.1f}fps)")
+        self._set(self.base)
+
+        cache[self.identity] = self.validated
+        with open(self.cache_path, "w") as f:
+            json.dump(cache, f, indent=2)
+        return self.validated
+
+    def profile_for(self, state_name: str) -> CaptureProfile:
+        """状態に使うプロファイル。未定義・検証で不合格なら base"""
+        profile = self.profiles.get(state_name, self.base)
+        info = self.validated.get(profile.key)
+        if info is not None and not info["honored"]:
+            return self.base
+        return profile
+
+    def fps_of(self, profile: CaptureProfile) -> float:
+        """プロファイルの有効FPS (検証で確かめた実FPS。未検証なら要求値)"""
+        info = self.validated.get(profile.key)
+        return info["fps"] if info is not None else float(profile.fps)
+
+    def switch(self, profile: CaptureProfile) -> bool:
+        """
+        プロファイルを適用する。変更がなければ何もしない。
+        :return: 解像度が変わったか (呼び出し側でバッファを作り直す必要があるか)
+        """
+        profile = self._resolve(profile)
+        if profile == self.current:
+            return False
+        resized = (profile.width, profile.height) != (self.current.width, self.current.height)
+        start = time.perf_counter()
+        with profiler.measure("capture_switch"):
+            self._set(profile)
+        self.switch_times.append(time.perf_counter() - start)
+        return resized
+
+    def _resolve(self, profile: CaptureProfile) -> CaptureProfile:
+        """露出が未指定なら base の露出で埋める"""
+        return profile if profile.exposure is not None else replace(profile, exposure=self.base.exposure)
+
+    def _set(self, profile: CaptureProfile):
+        """現在の設定と異なる項目だけを set() する"""
+        profile, current = self._resolve(profile), self.current
+        if (profile.width, profile.height) != (current.width, current.height):
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, profile.width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, profile.height)
+        if profile.fps != current.fps:
+            self.cap.set(cv2.CAP_PROP_FPS, profile.fps)
+        if profile.exposure is not None and profile.exposure != current.exposure:
+            self.cap.set(cv2.CAP_PROP_EXPOSURE, profile.exposure)
+        self.current = profile
+
+    def report(self):
+        if not self.switch_times:
+            return
+        times = [t * 1000.0 for t in self.switch_times]
+        print(f"[CaptureProfiles] switches={len(times)} avg={sum(times) / len(times):.1f}ms max={max(times):.1f}ms")
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+カメラ読み込みの監視。
+
+USBカメラが抜けたり固まったりすると cap.read() は失敗し続ける (または長時間戻らない)。
+そのまま読み直し続けるとCPUを1コア使い切ってしまうため、
+  - 連続失敗回数と、最後にフレームが届いてからの時間 (フレームの途絶) を追跡し
+  - 一定回数失敗するか途絶が続いたら「切断中」とみなして、指数バックオフの間隔でカメラを開き直す
+  - cap.read() 自体が frame_timeout_sec 以上かかって戻ってきた (カメラが固まっていた) 場合も、
+    そのフレームは返したうえで切断中とみなして開き直す
+  - 切断中は読み込みを試みず、キャッシュした「再接続中」の画面を返す
+読み込みは呼び出し元 (描画ループ) のスレッドで行うため、戻らない cap.read() を途中で打ち切ることはできない。
+検出できるのは戻ってきた後で、それまでは描画ループも止まる。
+切断していた時間はメトリクス (autoshutter_capture_outage_seconds) に記録する。
+
+カメラを開き直す処理 (保存した設定の再適用を含む) は呼び出し側が reopen として渡す。
+"""
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+from event_log import events
+
+
+class CaptureSupervisor:
+    def __init__(self, read, reopen, max_failures: int = 5, frame_timeout_sec: float = 3.0,
+                 backoff_initial_sec: float = 0.5, backoff_max_sec: float = 10.0, retry_delay_sec: float = 0.05,
+                 clock=time.monotonic):
+        """
+        :param read: () -> (ret, frame)。1フレーム読む
+        :param reopen: () -> bool。カメラを開き直して設定を再適用する。成功したらTrue
+        :param max_failures: この回数連続で読み込みに失敗したら切断とみなす
+        :param frame_timeout_sec: 最後のフレームからこの時間届かなければ切断とみなす
+        :param backoff_initial_sec: 再接続の最初の待ち時間。失敗するたびに倍にする
+        :param retry_delay_sec: 切断とみなす前の、失敗した読み込みの後の待ち時間 (空回り防止)
+        """
+        self._read = read
+        self._reopen = reopen
+        self.max_failures = max_failures
+        self.frame_timeout_sec = frame_timeout_sec
+        self.backoff_initial_sec = backoff_initial_sec
+        self.backoff_max_sec = backoff_max_sec
+        self.retry_delay_sec = retry_delay_sec
+        self.clock = clock
+
+        self.failures = 0
+        self.last_frame_at = clock()
+        self.outage_started = None # 切断とみなした時刻 (接続中はNone)
+        self.backoff = backoff_initial_sec
+        self.next_attempt = 0.0
+        self.attempts = 0
+        self.outages = []
+        self._placeholder = None
+        metrics.capture_up.set(1)
+
+    @property
+    def connected(self) -> bool:
+        return self.outage_started is None
+
+    def read(self):
+        """
+        1フレーム読む。切断中で再接続の時刻になっていなければ、カメラに触らずに (False, None) を返す。
+        """
+        now = self.clock()
+        if not self.connected:
+            if now < self.next_attempt:
+                return False, None
+            self._try_reopen(now)
+            if not self.connected:
+                return False, None
+
+        started = now
+        ret, frame = self._read()
+        now = self.clock()
+        if ret:
+            self.failures = 0
+            if now - started > self.frame_timeout_sec:
+                # 読み込みが長時間戻らなかった: 最後のフレームから途絶していたとみなし、開き直す
+                events.log("capture_stall", "カメラの読み込みが長時間戻りませんでした", level="warning",
+                           read_sec=round(now - started, 1))
+                self._begin_outage(now)
+                return True, frame
+            self.last_frame_at = now
+            return True, frame
+
+        self.failures += 1
+        metrics.read_failures_total.inc()
+        if self.failures >= self.max_failures or now - self.last_frame_at > self.frame_timeout_sec:
+            self._begin_outage(now)
+        return False, None
+
+    def wait_hint(self) -> float:
+        """次に read() を呼ぶまで待つべき時間 (秒)。呼び出し側は cv2.waitKey などで待つ"""
+        if self.connected:
+            return self.retry_delay_sec
+        # 画面 (再接続中の表示) とキー入力の応答は保ちつつ、再接続の時刻まで待つ
+        return min(max(self.next_attempt - self.clock(), 0.0), 0.1)
+
+    def _begin_outage(self, now: float):
+        events.log("capture_outage", "カメラからフレームが届きません。再接続します...", level="warning",
+                   failures=self.failures)
+        self.outage_started = self.last_frame_at # 最後にフレームが届いた時点から切断していたとみなす
+        self.backoff = self.backoff_initial_sec
+        self.next_attempt = now + self.backoff
+        self.attempts = 0
+        metrics.capture_up.set(0)
+
+    def _try_reopen(self, now: float):
+        self.attempts += 1
+        metrics.capture_reconnects_total.inc()
+        try:
+            ok = bool(self._reopen())
+        except Exception as e:
+            events.log("capture_reopen_error", "再接続中にエラー", level="error", error=repr(e))
+            ok = False
+        now = self.clock()
+        if not ok:
+            self.backoff = min(self.backoff * 2.0, self.backoff_max_sec)
+            self.next_attempt = now + self.backoff
+            events.log("capture_reopen_failed", "再接続に失敗しました", level="warning", attempt=self.attempts,
+                       retry_in_sec=round(self.backoff, 1))
+            return
+        outage = now - self.outage_started
+        self.outages.append(outage)
+        metrics.capture_outage_seconds.observe(outage)
+        metrics.capture_up.set(1)
+        events.log("capture_reconnected", "再接続しました", outage_sec=round(outage, 1), attempt=self.attempts)
+        self.outage_started = None
+        self.failures = 0
+        self.last_frame_at = now
+
+    def placeholder(self, width: int, height: int) -> np.ndarray:
+        """切断中に表示する画面。サイズが変わらない限り1回だけ描画して使い回す"""
+        if self._placeholder is None or self._placeholder.shape[:2] != (height, width):
+            frame = np.full((height, width, 3), 40, dtype=np.uint8)
+            cv2.putText(frame, "Camera reconnecting...", (40, height // 2), cv2.FONT_HERSHEY_SIMPLEX, 1,
+                        (255, 255, 255), 2)
+            self._placeholder = frame
+        return self._placeholder
+
+    def report(self):
+        if not self.outages:
+            return
+        print(f"[CaptureSupervisor] outages={len(self.outages)} total={sum(self.outages):.1f}s "
+              f"max={max(self.outages):.1f}s")
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+READY状態のジェスチャー検出を2段構成にするカスケード。
+
+READYでの推論の大半は「誰もいない」か「いてもジェスチャーをしていない」フレームに使われる。
+そこで姿勢推定 (yolo11n-pose, 通常解像度) の前に軽い判定を挟む。
+  - 1段目: 人物検出モデルを小さい入力サイズ (既定192px) で実行し、
+           ジェスチャーを判定できる大きさで上半身が画面内に入っている人がいるかを幾何的に調べる
+  - 2段目: 1段目を通過したときだけ姿勢推定を実行する
+2段目で人が見つかっている間は、続けて姿勢推定を行う (1段目を省略する) ことで
+ジェスチャーの途中で1段目が取りこぼしても反応が遅れないようにする。
+
+段ごとの通過率と処理時間を記録し、1フレームあたりの平均コストが下がっているかを確認できる。
+"""
+import time
+
+from profiler import profiler
+from perception import PerceptionResult
+
+
+class GestureCascade:
+    """
+    ``detect_circle_gesture`` と同じ呼び出し方 (frame, seq, imgsz) で使える2段カスケード。
+    """
+    def __init__(self, presence_fn, pose_fn, stage1_imgsz: int = 192,
+                 min_height_ratio: float = 0.2, max_top_ratio: float = 0.6, hold_calls: int = 3):
+        """
+        :param presence_fn: 1段目の人物検出 (frame, seq=, imgsz=) -> PerceptionResult
+        :param pose_fn: 2段目の姿勢推定 (frame, seq=, imgsz=) -> PerceptionResult
+        :param stage1_imgsz: 1段目の入力サイズ (32の倍数)
+        :param min_height_ratio: 人物の枠の高さが画面の高さのこの割合未満なら、遠すぎて判定しない
+        :param max_top_ratio: 枠の上端が画面の高さのこの割合より下なら、頭と腕が画面外にあるとみなす
+        :param hold_calls: 2段目で人が見つかった後、1段目を省略して姿勢推定を続ける回数
+        """
+        self.presence_fn = presence_fn
+        self.pose_fn = pose_fn
+        self.stage1_imgsz = stage1_imgsz
+        self.min_height_ratio = min_height_ratio
+        self.max_top_ratio = max_top_ratio
+        self.hold_calls = hold_calls
+        self._hold = 0
+
+        # 統計
+        self.calls = 0
+        self.stage1_runs = 0
+        self.stage1_passes = 0
+        self.stage2_runs = 0
+        self.stage1_time = 0.0
+        self.stage2_time = 0.0
+
+    def plausible(self, result, frame_shape):
+        """各人物について、腕を上げたジェスチャーを判定できる位置・大きさかどうか (N,) bool"""
+        h = frame_shape[0]
+        boxes = result.boxes
+        heights = boxes[:, 3] - boxes[:, 1]
+        return (heights >= h * self.min_height_ratio) & (boxes[:, 1] <= h * self.max_top_ratio)
+
+    def __call__(self, frame, seq: int = -1, imgsz: int = None):
+        self.calls += 1
+
+        if self._hold > 0:
+            self._hold -= 1
+        else:
+            start = time.perf_counter()
+            with profiler.measure("cascade_stage1"):
+                presence = self.presence_fn(frame, seq=seq, imgsz=self.stage1_imgsz)
+            self.stage1_time += time.perf_counter() - start
+            self.stage1_runs += 1
+            if not self.plausible(presence, frame.shape).any():
+                profiler.count("cascade_stage1_reject")
+                return PerceptionResult(seq=seq)
+            self.stage1_passes += 1
+            profiler.count("cascade_stage1_pass")
+
+        start = time.perf_counter()
+        with profiler.measure("cascade_stage2"):
+            result = self.pose_fn(frame, seq=seq, imgsz=imgsz)
+        self.stage2_time += time.perf_counter() - start
+        self.stage2_runs += 1
+        profiler.count("cascade_stage2_run")
+
+        # 人が見えている間は1段目を省略して姿勢推定を続ける
+        self._hold = self.hold_calls if len(result) else 0
+        return result
+
+    def reset(self):
+        self._hold = 0
+
+    def stats(self) -> dict:
+        """段ごとの通過率と平均処理時間 (ms)、1回あたりの平均コスト (ms)"""
+        return {
+            "calls": self.calls,
+            "stage1_pass_rate": self.stage1_passes / self.stage1_runs if self.stage1_runs else 0.0,
+            "stage2_rate": self.stage2_runs / self.calls if self.calls else 0.0,
+            "stage1_ms": self.stage1_time / self.stage1_runs * 1000.0 if self.stage1_runs else 0.0,
+            "stage2_ms": self.stage2_time / self.stage2_runs * 1000.0 if self.stage2_runs else 0.0,
+            "avg_cost_ms": (self.stage1_time + self.stage2_time) / self.calls * 1000.0 if self.calls else 0.0,
+        }
+
+    def report(self):
+        s = self.stats()
+        if not s["calls"]:
+            return
+        print(f"[Cascade] calls={s['calls']} stage1 pass={s['stage1_pass_rate']:.0%} ({s['stage1_ms']:.1f}ms) "
+              f"stage2 run={s['stage2_rate']:.0%} ({s['stage2_ms']:.1f}ms) avg={s['avg_cost_ms']:.1f}ms/call")
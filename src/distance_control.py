@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+カメラと被写体の距離を、画面端からの余白 (margin) を目標値に保つように制御するサブシステム。
+(CONTROL_SYSTEM_GUIDE.md / PHYSICAL_DISTANCE_ADJUSTMENT_GUIDE.md のフィードバック制御を実装したもの)
+
+人物検出は数フレームに1回しか走らず、結果は描画のFPSにも左右される。制御の安定性は
+「測定から指令までの遅れ」と「指令の周期」に依存するため、描画ループとは切り離して
+  - MarginTracker     : 測定した余白を α-β フィルタで追跡し、任意の時刻の余白を推定 (補間・短時間の外挿) する
+  - PID               : 出力の飽和に対する積分の巻き上がり防止 (anti-windup) 付きのPID
+  - Actuator          : モーターへの指令のインターフェース (PrintActuator / SimulatedActuator)
+  - DistanceController: 一定周期のスレッドで、追跡中の余白からPIDで指令を計算してアクチュエータへ送る
+に分けている。指令ごとに、使った測定の古さ (測定時刻 -> 指令時刻) をメトリクスへ記録する。
+
+符号の約束: 誤差 = 目標余白 - 現在の余白。正 (余白が足りない = 近すぎる) ならカメラを後退させる。
+アクチュエータへの指令は「後退する速さ (m/s)」で、負なら前進。
+
+使用例 (シミュレーション):
+    python src/distance_control.py --seconds 10
+"""
+import time
+import threading
+import argparse
+from dataclasses import dataclass
+from typing import Optional
+
+import metrics
+from event_log import events
+
+
+def measure_margin(result, frame_width: int) -> Optional[float]:
+    """
+    検出結果から、全員をまとめた範囲の左右の余白のうち小さい方 (px) を返す。誰もいなければNone
+    """
+    if result is None or len(result) == 0:
+        return None
+    boxes = result.boxes
+    left = float(boxes[:, 0].min())
+    right = frame_width - float(boxes[:, 2].max())
+    return min(left, right)
+
+
+class MarginTracker:
+    """
+    余白の測定値を α-β フィルタで追跡する。
+    測定と測定の間は速度で補間し、測定が途絶えても max_extrapolation_sec までは外挿する。
+    max_age_sec を超えて測定がなければ、推定値はNone (見失った) になる。
+    """
+    def __init__(self, alpha: float = 0.6, beta: float = 0.2, max_extrapolation_sec: float = 1.0,
+                 max_age_sec: float = 2.0):
+        self.alpha = alpha
+        self.beta = beta
+        self.max_extrapolation_sec = max_extrapolation_sec
+        self.max_age_sec = max_age_sec
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.position = None
+            self.velocity = 0.0
+            self.timestamp = None # 最後の測定時刻 (time.monotonic)
+            self.last_seq = None
+
+    def update(self, margin: Optional[float], timestamp: float, seq: int = None):
+        """
+        測定値を取り込む。同じフレーム (seq) の結果が繰り返し渡された場合 (推論キャッシュ) は無視する。
+        :param margin: 余白 (px)。誰もいなければNone (何もしない)
+        :param timestamp: 測定したフレームの時刻 (time.monotonic)
+        """
+        if margin is None:
+            return
+        with self._lock:
+            if seq is not None and seq == self.last_seq:
+                return
+            self.last_seq = seq
+            if self.position is None:
+                self.position, self.velocity, self.timestamp = margin, 0.0, timestamp
+                return
+            dt = timestamp - self.timestamp
+            if dt <= 0:
+                return
+            predicted = self.position + self.velocity * dt
+            residual = margin - predicted
+            self.position = predicted + self.alpha * residual
+            self.velocity += self.beta * residual / dt
+            self.timestamp = timestamp
+
+    def estimate(self, now: float):
+        """
+        時刻 now の余白の推定値と、元になった測定の時刻を返す。見失っていれば (None, None)
+        """
+        with self._lock:
+            if self.position is None or now - self.timestamp > self.max_age_sec:
+                return None, None
+            horizon = min(max(now - self.timestamp, 0.0), self.max_extrapolation_sec)
+            return self.position + self.velocity * horizon, self.timestamp
+
+
+class PID:
+    """
+    PID制御器。
+      - 微分は測定値 (誤差ではなく) に対して取り、目標値の変更で指令が跳ねないようにする
+      - 出力が上下限で飽和している間は、さらに飽和させる向きの積分を止める (条件付き積分による anti-windup)
+      - 積分値そのものにも上限を設ける
+    """
+    def __init__(self, kp: float, ki: float = 0.0, kd: float = 0.0, output_limit: float = 1.0,
+                 integral_limit: float = None):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_limit = output_limit
+        self.integral_limit = integral_limit if integral_limit is not None else output_limit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self._last_measurement = None
+        self.saturated = False
+
+    def update(self, error: float, measurement: float, dt: float) -> float:
+        """
+        :param error: 目標値 - 測定値
+        :param measurement: 測定値 (微分項に使う)
+        :param dt: 前回からの経過時間 (秒)
+        """
+        derivative = 0.0
+        if self._last_measurement is not None and dt > 0:
+            derivative = -(measurement - self._last_measurement) / dt
+        self._last_measurement = measurement
+
+        unsaturated = self.kp * error + self.ki * self.integral + self.kd * derivative
+        # 飽和していない、または誤差が飽和を解く向きのときだけ積分する
+        if abs(unsaturated) < self.output_limit or (error > 0) != (unsaturated > 0):
+            limit = self.integral_limit / self.ki if self.ki else 0.0
+            self.integral = min(max(self.integral + error * dt, -limit), limit)
+            unsaturated = self.kp * error + self.ki * self.integral + self.kd * derivative
+
+        output = min(max(unsaturated, -self.output_limit), self.output_limit)
+        self.saturated = output != unsaturated
+        return output
+
+
+class Actuator:
+    """モーターへの指令のインターフェース。velocity は後退する速さ (m/s)、負なら前進"""
+    def command(self, velocity: float):
+        raise NotImplementedError
+
+    def stop(self):
+        self.command(0.0)
+
+
+class PrintActuator(Actuator):
+    """
+    実機のモーターの代わりに、指令の向きが変わったときだけイベントログに出力する。
+    目標付近で向きが細かく入れ替わっても、記録は1秒に1回まで (間引いた件数は次の記録に付く)。
+    """
+    def __init__(self, threshold: float = 1e-3):
+        self.threshold = threshold
+        self._last = None
+
+    def command(self, velocity: float):
+        direction = "後退" if velocity > self.threshold else ("前進" if velocity < -self.threshold else "停止")
+        if direction != self._last:
+            events.log("motor_command", f"モーターへの指示: {direction}", key=("motor_command",),
+                       direction=direction, velocity=round(velocity, 3))
+            self._last = direction
+
+
+class SimulatedPlant:
+    """
+    カメラ台の簡易モデル。指令速度に一次遅れで追従するモーターと、距離から画面上の余白を求めるピンホールカメラ。
+    """
+    def __init__(self, distance_m: float = 1.0, group_width_m: float = 1.2, focal_px: float = 500.0,
+                 frame_width: int = 640, time_constant_sec: float = 0.15, min_distance_m: float = 0.3,
+                 max_distance_m: float = 4.0):
+        self.distance_m = distance_m
+        self.group_width_m = group_width_m
+        self.focal_px = focal_px
+        self.frame_width = frame_width
+        self.time_constant_sec = time_constant_sec
+        self.min_distance_m = min_distance_m
+        self.max_distance_m = max_distance_m
+        self.velocity = 0.0
+        self.target_velocity = 0.0
+
+    def step(self, dt: float):
+        self.velocity += (self.target_velocity - self.velocity) * min(dt / self.time_constant_sec, 1.0)
+        self.distance_m = min(max(self.distance_m + self.velocity * dt, self.min_distance_m), self.max_distance_m)
+
+    def margin(self) -> float:
+        """画面の左右に残る余白 (px)。被写体がはみ出すと負になる"""
+        width_px = self.focal_px * self.group_width_m / self.distance_m
+        return (self.frame_width - width_px) / 2.0
+
+
+class SimulatedActuator(Actuator):
+    """SimulatedPlant を動かすアクチュエータ"""
+    def __init__(self, plant: SimulatedPlant, max_speed: float = 0.3):
+        self.plant = plant
+        self.max_speed = max_speed
+        self.commands = 0
+
+    def command(self, velocity: float):
+        self.plant.target_velocity = min(max(velocity, -self.max_speed), self.max_speed)
+        self.commands += 1
+
+
+@dataclass
+class ControlStatus:
+    """最後の制御周期の状態 (UI表示・デバッグ用)"""
+    margin: Optional[float] = None
+    error: float = 0.0
+    command: float = 0.0
+    latency_sec: float = 0.0
+
+
+class DistanceController:
+    """
+    一定周期のスレッドで余白を目標値に保つ。
+    engage() している間だけ指令を出し、disengage() で停止してPIDと追跡をリセットする。
+    測定は observe() で描画ループから渡す (スレッドは測定を待たない)。
+    """
+    def __init__(self, actuator: Actuator, target_margin: float = 100.0, tolerance: float = 20.0,
+                 rate_hz: float = 20.0, pid: PID = None, tracker: MarginTracker = None, clock=time.monotonic):
+        """
+        :param target_margin: 目標の余白 (px)
+        :param tolerance: 誤差がこの範囲内なら停止する (不感帯)
+        :param rate_hz: 制御周期
+        :param pid: 省略時は 余白1pxあたり 1mm/s、最大 0.3m/s
+        """
+        self.actuator = actuator
+        self.target_margin = target_margin
+        self.tolerance = tolerance
+        self.period = 1.0 / rate_hz
+        self.pid = pid if pid is not None else PID(kp=0.001, ki=0.0002, output_limit=0.3)
+        self.tracker = tracker if tracker is not None else MarginTracker()
+        self.clock = clock
+        self.status = ControlStatus()
+        self.engaged = False
+        self._last_step = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # --- 描画ループから呼ぶ ---
+    def observe(self, result, frame_width: int, timestamp: float = None):
+        """人物検出の結果を測定値として渡す"""
+        margin = measure_margin(result, frame_width)
+        if timestamp is None:
+            # 測定の時刻は元フレームのキャプチャ時刻 (不明なら推論完了時刻)
+            if result is None:
+                timestamp = self.clock()
+            else:
+                timestamp = result.captured_at if result.captured_at is not None else result.timestamp
+        self.tracker.update(margin, timestamp, seq=result.seq if result is not None else None)
+
+    def engage(self):
+        with self._lock:
+            self.engaged = True
+
+    def disengage(self):
+        with self._lock:
+            self.engaged = False
+            self.pid.reset()
+            self.tracker.reset()
+            self._last_step = None
+            self.status = ControlStatus()
+            self.actuator.stop()
+            metrics.control_command.set(0.0)
+
+    # --- 制御周期 ---
+    def step(self, now: float = None) -> float:
+        """1周期分の制御を行い、アクチュエータへ送った指令を返す"""
+        now = self.clock() if now is None else now
+        with self._lock:
+            if not self.engaged:
+                return 0.0
+            dt = self.period if self._last_step is None else now - self._last_step
+            self._last_step = now
+
+            margin, measured_at = self.tracker.estimate(now)
+            if margin is None:
+                # 見失ったら止まる (積分も捨てる)
+                self.pid.reset()
+                command, error, latency = 0.0, 0.0, 0.0
+            else:
+                error = self.target_margin - margin
+                if abs(error) <= self.tolerance:
+                    command = 0.0
+                    self.pid.reset()
+                else:
+                    command = self.pid.update(error, margin, dt)
+                latency = now - measured_at
+                metrics.control_latency_seconds.observe(latency)
+
+            self.actuator.command(command)
+            metrics.control_command.set(command)
+            self.status = ControlStatus(margin, error, command, latency)
+            return command
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="distance-control", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self._thread = None
+        self.disengage()
+
+    def _run(self):
+        # 周期は絶対時刻で刻み、処理時間の揺らぎが積み重ならないようにする
+        deadline = time.monotonic()
+        while not self._stop.is_set():
+            self.step()
+            deadline += self.period
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                metrics.control_overruns_total.inc()
+                deadline = time.monotonic() # 遅れを取り戻そうと連続実行しない
+            elif self._stop.wait(delay):
+                break
+
+
+def simulate(seconds: float = 10.0, rate_hz: float = 20.0, detect_interval_sec: float = 1.0,
+             inference_delay_sec: float = 0.2, start_distance_m: float = 0.8, target_margin: float = 100.0):
+    """
+    シミュレーション: 人物検出は detect_interval_sec ごとに inference_delay_sec 遅れて届く。
+    :return: (時刻, 余白, 指令) のリスト
+    """
+    from perception import PerceptionResult
+    import numpy as np
+
+    plant = SimulatedPlant(distance_m=start_distance_m)
+    sim_time = [0.0]
+    controller = DistanceController(SimulatedActuator(plant), target_margin=target_margin, rate_hz=rate_hz,
+                                    clock=lambda: sim_time[0])
+    controller.engage()
+
+    dt = 1.0 / rate_hz
+    next_detect, pending, seq = 0.0, [], 0
+    trace = []
+    for _ in range(int(seconds * rate_hz)):
+        t = sim_time[0]
+        if t >= next_detect:
+            # 検出したフレームの時刻の余白を、推論の遅れの後に届ける
+            margin = plant.margin()
+            box = np.array([[margin, 100.0, plant.frame_width - margin, 460.0]], dtype=np.float32)
+            pending.append((t + inference_delay_sec, PerceptionResult(box, seq=seq, timestamp=t)))
+            next_detect += detect_interval_sec
+            seq += 1
+        while pending and pending[0][0] <= t:
+            controller.observe(pending.pop(0)[1], plant.frame_width)
+        command = controller.step()
+        plant.step(dt)
+        sim_time[0] = t + dt
+        trace.append((t, plant.margin(), command))
+    return trace
+
+
+def main():
+    parser = argparse.ArgumentParser(description="距離制御のシミュレーション")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rate", type=float, default=20.0, help="制御周期 (Hz)")
+    parser.add_argument("--detect-interval", type=float, default=1.0, help="人物検出の間隔 (秒)")
+    parser.add_argument("--delay", type=float, default=0.2, help="推論の遅れ (秒)")
+    parser.add_argument("--start", type=float, default=0.8, help="初期距離 (m)")
+    args = parser.parse_args()
+
+    trace = simulate(args.seconds, args.rate, args.detect_interval, args.delay, args.start)
+    step = max(1, int(args.rate / 2))
+    for t, margin, command in trace[::step]:
+        print(f"t={t:5.2f}s margin={margin:7.1f}px command={command:+.3f}m/s")
+
+
+if __name__ == "__main__":
+    main()
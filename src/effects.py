@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+画面エフェクト (フラッシュ, フェード, ビネット, カウントダウンのパルス)。
+
+白や黒とのブレンドは画素値ごとの写像 ``v -> v + alpha * (target - v)`` なので、
+alphaを量子化して256要素のルックアップテーブル (LUT) を事前計算しておけば
+``cv2.LUT`` 1回でフレームにその場で適用できる。
+overlayのコピーや ``cv2.addWeighted`` の中間バッファを確保しないため、
+クールダウン中の毎フレーム処理が軽くなる。
+"""
+import cv2
+import numpy as np
+
+# alphaの量子化段数 (64段あれば見た目の差は分からない)
+ALPHA_LEVELS = 64
+
+
+def _build_blend_luts(target: int) -> np.ndarray:
+    """target色へブレンドするLUTを全量子化段数ぶん作成する。shape: (ALPHA_LEVELS + 1, 256)"""
+    src = np.arange(256, dtype=np.float32)
+    alphas = np.linspace(0.0, 1.0, ALPHA_LEVELS + 1, dtype=np.float32)[:, None]
+    luts = src + alphas * (target - src)
+    return np.clip(np.rint(luts), 0, 255).astype(np.uint8)
+
+
+# 量子化alphaごとのLUT (インポート時に一度だけ計算。合計 約33KB)
+_WHITE_LUTS = _build_blend_luts(255)
+_BLACK_LUTS = _build_blend_luts(0)
+
+# ビネット用ゲインマップのキャッシュ: (h, w, channels, strengthの量子化値) -> uint8ゲイン
+_vignette_cache = {}
+
+
+def quantize_alpha(alpha: float) -> int:
+    """alpha (0.0 - 1.0) を LUT のインデックスに変換する"""
+    if alpha <= 0.0:
+        return 0
+    if alpha >= 1.0:
+        return ALPHA_LEVELS
+    return int(alpha * ALPHA_LEVELS + 0.5)
+
+
+def flash(frame, alpha: float):
+    """
+    フレームを白へブレンドする (シャッターフラッシュ)。frameをその場で書き換える。
+    :param frame: uint8のフレーム
+    :param alpha: 白の強さ (1.0で真っ白)
+    """
+    level = quantize_alpha(alpha)
+    if level == 0:
+        return frame
+    return cv2.LUT(frame, _WHITE_LUTS[level], dst=frame)
+
+
+def fade(frame, alpha: float):
+    """
+    フレームを黒へブレンドする (フェードアウト)。frameをその場で書き換える。
+    :param frame: uint8のフレーム
+    :param alpha: 黒の強さ (1.0で真っ黒)
+    """
+    level = quantize_alpha(alpha)
+    if level == 0:
+        return frame
+    return cv2.LUT(frame, _BLACK_LUTS[level], dst=frame)
+
+
+def _vignette_gain(shape, level: int) -> np.ndarray:
+    """画面中心からの距離に応じたuint8ゲインマップ (255 = 等倍) を取得する"""
+    h, w = shape[:2]
+    channels = shape[2] if len(shape) > 2 else 1
+    key = (h, w, channels, level)
+    gain = _vignette_cache.get(key)
+    if gain is None:
+        strength = level / ALPHA_LEVELS
+        ys = np.linspace(-1.0, 1.0, h, dtype=np.float32)[:, None]
+        xs = np.linspace(-1.0, 1.0, w, dtype=np.float32)[None, :]
+        # 四隅で r = 1.0 になるよう正規化
+        r = np.sqrt((xs * xs + ys * ys) / 2.0)
+        gain = np.rint(255.0 * (1.0 - strength * r * r)).astype(np.uint8)
+        if channels > 1:
+            gain = np.ascontiguousarray(np.repeat(gain[:, :, None], channels, axis=2))
+        _vignette_cache[key] = gain
+    return gain
+
+
+def vignette(frame, strength: float):
+    """
+    画面の周辺を暗くする。ゲインマップはサイズ・強さごとにキャッシュされる。
+    :param frame: uint8のフレーム
+    :param strength: 四隅の減光率 (0.0 - 1.0)
+    """
+    level = quantize_alpha(strength)
+    if level == 0:
+        return frame
+    return cv2.multiply(frame, _vignette_gain(frame.shape, level), dst=frame, scale=1.0 / 255.0)
+
+
+def countdown_pulse(frame, countdown_timer: int, fps: int, strength: float = 0.35):
+    """
+    カウントダウンの1秒ごとに白く光って減衰するパルスを描画する。
+    :param countdown_timer: 残りフレーム数
+    :param fps: 1秒あたりのフレーム数
+    :param strength: パルスのピーク時の白の強さ
+    """
+    if fps <= 0:
+        return frame
+    # 表示秒数が切り替わったフレーム (phase=1.0) が最も明るく、次の秒に向けて減衰する
+    phase = ((countdown_timer - 1) % fps + 1) / fps
+    return flash(frame, strength * phase * phase)
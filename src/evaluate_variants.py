@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+エクスポート済みNCNNバリアント (FP32 / FP16 / INT8) の精度とCPUレイテンシを計測し、
+各フォルダに variant.json として書き込む。model_loader はこの結果を見てバリアントを選ぶ。
+
+精度の定義 (基準は {model}.pt、なければFP32のNCNN):
+    姿勢推定 (pose)  : フレームごとの丸ジェスチャー判定 (is_circle_gesture) のバランス精度
+                       (基準でジェスチャーありのフレームの再現率と、なしのフレームの一致率の平均)
+    人物検出 (detect): 「人数」の一致率と、「端にいるか」の判定のバランス精度の低い方
+単純な一致率では、ほとんどのフレームがジェスチャーなしなので、一度もジェスチャーを検出しない
+バリアントでも下限 (Config.MODEL_ACCURACY_FLOOR) を満たしてしまう。
+基準にジェスチャーありのフレームが1枚もなければ判定できないため、姿勢推定の精度は0とする
+(そのバリアントは選ばれない。ジェスチャーをしている場面を含めて録画し直す)。
+
+使用例:
+    python src/evaluate_variants.py --frames calibration_frames
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import platform
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from model_loader import VARIANT_SUFFIXES, VARIANT_METADATA_FILE
+from detect_circle_gesture import is_circle_gesture
+
+MODELS = {"yolo11n-pose": "pose", "yolo11n": "detect"}
+EDGE_MARGIN = 50  # main.Config.MARGIN と同じ
+
+
+def load_frames(frames_dir: str, max_frames: int):
+    paths = sorted(glob.glob(os.path.join(frames_dir, "*.jpg")) + glob.glob(os.path.join(frames_dir, "*.png")))
+    step = max(1, len(paths) // max_frames) if paths else 1
+    return [cv2.imread(p) for p in paths[::step][:max_frames]]
+
+
+def decide(result, task: str, width: int):
+    """1フレームの推論結果を、精度比較に使う判定値に変換する"""
+    if task == "pose":
+        if result.keypoints is None or result.keypoints.data.shape[1] == 0:
+            return False
+        return any(is_circle_gesture(k) for k in result.keypoints.data.cpu().numpy())
+    boxes = result.boxes.xyxy.cpu().numpy() if len(result.boxes) else np.zeros((0, 4))
+    at_edge = bool(np.any((boxes[:, 0] < EDGE_MARGIN) | (boxes[:, 2] > width - EDGE_MARGIN)))
+    return (len(boxes), at_edge)
+
+
+def binary_metrics(decisions, reference) -> dict:
+    """
+    2値の判定 (基準の True を陽性とする) の一致度。
+    :return: {"positives", "recall", "precision", "specificity", "balanced_accuracy"}。
+             陽性・陰性のどちらかが基準にない場合、その側の値は None
+    """
+    decisions = np.asarray(decisions, dtype=bool)
+    reference = np.asarray(reference, dtype=bool)
+    tp = int(np.sum(decisions & reference))
+    fp = int(np.sum(decisions & ~reference))
+    positives = int(reference.sum())
+    negatives = len(reference) - positives
+    recall = tp / positives if positives else None
+    specificity = (negatives - fp) / negatives if negatives else None
+    rates = [r for r in (recall, specificity) if r is not None]
+    return {
+        "positives": positives,
+        "recall": recall,
+        "precision": tp / (tp + fp) if tp + fp else None,
+        "specificity": specificity,
+        "balanced_accuracy": sum(rates) / len(rates) if rates else None,
+    }
+
+
+def accuracy_of(decisions, reference, task: str) -> dict:
+    """バリアント選択の下限と比べる精度 (accuracy) と、その内訳"""
+    agreement = sum(d == r for d, r in zip(decisions, reference)) / len(reference)
+    if task == "pose":
+        metrics = binary_metrics(decisions, reference)
+        if metrics["positives"] == 0:
+            print("  警告: 基準にジェスチャーありのフレームがないため、姿勢推定の精度を判定できません")
+            accuracy = 0.0
+        else:
+            accuracy = metrics["balanced_accuracy"]
+    else:
+        metrics = binary_metrics([d[1] for d in decisions], [r[1] for r in reference])
+        count_agreement = sum(d[0] == r[0] for d, r in zip(decisions, reference)) / len(reference)
+        metrics["count_agreement"] = count_agreement
+        if metrics["positives"] == 0:
+            print("  警告: 基準に端にいる人のフレームがないため、人数の一致率だけで判定します")
+            accuracy = count_agreement
+        else:
+            accuracy = min(count_agreement, metrics["balanced_accuracy"])
+    metrics["agreement"] = agreement
+    metrics["accuracy"] = accuracy
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in metrics.items()}
+
+
+def run_model(model, frames, task: str, warmup: int = 3):
+    """CPUで1枚ずつ推論し、判定値のリストとレイテンシ (ms) のリストを返す"""
+    kwargs = {"verbose": False, "device": "cpu"}
+    if task == "detect":
+        kwargs["classes"] = [0]
+    for frame in frames[:warmup]:
+        model(frame, **kwargs)
+
+    decisions, latencies = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        result = model(frame, **kwargs)[0]
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        decisions.append(decide(result, task, frame.shape[1]))
+    return decisions, latencies
+
+
+def evaluate(model_basename: str, task: str, frames):
+    from ultralytics import YOLO
+
+    base = f"{model_basename}_ncnn_model"
+    pt_path = f"{model_basename}.pt"
+    reference_path = pt_path if os.path.exists(pt_path) else base
+    if not os.path.exists(reference_path):
+        print(f"{model_basename}: 基準モデルが見つかりません。スキップします。")
+        return
+
+    print(f"{model_basename}: 基準 {reference_path} で推論中...")
+    reference, _ = run_model(YOLO(reference_path, task=task), frames, task)
+
+    for precision, suffix in VARIANT_SUFFIXES.items():
+        path = base + suffix
+        if not os.path.exists(path):
+            continue
+        decisions, latencies = run_model(YOLO(path, task=task), frames, task)
+        scores = accuracy_of(decisions, reference, task)
+        meta = {
+            "precision": precision,
+            "task": task,
+            "accuracy": scores.pop("accuracy"),
+            "metrics": scores,
+            "latency_ms": round(float(np.median(latencies)), 2),
+            "latency_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            "frames": len(frames),
+            "reference": reference_path,
+            "machine": platform.machine(),
+            "evaluated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(os.path.join(path, VARIANT_METADATA_FILE), "w") as f:
+            json.dump(meta, f, indent=2)
+        print(f"  {path:<32} accuracy={meta['accuracy']:.3f} (recall={scores['recall']}, "
+              f"agreement={scores['agreement']:.3f}) latency={meta['latency_ms']:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NCNNバリアントの精度とCPUレイテンシを評価する")
+    parser.add_argument("--frames", default="calibration_frames", help="評価に使う録画フレームのフォルダ")
+    parser.add_argument("--max-frames", type=int, default=200)
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames, args.max_frames)
+    if not frames:
+        print(f"エラー: '{args.frames}' にフレームがありません。")
+        print("先に `python src/export_logic.py --record 200` で録画してください。")
+        sys.exit(1)
+
+    for model_basename, task in MODELS.items():
+        evaluate(model_basename, task, frames)
+
+
+if __name__ == "__main__":
+    main()
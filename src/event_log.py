@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+描画ループを止めない構造化イベントログ。
+
+print はコンソール (Raspberry Pi のシリアル・journald) への同期書き込みなので、
+描画ループから呼ぶと書き込みが詰まった分だけフレームが遅れる。
+EventLogger は
+  - log() ではイベント (dict) をメモリ上のリングに追加するだけで、ロックも入出力もしない
+    (deque の append / popleft はスレッド間で安全)
+  - 別スレッドがリングから取り出し、JSON Lines としてローテーションするファイルに書き込む
+    (echo=True ならコンソールにも1行ずつ出す。これも書き込みスレッドが行う)
+  - 同じイベントが短い間隔で繰り返されたら間引き、次に出力する記録に間引いた件数 (suppressed) を付ける
+  - リングが満杯なら待たずに新しいイベントを捨て、捨てた件数を数える
+    (件数はメトリクス autoshutter_log_events_dropped_total と、次に書く log_dropped イベントに残る)
+
+使用例:
+    from event_log import events
+    events.start("logs/events.jsonl")
+    events.log("phase_change", "READY -> ADJUST", src="READY", dst="ADJUST")
+    events.close()
+
+イベントはプロセスごとのリングに溜まるので、log() を呼ぶプロセス (推論プロセスを含む) はそれぞれ start() すること。
+"""
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque
+
+import metrics
+
+LEVELS = ("debug", "info", "warning", "error")
+
+
+class EventLogger:
+    def __init__(self, capacity: int = 1024, rate_limit_sec: float = 1.0, max_bytes: int = 1_000_000,
+                 backups: int = 3, flush_interval_sec: float = 0.2, echo: bool = True, clock=time.monotonic):
+        """
+        :param capacity: リングに溜められるイベント数。超えた分は捨てる
+        :param rate_limit_sec: 同じキーのイベントはこの間隔に1回だけ記録する (0で間引かない)
+        :param max_bytes: ファイルがこの大きさを超えたら .1, .2, ... にずらして新しいファイルにする
+        :param backups: 残す古いファイルの数
+        :param flush_interval_sec: 書き込みスレッドがリングを見に行く間隔
+        :param echo: コンソールにも出力する
+        """
+        self.capacity = capacity
+        self.rate_limit_sec = rate_limit_sec
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval_sec = flush_interval_sec
+        self.echo = echo
+        self.clock = clock
+
+        self.path = None
+        self.dropped = 0      # リングが満杯で捨てたイベント数 (累計)
+        self.suppressed = 0   # 間引いたイベント数 (累計)
+        self.written = 0
+        self._ring = deque()
+        self._last_logged = {} # キー -> 最後に記録した時刻
+        self._pending_suppressed = {} # キー -> 最後に記録してから間引いた件数
+        self._reported_dropped = 0
+        self._file = None
+        self._size = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def log(self, event: str, message: str = "", level: str = "info", key=None, **fields) -> bool:
+        """
+        イベントを記録する (描画ループから呼んでよい)。
+        :param event: イベントの種類 (phase_change, capture など)
+        :param key: 間引きの単位。省略時は (event, message)
+        :param fields: 記録に含める値 (JSONにできないものは str() で書き出す)
+        :return: リングに追加したらTrue (間引いた・捨てた場合はFalse)
+        """
+        now = self.clock()
+        key = (event, message) if key is None else key
+        if self.rate_limit_sec > 0:
+            last = self._last_logged.get(key)
+            if last is not None and now - last < self.rate_limit_sec:
+                self._pending_suppressed[key] = self._pending_suppressed.get(key, 0) + 1
+                self.suppressed += 1
+                metrics.log_events_suppressed_total.inc()
+                return False
+        if len(self._ring) >= self.capacity:
+            self.dropped += 1
+            metrics.log_events_dropped_total.inc()
+            return False
+        self._last_logged[key] = now
+
+        record = {"ts": time.time(), "level": level, "event": event}
+        if message:
+            record["msg"] = message
+        record.update(fields)
+        suppressed = self._pending_suppressed.pop(key, 0)
+        if suppressed:
+            record["suppressed"] = suppressed
+        self._ring.append(record)
+        return True
+
+    def start(self, path: str = None):
+        """
+        書き込みスレッドを開始する。
+        :param path: JSON Lines の出力先。None または "" ならファイルには書かない (echo のみ)
+        """
+        if self._thread is not None:
+            return
+        self.path = path or None
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._open()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval_sec):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """リングに溜まったイベントを書き出す (書き込みスレッドから呼ばれる。テストでは直接呼んでもよい)"""
+        records = []
+        while True:
+            try:
+                records.append(self._ring.popleft())
+            except IndexError:
+                break
+        if self.dropped != self._reported_dropped:
+            # 捨てたことが分かるよう、その件数もログに残す
+            records.append({"ts": time.time(), "level": "warning", "event": "log_dropped",
+                            "dropped": self.dropped - self._reported_dropped, "dropped_total": self.dropped})
+            self._reported_dropped = self.dropped
+        if not records:
+            return
+
+        lines = []
+        for record in records:
+            lines.append(json.dumps(record, ensure_ascii=False, default=str))
+            if self.echo:
+                self._echo(record)
+        if self._file is not None:
+            data = "\n".join(lines) + "\n"
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data.encode("utf-8"))
+            if self._size >= self.max_bytes:
+                self._rotate()
+        self.written += len(records)
+
+    def _echo(self, record: dict):
+        text = record.get("msg", "")
+        extra = " ".join(f"{k}={v}" for k, v in record.items() if k not in ("ts", "level", "event", "msg"))
+        line = f"[{record['event']}] {text} {extra}".rstrip()
+        stream = sys.stderr if record["level"] in ("warning", "error") else sys.stdout
+        print(line, file=stream)
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def close(self):
+        """残りを書き出して書き込みスレッドを止める"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        else:
+            self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# シングルトンとしてインスタンス化 (profiler と同様に import して使う)
+events = EventLogger()
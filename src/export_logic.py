@@ -1,5 +1,13 @@
 import sys
 import os
+import glob
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 try:
     from ultralytics import YOLO
@@ -8,28 +16,330 @@ except ImportError:
     print("Please ensure you are running this script within the virtual environment.")
     sys.exit(1)
 
-def export_models():
+from model_loader import (EXPORT_MANIFEST_FILE, ONNX_MODEL_FILE, file_sha256, onnx_dir, stale_export_reasons,
+                          ultralytics_version)
+
+MODEL_BASENAMES = ["yolo11n-pose", "yolo11n"]
+PRECISIONS = ["fp32", "fp16", "int8"]
+CALIBRATION_DIR = "calibration_frames"
+IMGSZ = 640
+# Channel order of the NCNN model input. ultralytics converts frames BGR -> RGB before inference,
+# so ncnn2table must convert the (BGR) calibration JPEGs the same way.
+CALIBRATION_PIXEL = "RGB"
+# cv2.dnn (OpenCV 4.5 on Raspberry Pi OS) does not support newer ONNX opsets
+ONNX_OPSET = 12
+
+
+def variant_dir(model_basename: str, precision: str) -> str:
+    """Folder name of an exported NCNN variant (fp32 keeps the default ultralytics name)."""
+    base = f"{model_basename}_ncnn_model"
+    return base if precision == "fp32" else f"{base}_{precision}"
+
+
+def record_calibration_frames(camera_index: int = 0, out_dir: str = CALIBRATION_DIR,
+                              count: int = 200, interval_sec: float = 0.5):
+    """Record booth frames from the camera to use as the INT8 calibration / evaluation set."""
+    import cv2
+    import time
+
+    os.makedirs(out_dir, exist_ok=True)
+    cap = cv2.VideoCapture(camera_index)
+    if not cap.isOpened():
+        print(f"Error: could not open camera {camera_index}.")
+        return
+    print(f"Recording {count} frames to '{out_dir}' (one every {interval_sec}s)...")
+    saved = 0
+    try:
+        while saved < count:
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            # Store mirrored frames, as main.py feeds mirrored frames to the models
+            cv2.imwrite(os.path.join(out_dir, f"frame_{saved:04d}.jpg"), cv2.flip(frame, 1))
+            saved += 1
+            time.sleep(interval_sec)
+    finally:
+        cap.release()
+    print(f"Recorded {saved} frames.")
+
+
+def build_calibration_set(frames_dir: str, work_dir: str, imgsz: int = IMGSZ, max_images: int = 200):
+    """
+    Letterbox recorded booth frames to the model input size and write an ncnn2table image list.
+    Returns the path of the image list, or None if no frames were found.
+    """
+    import cv2
+    import numpy as np
+
+    paths = sorted(glob.glob(os.path.join(frames_dir, "*.jpg")) + glob.glob(os.path.join(frames_dir, "*.png")))
+    if not paths:
+        return None
+    # Sample evenly over the whole recording to avoid bias toward one scene
+    step = max(1, len(paths) // max_images)
+    paths = paths[::step][:max_images]
+
+    os.makedirs(work_dir, exist_ok=True)
+    list_path = os.path.join(work_dir, "imagelist.txt")
+    with open(list_path, "w") as f:
+        for i, path in enumerate(paths):
+            img = cv2.imread(path)
+            h, w = img.shape[:2]
+            scale = imgsz / max(h, w)
+            resized = cv2.resize(img, (int(round(w * scale)), int(round(h * scale))))
+            canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+            top = (imgsz - resized.shape[0]) // 2
+            left = (imgsz - resized.shape[1]) // 2
+            canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+            out_path = os.path.abspath(os.path.join(work_dir, f"calib_{i:04d}.jpg"))
+            cv2.imwrite(out_path, canvas)
+            f.write(out_path + "\n")
+    print(f"Calibration set: {len(paths)} frames from '{frames_dir}'.")
+    return list_path
+
+
+def calibration_digest(frames_dir: str, max_images: int = 200):
+    """SHA-256 over the recorded frames build_calibration_set would use, or None if there are none."""
+    paths = sorted(glob.glob(os.path.join(frames_dir, "*.jpg")) + glob.glob(os.path.join(frames_dir, "*.png")))
+    if not paths:
+        return None
+    step = max(1, len(paths) // max_images)
+    digest = hashlib.sha256()
+    for path in paths[::step][:max_images]:
+        digest.update(os.path.basename(path).encode())
+        digest.update(file_sha256(path).encode())
+    return digest.hexdigest()
+
+
+def export_manifest(source_sha256: str, precision: str, imgsz: int, calibration: str = None,
+                    export_format: str = "ncnn") -> dict:
+    """Settings an export was built from; an export whose manifest matches is up to date."""
+    manifest = {
+        "format": export_format,
+        "source_sha256": source_sha256,
+        "imgsz": imgsz,
+        "half": precision == "fp16",
+        "int8": precision == "int8",
+        "ultralytics": ultralytics_version(),
+    }
+    if precision == "int8":
+        manifest["calibration_sha256"] = calibration
+        # INT8 tables calibrated with the wrong channel order (before this key existed) are stale
+        manifest["calibration_pixel"] = CALIBRATION_PIXEL
+    return manifest
+
+
+def write_manifest(target: str, model_basename: str, manifest: dict):
+    """Written last, so a folder with a manifest is a complete export."""
+    with open(os.path.join(target, EXPORT_MANIFEST_FILE), "w") as f:
+        json.dump(dict(manifest, source=f"{model_basename}.pt"), f, indent=2)
+
+
+def export_ncnn(model_basename: str, precision: str, imgsz: int = IMGSZ, manifest: dict = None):
+    """
+    Export one FP32 / FP16 NCNN variant into its own folder.
+    ultralytics writes the export next to the weights, so it runs on a copy of the .pt in a
+    scratch folder; exports of the same model can then run in parallel without clobbering each other.
+    """
+    print(f"Exporting {model_basename}.pt ({precision})...")
+    target = variant_dir(model_basename, precision)
+    with tempfile.TemporaryDirectory(prefix=f".export_{target}_", dir=".") as work_dir:
+        weights = shutil.copy(f"{model_basename}.pt", work_dir)
+        model = YOLO(weights)
+        exported = model.export(format="ncnn", imgsz=imgsz, half=(precision == "fp16"))
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        shutil.move(exported, target)
+    if manifest is not None:
+        write_manifest(target, model_basename, manifest)
+    return target
+
+
+def export_onnx(model_basename: str, imgsz: int = IMGSZ, manifest: dict = None):
+    """
+    Export a static-shape FP32 ONNX model for the torch-free backends (onnxruntime / cv2.dnn).
+    The NMS-free raw output is decoded by backends.decode.
+    """
+    print(f"Exporting {model_basename}.pt (onnx)...")
+    target = onnx_dir(model_basename)
+    with tempfile.TemporaryDirectory(prefix=f".export_{target}_", dir=".") as work_dir:
+        weights = shutil.copy(f"{model_basename}.pt", work_dir)
+        exported = YOLO(weights).export(format="onnx", imgsz=imgsz, opset=ONNX_OPSET, dynamic=False)
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        os.makedirs(target)
+        shutil.move(exported, os.path.join(target, ONNX_MODEL_FILE))
+    if manifest is not None:
+        write_manifest(target, model_basename, manifest)
+    return target
+
+
+def quantize_int8(model_basename: str, list_path: str, imgsz: int = IMGSZ, manifest: dict = None):
+    """
+    Build the INT8 variant from the FP32 NCNN export with the ncnn calibration tools
+    (ncnn2table / ncnn2int8 must be on PATH).
+    """
+    for tool in ("ncnn2table", "ncnn2int8"):
+        if shutil.which(tool) is None:
+            print(f"Warning: '{tool}' not found on PATH. Skipping INT8 export of {model_basename}.")
+            return None
+
+    src = variant_dir(model_basename, "fp32")
+    target = variant_dir(model_basename, "int8")
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.makedirs(target)
+    param, binary = os.path.join(src, "model.ncnn.param"), os.path.join(src, "model.ncnn.bin")
+    table = os.path.join(target, "model.table")
+
+    print(f"Calibrating {model_basename} for INT8...")
+    norm = 1.0 / 255.0
+    subprocess.run([
+        "ncnn2table", param, binary, list_path, table,
+        "mean=[0,0,0]", f"norm=[{norm},{norm},{norm}]", f"shape=[{imgsz},{imgsz},3]",
+        f"pixel={CALIBRATION_PIXEL}", "thread=4", "method=kl",
+    ], check=True)
+    subprocess.run([
+        "ncnn2int8", param, binary,
+        os.path.join(target, "model.ncnn.param"), os.path.join(target, "model.ncnn.bin"), table,
+    ], check=True)
+    # ultralytics reads task/imgsz/names from metadata.yaml; it is identical to the FP32 export
+    shutil.copy(os.path.join(src, "metadata.yaml"), os.path.join(target, "metadata.yaml"))
+    if manifest is not None:
+        write_manifest(target, model_basename, manifest)
+    return target
+
+
+def run_export_job(model_basename: str, steps: list, imgsz: int, list_path: str = None):
+    """
+    Worker entry point: run one model's dependent steps in order.
+    steps is a list of (precision, manifest); "int8" reads the "fp32" folder, so they share a job.
+    """
+    done = []
+    for precision, manifest in steps:
+        if precision == "int8":
+            target = quantize_int8(model_basename, list_path, imgsz, manifest)
+        elif precision == "onnx":
+            target = export_onnx(model_basename, imgsz, manifest)
+        else:
+            target = export_ncnn(model_basename, precision, imgsz, manifest)
+        if target is not None:
+            done.append(target)
+    return done
+
+
+def plan_exports(precisions, imgsz: int, calibration: str = None, force: bool = False, onnx: bool = False):
+    """
+    Compare each requested variant's manifest with the current settings and group the
+    out-of-date ones into independent jobs: {(model, "fp16"): steps, (model, "fp32"): steps, (model, "onnx"): steps}.
+    """
+    jobs = {}
+    for model_basename in MODEL_BASENAMES:
+        source_sha256 = file_sha256(f"{model_basename}.pt")
+        wanted = [p for p in PRECISIONS if p in precisions and (p != "int8" or calibration is not None)]
+        stale = {}
+        for precision in wanted:
+            manifest = export_manifest(source_sha256, precision, imgsz, calibration)
+            target = variant_dir(model_basename, precision)
+            reasons = ["--force"] if force else stale_export_reasons(target, manifest)
+            if not reasons:
+                print(f"{target}: up to date, skipped.")
+                continue
+            print(f"{target}: {'; '.join(reasons)}")
+            stale[precision] = manifest
+
+        # INT8 is quantized from the FP32 folder: rebuild FP32 if it is missing or stale
+        # (even when FP32 itself was not requested), and re-quantize whenever FP32 changes.
+        fp32_manifest = export_manifest(source_sha256, "fp32", imgsz)
+        if "int8" in wanted and "fp32" not in stale and \
+                stale_export_reasons(variant_dir(model_basename, "fp32"), fp32_manifest):
+            stale["fp32"] = fp32_manifest
+        if "fp32" in stale and "int8" in wanted and "int8" not in stale:
+            stale["int8"] = export_manifest(source_sha256, "int8", imgsz, calibration)
+
+        if "fp16" in stale:
+            jobs[(model_basename, "fp16")] = [("fp16", stale["fp16"])]
+        chain = [(p, stale[p]) for p in ("fp32", "int8") if p in stale]
+        if chain:
+            jobs[(model_basename, chain[0][0])] = chain
+
+        if onnx:
+            manifest = export_manifest(source_sha256, "fp32", imgsz, export_format="onnx")
+            target = onnx_dir(model_basename)
+            reasons = ["--force"] if force else stale_export_reasons(target, manifest)
+            if reasons:
+                print(f"{target}: {'; '.join(reasons)}")
+                jobs[(model_basename, "onnx")] = [("onnx", manifest)]
+            else:
+                print(f"{target}: up to date, skipped.")
+    return jobs
+
+
+def export_models(precisions=PRECISIONS, calibration_dir: str = CALIBRATION_DIR, imgsz: int = IMGSZ,
+                  jobs: int = None, force: bool = False, onnx: bool = False):
     print("Exporting models to NCNN format...")
-    
+
     # Check if model files exist
-    if not os.path.exists("yolo11n-pose.pt"):
-        print("Error: yolo11n-pose.pt not found.")
-        return
-    if not os.path.exists("yolo11n.pt"):
-        print("Error: yolo11n.pt not found.")
+    for model_basename in MODEL_BASENAMES:
+        if not os.path.exists(f"{model_basename}.pt"):
+            print(f"Error: {model_basename}.pt not found.")
+            return
+
+    calibration = None
+    if "int8" in precisions:
+        calibration = calibration_digest(calibration_dir)
+        if calibration is None:
+            print(f"Warning: no recorded frames in '{calibration_dir}'. Skipping INT8 export.")
+            print("Record some with: python src/export_logic.py --record 200")
+
+    planned = plan_exports(precisions, imgsz, calibration, force, onnx)
+    if not planned:
+        print("All exports are up to date.")
         return
 
-    # 1. Pose Model
-    print("Exporting yolo11n-pose.pt...")
-    model_pose = YOLO("yolo11n-pose.pt")
-    model_pose.export(format="ncnn")
-    
-    # 2. Detection Model
-    print("Exporting yolo11n.pt...")
-    model_det = YOLO("yolo11n.pt")
-    model_det.export(format="ncnn")
-    
+    # Letterbox the calibration frames only when some INT8 variant is actually rebuilt
+    list_path = None
+    if any(p == "int8" for steps in planned.values() for p, _ in steps):
+        list_path = build_calibration_set(calibration_dir, os.path.join(calibration_dir, "_letterboxed"), imgsz)
+
+    workers = min(len(planned), jobs or os.cpu_count() or 1)
+    print(f"Running {len(planned)} export job(s) on {workers} worker process(es)...")
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_export_job, model_basename, steps, imgsz, list_path): (model_basename, first)
+                   for (model_basename, first), steps in planned.items()}
+        for future in as_completed(futures):
+            model_basename, first = futures[future]
+            try:
+                for target in future.result():
+                    print(f"Exported {target}")
+            except Exception as e:
+                failed += 1
+                print(f"Error: export of {model_basename} ({first}) failed: {e}")
+
+    if failed:
+        print(f"Export finished with {failed} failed job(s).")
+        return
     print("Export complete. '_ncnn_model' folders created.")
+    print("Measure accuracy/latency of each variant with: python src/evaluate_variants.py")
+    print("Compare .pt / NCNN / ONNX backends with: python src/benchmark_backends.py")
+
 
 if __name__ == "__main__":
-    export_models()
+    parser = argparse.ArgumentParser(description="Export YOLO models to NCNN (FP32 / FP16 / INT8).")
+    parser.add_argument("--precisions", nargs="+", choices=PRECISIONS, default=PRECISIONS)
+    parser.add_argument("--calibration-dir", default=CALIBRATION_DIR)
+    parser.add_argument("--imgsz", type=int, default=IMGSZ)
+    parser.add_argument("--record", type=int, default=0, metavar="N",
+                        help="record N calibration frames from the camera instead of exporting")
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="number of export worker processes (default: one per independent export)")
+    parser.add_argument("--force", action="store_true", help="re-export even if the manifest matches")
+    parser.add_argument("--onnx", action="store_true",
+                        help="also export ONNX models for the onnxruntime / cv2.dnn backends")
+    args = parser.parse_args()
+
+    if args.record > 0:
+        record_calibration_frames(args.camera, args.calibration_dir, args.record)
+    else:
+        export_models(args.precisions, args.calibration_dir, args.imgsz, args.jobs, args.force, args.onnx)
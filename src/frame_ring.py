@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+プロセス間でフレームを受け渡すための共有メモリ・リングバッファ。
+
+フレーム本体は ``multiprocessing.shared_memory`` 上に事前確保したスロットへ書き込み、
+キューにはシーケンス番号とスロット番号などの小さなメタデータだけを流す。
+"""
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+# スロットごとのヘッダ: [シーケンス番号, キャプチャ時刻(ns)]
+_HEADER_FIELDS = 2
+
+
+class SharedFrameRing:
+    """
+    固定サイズのフレームスロットを持つリングバッファ。
+
+    書き込み側 (1プロセス) は ``write()`` でフレームをコピーし、
+    読み込み側は ``read_into()`` で自前のバッファへコピーする。
+    コピー前後でスロットのシーケンス番号を比較し、途中で上書きされた場合は失敗を返す (seqlock方式)。
+    """
+    def __init__(self, name=None, slots: int = 8, shape=(480, 640, 3), create: bool = False):
+        """
+        :param name: 共有メモリ名 (attach時は必須)
+        :param slots: スロット数
+        :param shape: 1フレームの形状 (H, W, C)
+        :param create: Trueなら新規作成、Falseなら既存の共有メモリにattachする
+        """
+        self.slots = slots
+        self.shape = tuple(shape)
+        frame_bytes = int(np.prod(self.shape))
+        header_bytes = slots * _HEADER_FIELDS * 8
+        size = header_bytes + slots * frame_bytes
+
+        self.is_owner = create
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.name = self.shm.name
+
+        self._header = np.ndarray((slots, _HEADER_FIELDS), dtype=np.int64, buffer=self.shm.buf)
+        self._frames = np.ndarray((slots,) + self.shape, dtype=np.uint8,
+                                  buffer=self.shm.buf, offset=header_bytes)
+        if create:
+            self._header[:] = -1
+        self._next_seq = 0
+
+    @classmethod
+    def create(cls, slots: int = 8, shape=(480, 640, 3)):
+        return cls(slots=slots, shape=shape, create=True)
+
+    @classmethod
+    def attach(cls, name: str, slots: int = 8, shape=(480, 640, 3)):
+        return cls(name=name, slots=slots, shape=shape, create=False)
+
+    def slot_of(self, seq: int) -> int:
+        return seq % self.slots
+
+    def write(self, frame, capture_ns=None):
+        """
+        フレームを次のスロットへコピーする。
+        :return: (seq, slot)
+        """
+        seq = self._next_seq
+        slot = seq % self.slots
+        header = self._header[slot]
+        # 書き込み中は無効化しておき、読み込み側に途中のデータを使わせない
+        header[0] = -1
+        np.copyto(self._frames[slot], frame)
+        header[1] = capture_ns if capture_ns is not None else time.monotonic_ns()
+        header[0] = seq
+        self._next_seq = seq + 1
+        return seq, slot
+
+    def view(self, slot: int) -> np.ndarray:
+        """スロットのゼロコピー参照 (書き込み側に上書きされうることに注意)"""
+        return self._frames[slot]
+
+    def read_into(self, seq: int, out) -> bool:
+        """
+        指定シーケンスのフレームをoutへコピーする。
+        :return: 取得できればTrue。既に上書きされていた場合はFalse
+        """
+        slot = seq % self.slots
+        if self._header[slot, 0] != seq:
+            return False
+        np.copyto(out, self._frames[slot])
+        # コピー中に上書きされていないか確認
+        return self._header[slot, 0] == seq
+
+    def latest_seq(self) -> int:
+        """書き込みが完了している最新のシーケンス番号 (まだなければ -1)"""
+        return int(self._header[:, 0].max())
+
+    def capture_ns(self, seq: int):
+        slot = seq % self.slots
+        if self._header[slot, 0] != seq:
+            return None
+        return int(self._header[slot, 1])
+
+    def close(self):
+        # numpyのビューが残っているとcloseできないため先に解放する
+        self._header = None
+        self._frames = None
+        self.shm.close()
+        if self.is_owner:
+            self.shm.unlink()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+COCOキーポイントに対するジェスチャー判定ルールの小さなDSLと、そのベクトル化評価器。
+
+ルールは1行に1つの条件を書き、ジェスチャーは条件すべてを満たすとき成立する (AND)。
+    <関節> above|below|left_of|right_of <関節> [by <肩幅に対する倍率>]
+    dist|dx|dy(<関節>, <関節>) <|> <倍率> * dist|dx|dy(<関節>, <関節>)
+例:
+    "l_wrist above l_elbow"
+    "dist(l_wrist, r_wrist) < 1.2 * dist(l_shoulder, r_shoulder)"
+
+Y座標は画面上が0なので「above」は y が小さいこと、「left_of」は画面上で x が小さいこと。
+``by`` を付けると肩幅の何倍以上離れているかを要求する。
+条件に現れる関節の信頼度が min_conf 未満の人は、そのジェスチャーを判定しない (不成立)。
+
+compile_gestures() で全ジェスチャーの条件を NumPy の表 (関節インデックス・軸・符号・倍率の配列) に変換し、
+evaluate() で (N, 17, 3) のキーポイントに対して全員・全ジェスチャーを一度に判定して
+(N, G) の一致行列とスコアを返す。人数やジェスチャー数が増えても Python のループは増えない。
+
+COCOの17点には指がないため、ピースサインのような指の形は判定できない。
+"""
+import re
+
+import numpy as np
+
+# COCO キーポイントのインデックス
+KEYPOINTS = {
+    "nose": 0, "l_eye": 1, "r_eye": 2, "l_ear": 3, "r_ear": 4,
+    "l_shoulder": 5, "r_shoulder": 6, "l_elbow": 7, "r_elbow": 8, "l_wrist": 9, "r_wrist": 10,
+    "l_hip": 11, "r_hip": 12, "l_knee": 13, "r_knee": 14, "l_ankle": 15, "r_ankle": 16,
+}
+
+# スコアのスケール (肩幅) を求める関節
+_SCALE_JOINTS = (KEYPOINTS["l_shoulder"], KEYPOINTS["r_shoulder"])
+
+# 既定のジェスチャー
+DEFAULT_RULES = {
+    # 丸: 手首が肘より上、肘が肩より上、手首同士が肩幅の1.2倍以内
+    "circle": [
+        "l_wrist above l_elbow", "r_wrist above r_elbow",
+        "l_elbow above l_shoulder", "r_elbow above r_shoulder",
+        "dist(l_wrist, r_wrist) < 1.2 * dist(l_shoulder, r_shoulder)",
+    ],
+    # 両手を上げる (キャンセル): 両手首が頭より上で、肩幅より大きく開いている
+    "hands_up": [
+        "l_wrist above nose by 0.3", "r_wrist above nose by 0.3",
+        "dx(l_wrist, r_wrist) > 1.5 * dist(l_shoulder, r_shoulder)",
+    ],
+    # 指さし (フィルター選択): 片腕を肩の高さで画面の左/右へ伸ばす
+    "point_left": [
+        "r_wrist left_of r_shoulder by 1.2",
+        "dy(r_wrist, r_shoulder) < 0.5 * dist(l_shoulder, r_shoulder)",
+        "l_wrist below l_elbow",
+    ],
+    "point_right": [
+        "l_wrist right_of l_shoulder by 1.2",
+        "dy(l_wrist, l_shoulder) < 0.5 * dist(l_shoulder, r_shoulder)",
+        "r_wrist below r_elbow",
+    ],
+}
+
+_ORDER = re.compile(r"^\s*(\w+)\s+(above|below|left_of|right_of)\s+(\w+)(?:\s+by\s+([-+]?[0-9.]+))?\s*$")
+_METRIC = re.compile(
+    r"^\s*(dist|dx|dy)\(\s*(\w+)\s*,\s*(\w+)\s*\)\s*([<>])\s*([0-9.]+)\s*\*\s*(dist|dx|dy)\(\s*(\w+)\s*,\s*(\w+)\s*\)\s*$")
+
+# above/below は y軸、left_of/right_of は x軸。符号は「bの座標 - aの座標」に掛ける
+_ORDER_AXIS = {"above": (1, 1.0), "below": (1, -1.0), "left_of": (0, 1.0), "right_of": (0, -1.0)}
+_METRIC_KIND = {"dist": 0, "dx": 1, "dy": 2}
+
+
+def _joint(name: str) -> int:
+    try:
+        return KEYPOINTS[name]
+    except KeyError:
+        raise ValueError(f"unknown keypoint '{name}' (expected one of {', '.join(KEYPOINTS)})") from None
+
+
+def parse_rule(text: str) -> tuple:
+    """
+    1行のルールを解析する。
+    :return: ("order", a, b, axis, sign, margin) または ("metric", kind, a, b, sign, ratio, ref_kind, ref_a, ref_b)
+    """
+    m = _ORDER.match(text)
+    if m:
+        a, op, b, margin = m.groups()
+        axis, sign = _ORDER_AXIS[op]
+        return ("order", _joint(a), _joint(b), axis, sign, float(margin or 0.0))
+    m = _METRIC.match(text)
+    if m:
+        kind, a, b, op, ratio, ref_kind, ref_a, ref_b = m.groups()
+        # "<" は ratio*ref - value > 0、">" は value - ratio*ref > 0 を満たすかで判定する
+        sign = 1.0 if op == "<" else -1.0
+        return ("metric", _METRIC_KIND[kind], _joint(a), _joint(b), sign, float(ratio),
+                _METRIC_KIND[ref_kind], _joint(ref_a), _joint(ref_b))
+    raise ValueError(f"cannot parse gesture rule: '{text}'")
+
+
+class GestureSet:
+    """
+    コンパイル済みのジェスチャー集合。
+    条件 (述語) を種類ごとの配列にまとめ、ジェスチャーとの対応を (P, G) の行列で持つ。
+    """
+    def __init__(self, rules: dict, min_conf: float = 0.5):
+        self.names = list(rules)
+        self.min_conf = min_conf
+
+        order, metric = [], []
+        order_owner, metric_owner = [], []
+        joints = np.zeros((len(KEYPOINTS), len(self.names)), dtype=bool)
+        for g, name in enumerate(self.names):
+            if not rules[name]:
+                raise ValueError(f"gesture '{name}' has no rules")
+            for text in rules[name]:
+                rule = parse_rule(text)
+                if rule[0] == "order":
+                    order.append(rule[1:])
+                    order_owner.append(g)
+                    joints[[rule[1], rule[2]], g] = True
+                else:
+                    metric.append(rule[1:])
+                    metric_owner.append(g)
+                    joints[[rule[2], rule[3], rule[7], rule[8]], g] = True
+
+        # 全述語で使う関節ペアを1つの表にまとめ、評価時は1回のインデックス参照で差分 (a - b) を取る。
+        # 行の並び: [順序条件 (Po行), 距離条件の値 (Pm行), 距離条件の基準 (Pm行), 肩幅 (1行)]
+        order = np.array(order, dtype=np.float64).reshape(-1, 5)
+        metric = np.array(metric, dtype=np.float64).reshape(-1, 8)
+        self._n_order = len(order)
+        self._n_metric = len(metric)
+        ls, rs = _SCALE_JOINTS
+        self._pair_a = np.concatenate([order[:, 0], metric[:, 1], metric[:, 6], [ls]]).astype(np.intp)
+        self._pair_b = np.concatenate([order[:, 1], metric[:, 2], metric[:, 7], [rs]]).astype(np.intp)
+
+        # 順序条件: sign * (b - a)[axis] - margin * 肩幅 > 0。(a - b) に掛ける重み (Po, 2) にしておく
+        axis = order[:, 2].astype(np.intp)
+        self._order_w = np.zeros((len(order), 2), dtype=np.float32)
+        self._order_w[np.arange(len(order)), axis] = -order[:, 3]
+        self._order_margin = order[:, 4].astype(np.float32)
+
+        # 距離条件: dist / dx / dy はどれも sqrt(wx*dx^2 + wy*dy^2) で表せる
+        kinds = np.concatenate([metric[:, 0], metric[:, 5], [_METRIC_KIND["dist"]]]).astype(np.intp)
+        self._radial_w = np.array([[1, 1], [1, 0], [0, 1]], dtype=np.float32)[kinds]
+        self._metric_sign = metric[:, 3].astype(np.float32)
+        self._metric_ratio = metric[:, 4].astype(np.float32)
+
+        # 述語 -> ジェスチャーの対応 (P, G) と、ジェスチャーごとの述語数・必要な関節
+        owners = np.array(order_owner + metric_owner, dtype=np.intp)
+        self._membership = np.zeros((len(owners), len(self.names)), dtype=np.float32)
+        self._membership[np.arange(len(owners)), owners] = 1.0
+        self._counts = self._membership.sum(axis=0)
+        self._joints = joints.astype(np.float32) # (17, G)
+        self._joint_counts = self._joints.sum(axis=0)
+
+    def index(self, name: str) -> int:
+        return self.names.index(name)
+
+    def evaluate(self, keypoints):
+        """
+        全員・全ジェスチャーをまとめて判定する。
+        :param keypoints: (N, 17, 3) のキーポイント (x, y, 信頼度)
+        :return: (matches (N, G) bool, scores (N, G) float32)
+                 スコアは条件ごとの余裕 (肩幅で正規化し0-1に丸めたもの) の平均と、関節の平均信頼度の積
+        """
+        kpts = np.asarray(keypoints, dtype=np.float32)
+        n, g = kpts.shape[0], len(self.names)
+        if n == 0:
+            return np.zeros((0, g), dtype=bool), np.zeros((0, g), dtype=np.float32)
+
+        delta = kpts[:, self._pair_a, :2] - kpts[:, self._pair_b, :2] # (N, Q, 2)
+        po, pm = self._n_order, self._n_metric
+        order = (delta[:, :po] * self._order_w).sum(axis=2)
+        radial = np.sqrt((delta[:, po:] ** 2 * self._radial_w).sum(axis=2))
+        value, ref = radial[:, :pm], radial[:, pm:2 * pm]
+        scale = np.maximum(radial[:, -1:], 1e-6) # 肩幅
+
+        # 余裕 (正なら条件を満たす) を肩幅で正規化して並べる (N, P)
+        margins = np.empty((n, po + pm), dtype=np.float32)
+        margins[:, :po] = order / scale - self._order_margin
+        margins[:, po:] = self._metric_sign * (self._metric_ratio * ref - value) / scale
+        passed = (margins > 0).astype(np.float32)
+
+        # 全条件を満たし、使う関節の信頼度がすべて min_conf 以上
+        conf = kpts[:, :, 2]
+        low_conf = (conf < self.min_conf).astype(np.float32)
+        matches = (passed @ self._membership == self._counts) & (low_conf @ self._joints == 0)
+
+        strength = np.clip(margins, 0.0, 1.0) @ self._membership / self._counts
+        mean_conf = conf @ self._joints / self._joint_counts
+        return matches, (strength * mean_conf).astype(np.float32)
+
+
+def compile_gestures(rules: dict = None, min_conf: float = 0.5) -> GestureSet:
+    """ルール (ジェスチャー名 -> 条件のリスト) をコンパイルする。省略時は DEFAULT_RULES"""
+    return GestureSet(DEFAULT_RULES if rules is None else rules, min_conf)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+温度とCPU負荷に応じて処理量を段階的に落とすパフォーマンス・ガバナー。
+
+ファンのないRaspberry Piでは20〜30分ほどでサーマルスロットリングが始まり、
+同じ処理量のままだとFPSが予測できない形で落ちる。そこで一定間隔で
+  - /sys/class/thermal の温度
+  - psutil のCPU使用率
+を読み、劣化レベルを1段ずつ上げ下げする。レベルが上がるほど
+推論間隔を延ばし、推論解像度を下げ、描画を簡略化し、最終段ではREADY状態の
+姿勢推定を人物検出 (detectモデル) に置き換える。
+上げるときと下げるときの閾値に差 (ヒステリシス) をつけ、境界付近でレベルが振動しないようにする。
+"""
+import os
+import glob
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import metrics
+from event_log import events
+
+
+@dataclass(frozen=True)
+class PerformanceLevel:
+    name: str
+    inference_interval: int      # 何フレームに1回推論するか
+    imgsz: Optional[int]         # 推論の入力サイズ (Noneならモデルの既定値)
+    cheap_overlays: bool         # 関節・ラベルの描画を省略する
+    pose_in_ready: bool          # READYで姿勢推定を使う (Falseなら人物検出で開始する)
+    enter_temp_c: float          # この温度以上でこのレベルへ上げる
+    enter_cpu_percent: float     # このCPU使用率以上でこのレベルへ上げる
+
+
+LEVELS = (
+    PerformanceLevel("normal", 5, None, False, True, 0.0, 0.0),
+    PerformanceLevel("warm", 8, 480, False, True, 65.0, 85.0),
+    PerformanceLevel("hot", 12, 320, True, True, 72.0, 92.0),
+    PerformanceLevel("critical", 15, 320, True, False, 78.0, 97.0),
+)
+
+
+@dataclass
+class SensorReading:
+    temp_c: Optional[float]  # 取得できない環境ではNone
+    cpu_percent: float
+
+
+class SystemSensor:
+    """実機のセンサー: 全サーマルゾーンの最高温度と、前回呼び出しからのCPU使用率"""
+    def __init__(self, thermal_glob: str = "/sys/class/thermal/thermal_zone*/temp"):
+        self.thermal_paths = sorted(glob.glob(thermal_glob))
+        try:
+            import psutil
+            self._psutil = psutil
+            psutil.cpu_percent(interval=None) # 初回は0が返るので基準値を取っておく
+        except ImportError:
+            self._psutil = None
+
+    def read_temperature(self) -> Optional[float]:
+        temps = []
+        for path in self.thermal_paths:
+            try:
+                with open(path, "r") as f:
+                    temps.append(int(f.read().strip()) / 1000.0) # ミリ度
+            except (OSError, ValueError):
+                continue
+        return max(temps) if temps else None
+
+    def read_cpu_percent(self) -> float:
+        if self._psutil is not None:
+            return self._psutil.cpu_percent(interval=None)
+        # psutilがない場合はロードアベレージから概算する
+        try:
+            return min(100.0, os.getloadavg()[0] / (os.cpu_count() or 1) * 100.0)
+        except OSError:
+            return 0.0
+
+    def read(self) -> SensorReading:
+        return SensorReading(self.read_temperature(), self.read_cpu_percent())
+
+
+class FakeSensor:
+    """テスト用のセンサー。set() した値、または readings を順に返す"""
+    def __init__(self, temp_c: Optional[float] = 50.0, cpu_percent: float = 30.0, readings=None):
+        self.reading = SensorReading(temp_c, cpu_percent)
+        self.readings = list(readings) if readings else []
+
+    def set(self, temp_c: Optional[float] = None, cpu_percent: Optional[float] = None):
+        if temp_c is not None:
+            self.reading.temp_c = temp_c
+        if cpu_percent is not None:
+            self.reading.cpu_percent = cpu_percent
+
+    def read(self) -> SensorReading:
+        if self.readings:
+            self.reading = self.readings.pop(0)
+        return SensorReading(self.reading.temp_c, self.reading.cpu_percent)
+
+
+class PerformanceGovernor:
+    """
+    sample_interval_sec ごとにセンサーを読み、劣化レベルを決める。
+    メインループからは毎フレーム update() を呼び、返ってきたレベルの設定に従う。
+    """
+    def __init__(self, sensor=None, levels=LEVELS, sample_interval_sec: float = 2.0,
+                 temp_hysteresis_c: float = 5.0, cpu_hysteresis_percent: float = 15.0,
+                 min_dwell_sec: float = 10.0, clock=time.monotonic):
+        """
+        :param sensor: read() で SensorReading を返すもの (省略時は SystemSensor)
+        :param min_dwell_sec: レベルを下げるまでに現在のレベルに留まる最短時間
+        :param clock: 時刻関数 (テストで差し替える)
+        """
+        self.sensor = sensor if sensor is not None else SystemSensor()
+        self.levels = levels
+        self.sample_interval_sec = sample_interval_sec
+        self.temp_hysteresis_c = temp_hysteresis_c
+        self.cpu_hysteresis_percent = cpu_hysteresis_percent
+        self.min_dwell_sec = min_dwell_sec
+        self.clock = clock
+
+        self.index = 0
+        self.last_reading = None
+        self._next_sample = 0.0
+        self._changed_at = clock()
+        metrics.governor_level.set(0)
+
+    @property
+    def level(self) -> PerformanceLevel:
+        return self.levels[self.index]
+
+    def _exceeds(self, level, reading, temp_margin: float = 0.0, cpu_margin: float = 0.0) -> bool:
+        """readingがlevelに入る条件 (から余裕分を引いた値) 以上か"""
+        hot = reading.temp_c is not None and reading.temp_c >= level.enter_temp_c - temp_margin
+        busy = reading.cpu_percent >= level.enter_cpu_percent - cpu_margin
+        return hot or busy
+
+    def update(self, now: float = None) -> PerformanceLevel:
+        """必要ならセンサーを読んでレベルを更新し、現在のレベルを返す (サンプリング間隔外なら何もしない)"""
+        now = self.clock() if now is None else now
+        if now < self._next_sample:
+            return self.level
+        self._next_sample = now + self.sample_interval_sec
+
+        reading = self.sensor.read()
+        self.last_reading = reading
+        if reading.temp_c is not None:
+            metrics.temperature_celsius.set(reading.temp_c)
+        metrics.cpu_percent.set(reading.cpu_percent)
+
+        # 上げるのは1サンプルにつき1段ずつ (次の段の条件を満たしていれば)
+        if self.index + 1 < len(self.levels) and self._exceeds(self.levels[self.index + 1], reading):
+            self._set_index(self.index + 1, reading, now)
+        # 下げるのは、現在の段の条件をヒステリシス分下回り、かつ最短滞在時間を過ぎたとき
+        elif (self.index > 0 and now - self._changed_at >= self.min_dwell_sec
+              and not self._exceeds(self.level, reading, self.temp_hysteresis_c, self.cpu_hysteresis_percent)):
+            self._set_index(self.index - 1, reading, now)
+        return self.level
+
+    def _set_index(self, index: int, reading, now: float):
+        previous = self.level
+        self.index = index
+        self._changed_at = now
+        # 描画ループから呼ばれるので、コンソールへは書き込みスレッドに出力させる
+        events.log("governor_level", f"{previous.name} -> {self.level.name}", src=previous.name, dst=self.level.name,
+                   temp_c=round(reading.temp_c, 1) if reading.temp_c is not None else None,
+                   cpu_percent=round(reading.cpu_percent))
+        metrics.governor_level.set(index)
+        metrics.governor_changes_total.labels(self.level.name).inc()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+フレームの類似度をキーにした推論結果キャッシュ。
+
+READY中は無人のブースや静止した人など、ほぼ同じ映像が続くことが多い。
+縮小したグレー画像 (32x24) をフレームのシグネチャとし、
+前回推論したフレームとの差が閾値未満かつTTL以内であれば推論を省略して前回の結果を返す。
+
+差は画素 (= 元フレームの20x20ブロックの平均) ごとの差の最大値で測る。
+画面全体の平均では、腕を上げるなどの局所的な動き (このキャッシュの後ろにあるジェスチャー判定が
+見たいもの) が薄まって閾値を下回り、古い「ジェスチャーなし」の結果を返してしまう。
+"""
+import time
+import cv2
+import numpy as np
+from profiler import profiler
+
+
+class InferenceCache:
+    """
+    使用例:
+        cache = InferenceCache("gesture")
+        result = cache.get_or_compute(frame, detect_circle_gesture, frame)
+    """
+    def __init__(self, name: str, threshold: float = 12.0, ttl_sec: float = 2.0, size=(32, 24)):
+        """
+        :param name: プロファイラのカウンタ名 (cache_{name}_hit / cache_{name}_miss)
+        :param threshold: シグネチャ間の画素ごとの絶対差の最大値 (輝度 0-255) がこれ未満なら同一シーンとみなす
+        :param ttl_sec: キャッシュの有効期間 (秒)
+        :param size: シグネチャの解像度 (幅, 高さ)
+        """
+        self.name = name
+        self.threshold = threshold
+        self.ttl_sec = ttl_sec
+        self.size = size
+        self._hit_label = f"cache_{name}_hit"
+        self._miss_label = f"cache_{name}_miss"
+
+        # シグネチャ計算用のバッファ (毎回確保しない)
+        w, h = size
+        self._thumb = None
+        self._signature = np.empty((h, w), dtype=np.uint8)
+        self._cached_signature = np.empty((h, w), dtype=np.uint8)
+
+        self._result = None
+        self._timestamp = 0.0
+
+    def signature(self, frame) -> np.ndarray:
+        """フレームを縮小グレー画像に変換する (先に縮小してから色変換する方が軽い)"""
+        if frame.ndim == 2:
+            cv2.resize(frame, self.size, dst=self._signature, interpolation=cv2.INTER_AREA)
+            return self._signature
+        if self._thumb is None or self._thumb.shape[2] != frame.shape[2]:
+            w, h = self.size
+            self._thumb = np.empty((h, w, frame.shape[2]), dtype=np.uint8)
+        cv2.resize(frame, self.size, dst=self._thumb, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._thumb, cv2.COLOR_BGR2GRAY, dst=self._signature)
+        return self._signature
+
+    def distance(self, signature) -> float:
+        """キャッシュ済みシグネチャとの、画素ごとの絶対差の最大値 (ノイズは縮小で平均されるので小さい)"""
+        return cv2.norm(signature, self._cached_signature, cv2.NORM_INF)
+
+    def lookup(self, frame):
+        """
+        キャッシュが有効ならその結果を返し、無効ならNoneを返す。
+        lookup後にstoreを呼ぶと、lookupで計算したシグネチャがそのまま使われる。
+        """
+        signature = self.signature(frame)
+        if (self._result is not None
+                and time.monotonic() - self._timestamp < self.ttl_sec
+                and self.distance(signature) < self.threshold):
+            profiler.count(self._hit_label)
+            return self._result
+        profiler.count(self._miss_label)
+        return None
+
+    def store(self, result):
+        """直前のlookupで計算したシグネチャとともに結果を保存する"""
+        np.copyto(self._cached_signature, self._signature)
+        self._result = result
+        self._timestamp = time.monotonic()
+
+    def get_or_compute(self, frame, fn, *args, **kwargs):
+        """キャッシュが有効ならその結果を、無効なら fn(*args, **kwargs) を実行して結果を返す"""
+        result = self.lookup(frame)
+        if result is None:
+            result = fn(*args, **kwargs)
+            self.store(result)
+        return result
+
+    def clear(self):
+        self._result = None
+        self._timestamp = 0.0
+
+    @property
+    def hits(self) -> int:
+        return profiler.get_count(self._hit_label)
+
+    @property
+    def misses(self) -> int:
+        return profiler.get_count(self._miss_label)
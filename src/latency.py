@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+フレームの遅延の計測。
+
+推論は数フレームに1回で結果はキャッシュされるため、画面に重ねている検出結果は
+数百ms〜1秒以上前のフレームのものであることがある。フレームと推論結果 (PerceptionResult) に
+キャプチャ時刻を持たせ、次の区間を計測する。
+
+    capture_to_inference : キャプチャ -> 推論開始 (推論待ちの時間)
+    inference            : 推論開始 -> 推論完了
+    overlay_age          : 表示した検出結果の元フレームのキャプチャ -> 表示
+    frame_age            : 表示したフレームのキャプチャ -> 表示
+    glass_to_glass       : 画面の変化 -> カメラがそれを捉えるまで (FlashProbe による自己テスト)
+
+値はメトリクス (autoshutter_latency_seconds{path=...}) に流し、終了時に report() で分位点を出す。
+
+自己テスト (カメラを画面に向けて実行する):
+    python src/latency.py --camera 0 --trials 10
+画面を黒 -> 白に切り替え、カメラの画像が明るくなるまでの時間を測る。
+表示の遅れ (ウィンドウ・ディスプレイ) とキャプチャの遅れ (露光・転送・バッファ) の合計になる。
+"""
+import time
+import argparse
+from collections import deque
+
+import cv2
+import numpy as np
+
+import metrics
+
+PATHS = ("capture_to_inference", "inference", "overlay_age", "frame_age", "glass_to_glass")
+
+
+class LatencyTracker:
+    """区間ごとの遅延を集計する"""
+    def __init__(self, window: int = 500):
+        self.samples = {path: deque(maxlen=window) for path in PATHS}
+        self._seen = deque(maxlen=8) # 集計済みの推論結果 (推論完了時刻)。キャッシュから返った結果を二重に数えない
+
+    def _add(self, path: str, seconds: float):
+        self.samples[path].append(seconds)
+        metrics.latency_seconds.labels(path).observe(seconds)
+
+    def on_inference(self, result):
+        """推論結果を受け取ったときに呼ぶ。新しい推論の結果だけを集計する"""
+        if result is None or result.captured_at is None or result.inference_started is None:
+            return
+        if result.timestamp in self._seen:
+            return
+        self._seen.append(result.timestamp)
+        self._add("capture_to_inference", max(result.inference_started - result.captured_at, 0.0))
+        self._add("inference", max(result.timestamp - result.inference_started, 0.0))
+
+    def on_display(self, frame_captured_at: float, result=None, now: float = None):
+        """フレームを表示した直後に呼ぶ。result は画面に重ねている検出結果"""
+        now = time.monotonic() if now is None else now
+        if frame_captured_at is not None:
+            self._add("frame_age", now - frame_captured_at)
+        if result is not None and result.captured_at is not None:
+            self._add("overlay_age", now - result.captured_at)
+
+    def on_glass_to_glass(self, seconds: float):
+        self._add("glass_to_glass", seconds)
+
+    def summary(self) -> dict:
+        """区間ごとの {count, p50_ms, p95_ms, max_ms}"""
+        summary = {}
+        for path, values in self.samples.items():
+            if not values:
+                continue
+            ms = np.array(values) * 1000.0
+            summary[path] = {"count": len(ms), "p50_ms": float(np.percentile(ms, 50)),
+                             "p95_ms": float(np.percentile(ms, 95)), "max_ms": float(ms.max())}
+        return summary
+
+    def report(self):
+        summary = self.summary()
+        if not summary:
+            return
+        print("[Latency]")
+        for path, s in summary.items():
+            print(f"  {path:<22} n={s['count']:<5} p50={s['p50_ms']:7.1f}ms p95={s['p95_ms']:7.1f}ms "
+                  f"max={s['max_ms']:7.1f}ms")
+
+
+def draw_hud(frame, frame_seq: int, frame_captured_at: float, result, now: float = None):
+    """デバッグ用: フレームと重ねている検出結果の番号・古さを右下に表示する"""
+    now = time.monotonic() if now is None else now
+    lines = [f"frame #{frame_seq} age {(now - frame_captured_at) * 1000.0:.0f}ms"]
+    if result is not None and result.captured_at is not None:
+        line = f"overlay #{result.seq} age {(now - result.captured_at) * 1000.0:.0f}ms"
+        if result.inference_started is not None:
+            line += f" (infer {(result.timestamp - result.inference_started) * 1000.0:.0f}ms)"
+        lines.append(line)
+    else:
+        lines.append("overlay -")
+    h, w = frame.shape[:2]
+    for i, line in enumerate(reversed(lines)):
+        cv2.putText(frame, line, (w - 330, h - 30 - 22 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+
+
+class FlashProbe:
+    """
+    画面を黒から白に切り替え、カメラの画像の明るさが上がるまでの時間を測る (glass-to-glass)。
+    表示とカメラの操作は関数で受け取るので、実機以外 (テスト) でも動かせる。
+    """
+    def __init__(self, show, read, clock=time.monotonic, settle_sec: float = 1.0, timeout_sec: float = 2.0,
+                 threshold: float = 0.5):
+        """
+        :param show: (value) -> None。画面全体を value (0 または 255) で塗って表示する
+        :param read: () -> (ret, frame)。カメラから1フレーム読む
+        :param settle_sec: 黒を表示してから明るさの基準を測るまでの時間
+        :param threshold: 黒と白の明るさの差の何割を超えたら「白を捉えた」とみなすか
+        """
+        self.show = show
+        self.read = read
+        self.clock = clock
+        self.settle_sec = settle_sec
+        self.timeout_sec = timeout_sec
+        self.threshold = threshold
+
+    def _brightness(self):
+        ret, frame = self.read()
+        if not ret:
+            return None
+        return float(cv2.mean(frame)[0])
+
+    def _read_for(self, seconds: float):
+        """seconds の間フレームを読み捨て、最後の明るさを返す (バッファに溜まった古いフレームを流す)"""
+        end = self.clock() + seconds
+        value = None
+        while self.clock() < end:
+            current = self._brightness()
+            if current is not None:
+                value = current
+        return value
+
+    def trial(self):
+        """1回計測する。:return: 遅延 (秒)。白を捉えられなければNone"""
+        self.show(0)
+        dark = self._read_for(self.settle_sec)
+        self.show(255)
+        shown = self.clock()
+        samples = []
+        while self.clock() - shown < self.timeout_sec:
+            value = self._brightness()
+            if value is not None:
+                samples.append((self.clock(), value))
+        if dark is None or not samples:
+            return None
+        bright = max(value for _, value in samples)
+        if bright - dark < 10:
+            return None # 画面の変化が写っていない (カメラが画面に向いていない)
+        level = dark + (bright - dark) * self.threshold
+        for t, value in samples:
+            if value >= level:
+                return t - shown
+        return None
+
+    def run(self, trials: int = 10, tracker: LatencyTracker = None):
+        results = []
+        for i in range(trials):
+            latency = self.trial()
+            if latency is None:
+                print(f"[FlashProbe] {i + 1}: 画面の変化を検出できませんでした")
+                continue
+            results.append(latency)
+            if tracker is not None:
+                tracker.on_glass_to_glass(latency)
+            print(f"[FlashProbe] {i + 1}: {latency * 1000.0:.0f}ms")
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="画面のフラッシュでカメラ -> 表示の遅延を測る")
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.camera)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, args.width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, args.height)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    window = "latency probe"
+    cv2.namedWindow(window, cv2.WINDOW_NORMAL)
+    cv2.setWindowProperty(window, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    screen = np.zeros((args.height, args.width, 3), dtype=np.uint8)
+
+    def show(value):
+        screen[:] = value
+        cv2.imshow(window, screen)
+        cv2.waitKey(1)
+
+    try:
+        results = FlashProbe(show, cap.read).run(args.trials)
+    finally:
+        cap.release()
+        cv2.destroyAllWindows()
+    if results:
+        ms = np.array(results) * 1000.0
+        print(f"glass-to-glass: median={np.median(ms):.0f}ms min={ms.min():.0f}ms max={ms.max():.0f}ms (n={len(ms)})")
+
+
+if __name__ == "__main__":
+    main()
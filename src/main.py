@@ -4,12 +4,25 @@ import time
 import math
 from enum import Enum, auto
 from dataclasses import dataclass
-from ultralytics import YOLO # type: ignore
 
-from measure_distance import detect_person_distance2sideedge
-from detect_circle_gesture import detect_circle_gesture
+from measure_distance import detect_person_distance2sideedge, get_detect_model
+from detect_circle_gesture import detect_circle_gesture, get_pose_model
 from profiler import profiler
-from model_loader import load_model
+from event_log import events
+from inference_cache import InferenceCache
+from camera_tuner import get_or_tune_profile
+from capture_profiles import CaptureProfile, CaptureProfileSwitcher, STATE_PROFILES
+from yuyv_capture import YuyvCapture
+from governor import LEVELS, PerformanceGovernor
+from cascade import GestureCascade
+from blackbox import BlackBoxRecorder, SOURCE_DISTANCE, SOURCE_GESTURE
+from distance_control import DistanceController, PrintActuator
+from capture_supervisor import CaptureSupervisor
+from burst_capture import BurstCapture
+from latency import LatencyTracker, draw_hud
+import effects
+import metrics
+import renderer
 
 # --- 設定値管理 ---
 @dataclass(frozen=True)
@@ -43,8 +56,84 @@ class Config:
     # カメラ設定
     EXPOSURE_VAL: int = 80
     WARMUP_FRAMES: int = 30
+    # FOURCC/解像度/FPSの組み合わせを計測して最良のものを使う (結果はデバイスごとにキャッシュ)
+    CAMERA_AUTOTUNE: bool = True
+    # YUYVの生フレームを受け取り、グレースケール処理にはY面をそのまま使う (BGR変換は表示・推論用のみ)
+    RAW_YUYV_CAPTURE: bool = False
+    # 状態ごとに解像度・FPS・露出を切り替える (capture_profiles.STATE_PROFILES)。
+    # 有効時は *_DURATION_SEC などの時間はその状態の実FPSでフレーム数に換算する
+    STATE_CAPTURE_PROFILES: bool = True
     WINDOW_NAME: str = "Photo Booth App"
 
+    # キャプチャ・推論・UIを別プロセスで実行する (マルチコアのRaspberry Pi向け)
+    MULTIPROCESS: bool = False
+    # 常駐推論サービス (src/perception_daemon.py) のソケット。動いていればカメラとモデルを持たずに接続する ("" で無効)
+    PERCEPTION_SOCKET: str = ""
+
+    # 量子化モデル (FP16/INT8) を選ぶ際の、ジェスチャー判定のバランス精度 (FP32基準) の下限
+    MODEL_ACCURACY_FLOOR: float = 0.95
+    # NCNNエクスポートが .pt / ultralytics と一致しないとき、警告だけでなく .pt にフォールバックする
+    REFUSE_STALE_EXPORTS: bool = False
+    # 推論バックエンド ("auto", "pt", "ncnn", "onnxruntime", "opencv")。auto は benchmark_backends.py の記録を優先する
+    # (ONNXはエクスポート時の入力サイズ固定のため、CASCADE_STAGE1_IMGSZ とガバナーの推論サイズの縮小は効かない)
+    INFERENCE_BACKEND: str = "auto"
+
+    # 推論結果キャッシュ (ほぼ静止したシーンでは推論を省略する)
+    INFERENCE_CACHE_THRESHOLD: float = 12.0 # 縮小グレー画像 (32x24) の画素ごとの差の最大値 (0-255)
+    INFERENCE_CACHE_TTL_SEC: float = 2.0    # キャッシュの有効期間
+
+    # Prometheus形式のメトリクスを http://127.0.0.1:<port>/metrics で公開する (0で無効)
+    METRICS_PORT: int = 9108
+
+    # 温度・CPU負荷に応じて推論間隔・推論サイズ・描画を段階的に落とす
+    GOVERNOR_ENABLED: bool = True
+
+    # READYでは軽い人物検出 (小さい入力サイズ) を通過したときだけ姿勢推定を行う (ONNXバックエンドでは入力サイズは縮小されない)
+    GESTURE_CASCADE: bool = True
+    CASCADE_STAGE1_IMGSZ: int = 192
+
+    # 直近のフレーム (縮小) と推論結果をリングファイルに記録し続ける (src/blackbox.py で書き出し・再生)
+    BLACKBOX_ENABLED: bool = True
+    BLACKBOX_PATH: str = "blackbox.ring"
+    BLACKBOX_SECONDS: float = 60.0
+    BLACKBOX_SIZE: tuple = (160, 120)
+
+    # ADJUST中、余白が目標値になるようにカメラ台を前後させる (src/distance_control.py)。
+    # 制御は描画とは別スレッドの一定周期で動く。実機のモーターがない場合は指示をコンソールに出す
+    DISTANCE_CONTROL: bool = False
+    TARGET_MARGIN: float = 100.0    # 目標の余白 (px)
+    CONTROL_TOLERANCE: float = 20.0 # この範囲内なら停止する (px)
+    CONTROL_RATE_HZ: float = 20.0
+
+    # シャッターの前後を連写し、ピントが合っていて顔が見えている1枚を PHOTO_DIR に保存する (src/burst_capture.py)
+    BURST_CAPTURE: bool = True
+    BURST_FRAMES: int = 5
+    BURST_BEFORE: int = 2 # そのうちシャッターより前のフレーム数
+    PHOTO_DIR: str = "photos"
+
+    # 画面右下に、表示中のフレームと検出結果の古さ (キャプチャからの経過時間) を表示する
+    LATENCY_HUD: bool = False
+
+    # 状態遷移・撮影・エラーなどのイベントを JSON Lines で記録する (src/event_log.py。"" でファイルに書かない)。
+    # 書き込みは別スレッドで行い、描画ループはメモリ上のリングに追加するだけ
+    EVENT_LOG_PATH: str = "logs/events.jsonl"
+
+# シャッターエフェクトが消えるまでの時間 (5FPSで30フレーム)
+SHUTTER_FLASH_SEC = 6.0
+
+def pipeline_camera_settings(config) -> dict:
+    """別プロセスのキャプチャ (マルチプロセス構成・常駐推論サービス) に渡すカメラ設定"""
+    return {
+        "width": config.RESOLUTION_WIDTH,
+        "height": config.RESOLUTION_HEIGHT,
+        "fps": config.FPS,
+        "auto_exposure": 1,
+        "buffersize": 1,
+        "exposure": config.EXPOSURE_VAL,
+        "warmup_frames": config.WARMUP_FRAMES,
+    }
+
+
 # --- 状態定義 ---
 class AppState(Enum):
     READY = auto()
@@ -54,12 +143,30 @@ class AppState(Enum):
     RESULT = auto()
 
 class PhotoBoothApp:
-    def __init__(self):
+    def __init__(self, config=None):
         self.state = AppState.READY
         self.cap = None
+        self.yuyv_capture = None # 生YUYVキャプチャ (RAW_YUYV_CAPTURE 有効時)
+        self.camera_profile = None # 自動チューニングで選んだ設定 (再接続時に再適用する)
+        self.capture_supervisor = None # 読み込み失敗の監視と再接続 (open_camera で作る)
+        self.latest_gray = None # 最新フレームの輝度面 (生YUYVキャプチャ時のみ。左右反転前)
         self.subtractor = None
         self.pose_model = None
-        self.config = Config() # プロパティアクセス用
+        self.pipeline = None # マルチプロセス構成時のパイプライン
+        self.config = config if config is not None else Config() # プロパティアクセス用
+
+        # 検出処理 (マルチプロセス構成では推論プロセスの結果を返すものに差し替える)
+        self.gesture_detector = detect_circle_gesture
+        self.distance_detector = detect_person_distance2sideedge
+        # READY用の2段カスケード (人物検出 -> 姿勢推定)。マルチプロセス/マルチカメラ構成では使わない
+        self.gesture_cascade = None
+        if self.config.GESTURE_CASCADE:
+            self.gesture_cascade = GestureCascade(
+                self._detect_presence, self._detect_pose, stage1_imgsz=self.config.CASCADE_STAGE1_IMGSZ)
+
+        # フレーム類似度による推論結果キャッシュ
+        self.gesture_cache = InferenceCache("gesture", self.config.INFERENCE_CACHE_THRESHOLD, self.config.INFERENCE_CACHE_TTL_SEC)
+        self.distance_cache = InferenceCache("distance", self.config.INFERENCE_CACHE_THRESHOLD, self.config.INFERENCE_CACHE_TTL_SEC)
         
         # 状態管理用変数
         self.state_timer = 0
@@ -68,23 +175,80 @@ class PhotoBoothApp:
         # 撮影カウントダウン用
         self.is_counting_down = False
         self.countdown_timer = 0
-        # ジェスチャー検出結果のキャッシュ
-        self.last_gesture_detected = False
-        self.last_frame_with_pose = None
+        # ジェスチャー検出結果のキャッシュ (PerceptionResult)
+        self.last_gesture_result = None
         
-        # Adjust状態のキャッシュ
-        self.last_adjust_frame = None
-        self.last_is_at_edge = False
+        # Adjust状態のキャッシュ (PerceptionResult)
+        self.last_adjust_result = None
+
+        # 処理したフレームの通し番号 (推論結果がどのフレーム由来かを追跡する)
+        self.frame_seq = -1
+        # 処理中のフレームのキャプチャ時刻 (time.monotonic) と、キャプチャ -> 推論 -> 表示の遅延の集計
+        self.frame_captured_at = None
+        self.latency = LatencyTracker()
+
+        # ブラックボックス・レコーダー (initialize で開く)
+        self.blackbox = None
+
+        # 距離制御ループ (initialize で開始する)
+        self.distance_controller = None
+
+        # 連写とベストショットの選定 (initialize で作る)
+        self.burst = None
+
+        # 状態ごとのキャプチャ設定 (open_camera で検証する)。タイマーのフレーム数換算には active_fps を使う
+        self.capture_switcher = None
+        self.active_fps = float(self.config.FPS)
+        self._pending_profile = None
+
+        # 温度・負荷に応じた劣化レベル (推論間隔・推論サイズ・描画の簡略化)
+        self.governor = PerformanceGovernor() if self.config.GOVERNOR_ENABLED else None
+        self.perf_level = LEVELS[0]
 
     def initialize(self):
         """カメラとAIモデルの初期化"""
         print("--- システム初期化中 ---")
+        events.start(self.config.EVENT_LOG_PATH)
+        self._start_metrics()
+        if self.config.BLACKBOX_ENABLED:
+            # 撮影前後は状態ごとのキャプチャ設定でFPSが上がるため、最も高いFPSでも BLACKBOX_SECONDS 分残る容量にする
+            self.blackbox = BlackBoxRecorder(self.config.BLACKBOX_PATH, self.config.BLACKBOX_SECONDS,
+                                             self._max_capture_fps(), self.config.BLACKBOX_SIZE)
+        if self.config.DISTANCE_CONTROL:
+            self.distance_controller = DistanceController(
+                PrintActuator(), self.config.TARGET_MARGIN, self.config.CONTROL_TOLERANCE, self.config.CONTROL_RATE_HZ)
+            self.distance_controller.start()
+        if self.config.BURST_CAPTURE:
+            self.burst = BurstCapture((self.config.RESOLUTION_HEIGHT, self.config.RESOLUTION_WIDTH, 3),
+                                      self.config.BURST_FRAMES, self.config.BURST_BEFORE, out_dir=self.config.PHOTO_DIR,
+                                      margin=self.config.MARGIN)
+
+        if self.config.PERCEPTION_SOCKET and self._attach_daemon():
+            return
+        if self.config.MULTIPROCESS:
+            self._initialize_pipeline()
+            return
         
         # YOLOモデルのロード
         print("AIモデルをロード中...")
-        self.pose_model = load_model("yolo11n-pose", task="pose")
+        self.pose_model = get_pose_model(self.config.MODEL_ACCURACY_FLOOR, self.config.REFUSE_STALE_EXPORTS,
+                                         self.config.INFERENCE_BACKEND)
+        get_detect_model(self.config.MODEL_ACCURACY_FLOOR, self.config.REFUSE_STALE_EXPORTS,
+                         self.config.INFERENCE_BACKEND)
 
-        # カメラセットアップ
+        self.open_camera()
+
+        cv2.namedWindow(self.config.WINDOW_NAME, cv2.WINDOW_NORMAL)
+        print("初期化完了。システムを開始します。")
+
+    def _max_capture_fps(self) -> float:
+        """動作中にカメラへ設定しうる最も高いFPS"""
+        if not self.config.STATE_CAPTURE_PROFILES:
+            return float(self.config.FPS)
+        return float(max([self.config.FPS] + [profile.fps for profile in STATE_PROFILES.values()]))
+
+    def open_camera(self):
+        """カメラを開いて設定を適用し、ウォームアップする"""
         self.cap = cv2.VideoCapture(self.config.CAMERA_INDEX)
 
         if not self.cap.isOpened():
@@ -98,13 +262,14 @@ class PhotoBoothApp:
             else:
                 sys.exit(1)
 
-            
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.config.RESOLUTION_WIDTH)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.config.RESOLUTION_HEIGHT)
-        self.cap.set(cv2.CAP_PROP_FPS, self.config.FPS)
-        self.cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1) # 自動露出OFF (環境による)
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-        self.cap.set(cv2.CAP_PROP_EXPOSURE, self.config.EXPOSURE_VAL)
+
+        profile = None
+        if self.config.CAMERA_AUTOTUNE:
+            profile = get_or_tune_profile(
+                self.cap, self.config.CAMERA_INDEX,
+                (self.config.RESOLUTION_WIDTH, self.config.RESOLUTION_HEIGHT), self.config.FPS)
+        self.camera_profile = profile
+        self._apply_camera_settings()
 
         # 背景差分の初期化
 
@@ -113,6 +278,105 @@ class PhotoBoothApp:
         print("カメラ起動中...")
         for _ in range(self.config.WARMUP_FRAMES):
             self.cap.read()
+        self._check_camera_settings()
+
+        if self.config.STATE_CAPTURE_PROFILES:
+            # 自動チューニングで要求より高いFPSが選ばれている場合があるので、実際に設定した値を基準にする
+            base = CaptureProfile(self.config.RESOLUTION_WIDTH, self.config.RESOLUTION_HEIGHT,
+                                  profile.fps if profile is not None else self.config.FPS, self.config.EXPOSURE_VAL)
+            self.capture_switcher = CaptureProfileSwitcher.for_camera(self.cap, self.config.CAMERA_INDEX, base)
+            self.capture_switcher.validate_all()
+            self._queue_capture_profile(self.state)
+            self._apply_capture_profile()
+
+        # 読み込みに失敗し続けたら、空回りせずに間隔を空けて開き直す
+        self.capture_supervisor = CaptureSupervisor(lambda: self.read_latest(self.cap), self._reopen_camera)
+
+    def _apply_camera_settings(self):
+        """保存した設定 (自動チューニングの結果またはConfig) をカメラに適用する"""
+        if self.camera_profile is not None:
+            self.camera_profile.apply(self.cap)
+        else:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.config.RESOLUTION_WIDTH)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.config.RESOLUTION_HEIGHT)
+            self.cap.set(cv2.CAP_PROP_FPS, self.config.FPS)
+        self.cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1) # 自動露出OFF (環境による)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.cap.set(cv2.CAP_PROP_EXPOSURE, self.config.EXPOSURE_VAL)
+
+        self.yuyv_capture = None
+        if self.config.RAW_YUYV_CAPTURE:
+            self.yuyv_capture = YuyvCapture(self.cap, self.config.RESOLUTION_WIDTH, self.config.RESOLUTION_HEIGHT)
+            if not self.yuyv_capture.enable():
+                print("警告: カメラが生YUYVキャプチャに対応していないため、通常のBGRキャプチャを使います")
+                self.yuyv_capture = None
+
+    def _reopen_camera(self) -> bool:
+        """カメラを開き直して保存した設定と現在の状態のキャプチャ設定を再適用する (CaptureSupervisor から呼ばれる)"""
+        if self.cap is not None:
+            self.cap.release()
+        self.cap = cv2.VideoCapture(self.config.CAMERA_INDEX)
+        if not self.cap.isOpened():
+            return False
+        self._apply_camera_settings()
+        if self.capture_switcher is not None:
+            # 新しいデバイスは base の設定になっているので、そこから現在の状態のプロファイルへ切り替える
+            self.capture_switcher.cap = self.cap
+            self.capture_switcher.current = self.capture_switcher.base
+            self._switch_capture_profile(self.capture_switcher.profile_for(self.state.name))
+        ret, _ = self.read_latest(self.cap)
+        return ret
+
+    def _check_camera_settings(self):
+        """カメラが設定値を受け入れたか確認し、異なる場合は警告する"""
+        actual_w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        actual_h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        actual_fps = self.cap.get(cv2.CAP_PROP_FPS)
+        if (actual_w, actual_h) != (self.config.RESOLUTION_WIDTH, self.config.RESOLUTION_HEIGHT):
+            print(f"警告: カメラの解像度が設定値と異なります ({actual_w}x{actual_h})")
+        metrics.fps.labels("camera").set(actual_fps)
+        if actual_fps and actual_fps < self.config.FPS:
+            print(f"警告: カメラのFPSが設定値より低いです ({actual_fps:.1f})")
+
+    def _start_metrics(self):
+        """profilerの計測値をメトリクスへ流し、ローカルのHTTPエンドポイントを起動する"""
+        metrics.bind_profiler(profiler)
+        if self.config.METRICS_PORT:
+            metrics.start_server(self.config.METRICS_PORT)
+
+    def _initialize_pipeline(self):
+        """マルチプロセス構成の初期化 (カメラとモデルは子プロセスが持つ)"""
+        from multiprocess_pipeline import MultiProcessPipeline
+
+        print("マルチプロセス構成で起動します...")
+        pipeline = MultiProcessPipeline(
+            self.config.CAMERA_INDEX, pipeline_camera_settings(self.config),
+            shape=(self.config.RESOLUTION_HEIGHT, self.config.RESOLUTION_WIDTH, 3),
+            margin=self.config.MARGIN,
+            accuracy_floor=self.config.MODEL_ACCURACY_FLOOR, refuse_stale=self.config.REFUSE_STALE_EXPORTS,
+            backend=self.config.INFERENCE_BACKEND,
+        )
+        pipeline.start()
+        self._use_pipeline(pipeline)
+
+    def _attach_daemon(self) -> bool:
+        """常駐推論サービスに接続する。動いていなければFalse (通常どおり単独で起動する)"""
+        from perception_daemon import PerceptionClient
+
+        client = PerceptionClient.try_attach(self.config.PERCEPTION_SOCKET)
+        if client is None:
+            print("常駐推論サービスが見つからないため、単独で起動します。")
+            return False
+        print(f"常駐推論サービスに接続しました ({self.config.PERCEPTION_SOCKET})")
+        self._use_pipeline(client)
+        return True
+
+    def _use_pipeline(self, pipeline):
+        """カメラと検出関数を、別プロセス (パイプラインまたは常駐サービス) のものに差し替える"""
+        self.pipeline = pipeline
+        self.gesture_cascade = None
+        self.gesture_detector = self.pipeline.detect_circle_gesture
+        self.distance_detector = self.pipeline.detect_person_distance2sideedge
 
         cv2.namedWindow(self.config.WINDOW_NAME, cv2.WINDOW_NORMAL)
         print("初期化完了。システムを開始します。")
@@ -125,26 +389,31 @@ class PhotoBoothApp:
                 
 
                 with profiler.measure("cap_read"):
-                    ret, frame = self.read_latest(self.cap)
+                    if self.capture_supervisor is not None:
+                        ret, frame = self.capture_supervisor.read()
+                    else:
+                        ret, frame = self.read_latest(self.cap)
+                captured_at = self._capture_time()
                 if not ret:
-                    print("フレームの読み込みに失敗")
+                    if self.capture_supervisor is None:
+                        events.log("read_failure", "フレームの読み込みに失敗", level="warning")
+                        metrics.read_failures_total.inc()
+                        continue
+                    # 再接続を待つ間は、キャッシュした画面を出してキー入力だけ受け付ける
+                    if not self.capture_supervisor.connected:
+                        cv2.imshow(self.config.WINDOW_NAME, self.capture_supervisor.placeholder(
+                            self.config.RESOLUTION_WIDTH, self.config.RESOLUTION_HEIGHT))
+                    if cv2.waitKey(max(1, int(self.capture_supervisor.wait_hint() * 1000))) & 0xFF == ord('q'):
+                        break
                     continue
 
-                # 鏡のように左右反転（UX向上のため）
-                with profiler.measure("cv2_flip"):
-                    frame = cv2.flip(frame, 1)
-
-                # 現在の状態に応じた処理を実行
-                # process_state内でframeに描画(上書き)を行う
-                with profiler.measure(f"process_state_{self.state.name}"):
-                    self._process_state(frame)
-
-                # UI情報のオーバーレイ描画
-                with profiler.measure("draw_ui"):
-                    self._draw_ui(frame)
+                frame = self.process_frame(frame, captured_at)
 
                 with profiler.measure("imshow"):
                     cv2.imshow(self.config.WINDOW_NAME, frame)
+                self.latency.on_display(self.frame_captured_at, self._displayed_result()[0])
+                # 状態遷移があれば、遷移時のフレームを表示している間にキャプチャ設定を切り替える
+                self._apply_capture_profile()
 
                 # 入力処理
                 if not self._handle_input():
@@ -152,9 +421,10 @@ class PhotoBoothApp:
                 
                 # FPS制御
                 elapsed = time.time() - start_time
-                sleep_time = (1.0 / self.config.FPS) - elapsed
+                sleep_time = (1.0 / self.active_fps) - elapsed
                 if sleep_time > 0:
                     time.sleep(sleep_time)
+                metrics.fps.labels("loop").set(1.0 / max(time.time() - start_time, 1e-6))
 
                 # 入力処理 (waitKeyはキー入力のみに利用し、待機時間は最小限にする)
                 if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -163,6 +433,77 @@ class PhotoBoothApp:
         finally:
             self._cleanup()
 
+    def process_frame(self, frame, captured_at: float = None):
+        """
+        1フレーム分の状態処理とUI描画を行い、表示するフレームを返す
+        :param captured_at: フレームのキャプチャ時刻 (time.monotonic)。省略時は呼び出した時刻
+        """
+        started = time.perf_counter()
+        raw_frame = frame
+        self.frame_seq += 1
+        self.frame_captured_at = time.monotonic() if captured_at is None else captured_at
+        if self.governor is not None:
+            self.perf_level = self.governor.update()
+
+        # 鏡のように左右反転（UX向上のため）
+        with profiler.measure("cv2_flip"):
+            frame = cv2.flip(frame, 1)
+        # 連写中は描画前のフレームをバッファへコピーするだけ (判定は別スレッド)
+        if self.burst is not None:
+            with profiler.measure("burst"):
+                self.burst.add(frame)
+                self.burst.poll()
+
+        # 現在の状態に応じた処理を実行
+        # process_state内でframeに描画(上書き)を行う
+        with profiler.measure(f"process_state_{self.state.name}"):
+            self._process_state(frame)
+
+        # UI情報のオーバーレイ描画
+        with profiler.measure("draw_ui"):
+            self._draw_ui(frame)
+            if self.config.LATENCY_HUD:
+                draw_hud(frame, self.frame_seq, self.frame_captured_at, self._displayed_result()[0])
+
+        if self.blackbox is not None:
+            with profiler.measure("blackbox_record"):
+                self._record_blackbox(raw_frame, (time.perf_counter() - started) * 1000.0)
+        return frame
+
+    def _displayed_result(self):
+        """画面に重ねている推論結果とその種類 (SOURCE_DISTANCE / SOURCE_GESTURE)"""
+        if self.state == AppState.ADJUST or self.last_gesture_result is None:
+            return self.last_adjust_result, SOURCE_DISTANCE
+        return self.last_gesture_result, SOURCE_GESTURE
+
+    def _capture_time(self) -> float:
+        """直前に読んだフレームのキャプチャ時刻 (time.monotonic)"""
+        if self.pipeline is not None:
+            # キャプチャプロセスが共有メモリに書いた時刻 (CLOCK_MONOTONIC はプロセス間で共通)
+            capture_ns = self.pipeline.capture_ns()
+            if capture_ns is not None:
+                return capture_ns / 1e9
+        return time.monotonic()
+
+    def _perceive(self, cache, detector, frame, *args):
+        """
+        推論結果 (類似フレームならキャッシュ) を返す。
+        新しく推論した結果には元フレームのキャプチャ時刻と推論開始時刻を記録し、遅延を集計する。
+        """
+        started = time.monotonic()
+        result = cache.get_or_compute(self._gray_or(frame), detector, frame, *args,
+                                      seq=self.frame_seq, imgsz=self.perf_level.imgsz)
+        if result is not None and result.inference_started is None:
+            result.captured_at = self.frame_captured_at
+            result.inference_started = started
+        self.latency.on_inference(result)
+        return result
+
+    def _record_blackbox(self, raw_frame, frame_ms: float):
+        """左右反転前のフレームと、表示中の推論結果をブラックボックスに記録する"""
+        result, source = self._displayed_result()
+        self.blackbox.record(raw_frame, self.frame_seq, time.time(), self.state.value, result, source, frame_ms)
+
     def _process_state(self, frame):
         """状態ごとのロジック分岐"""
         if self.state == AppState.READY:
@@ -180,80 +521,76 @@ class PhotoBoothApp:
 
     def _handle_ready(self, frame):
         """READY: 丸ジェスチャーを待機"""
-        # 5フレームに1回だけ推論
-        if self.state_timer % 5 == 0: 
-            with profiler.measure("detect_circle_gesture"):
-                self.last_frame_with_pose, self.last_gesture_detected = detect_circle_gesture(frame)
-        
-        # 描画結果を反映 (キャッシュから)
-        # キャッシュされたフレームがない場合（最初の数フレームなど）は現在のフレームを使用
-        frame[:] = self.last_frame_with_pose if self.last_frame_with_pose is not None else frame.copy()
+        if not self.perf_level.pose_in_ready:
+            self._handle_ready_presence(frame)
+            return
+
+        self._update_gesture(frame)
 
-        if self.last_gesture_detected:
+        if self._gesture_detected():
             cv2.putText(frame, "STARTING!", (50, 200), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 255, 0), 4)
             # 即時遷移せず、少しユーザーにフィードバックを見せたい場合はここで少し待つ処理を入れても良い
             # 今回は即座に遷移
+            metrics.gestures_total.inc()
             self._transition_to(AppState.ADJUST)
         else:
             cv2.putText(frame, "Make a Circle to Start", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
         
         self.state_timer += 1
 
+    def _handle_ready_presence(self, frame):
+        """READY (高負荷時): 姿勢推定の代わりに軽い人物検出で、人が入ったらセッションを開始する"""
+        if self.state_timer % self._inference_interval() == 0:
+            with profiler.measure("detect_presence"):
+                self.last_adjust_result = self._perceive(
+                    self.distance_cache, self.distance_detector, frame, self.config.MARGIN)
+
+        if self.last_adjust_result is not None and len(self.last_adjust_result) > 0:
+            cv2.putText(frame, "STARTING!", (50, 200), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 255, 0), 4)
+            self._transition_to(AppState.ADJUST)
+        else:
+            cv2.putText(frame, "Step In to Start", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+
+        self.state_timer += 1
+
     def _handle_adjust(self, frame):
         """ADJUST: 位置調整"""
-        # 距離・位置判定
-        is_at_edge = False
-        processed_frame = frame 
-        # ---------------------------------------------
-
         try:
-            # 距離・位置判定 (5フレームに1回)
-            if self.state_timer % 5 == 0:
+            # 距離・位置判定 (通常5フレームに1回。高負荷時は間隔を延ばす)
+            if self.state_timer % self._inference_interval() == 0:
                 # もし detect_person... が外部ファイルになくても止まらないようにtryで囲むのが安全です
                 with profiler.measure("detect_person_distance"):
-                    # 注意: detect_person_distance2sideedge は frame を直接変更して返す
-                    result = detect_person_distance2sideedge(frame.copy(), self.config.MARGIN)
-                
-                # 戻り値が正しく2つあるか確認してから代入
-                if result is not None and len(result) == 2:
-                    processed_frame_res, is_at_edge_res = result
-                    self.last_adjust_frame = processed_frame_res
-                    self.last_is_at_edge = is_at_edge_res
-                else:
-                    # 失敗時は現在のフレームをキャッシュとして使う（描画なし）
-                    self.last_adjust_frame = frame.copy()
-            
-            # キャッシュを使用
-            if self.last_adjust_frame is not None:
-                processed_frame = self.last_adjust_frame
-                is_at_edge = self.last_is_at_edge
-            else:
-                # 初回などキャッシュがない場合
-                processed_frame = frame
-                is_at_edge = False
-
+                    self.last_adjust_result = self._perceive(
+                        self.distance_cache, self.distance_detector, frame, self.config.MARGIN)
         except Exception as e:
-            print(f"Warning: Distance detection skipped due to error: {e}")
-            processed_frame = frame
-            is_at_edge = False
+            events.log("distance_error", "Distance detection skipped due to error", level="warning", error=repr(e))
+            self.last_adjust_result = None
 
-        frame[:] = processed_frame[:] # 描画反映
+        # 制御ループへ測定値を渡す (キャッシュから返った同じ結果は制御側で無視される)
+        if self.distance_controller is not None:
+            self.distance_controller.observe(self.last_adjust_result, frame.shape[1])
+
+        # 描画反映 (キャッシュした結果を現在のフレームに重ねる)
+        renderer.draw_person_boxes(frame, self.last_adjust_result, self.config.MARGIN, cheap=self.perf_level.cheap_overlays)
+        is_at_edge = self.last_adjust_result is not None and self.last_adjust_result.is_at_edge
         
         if is_at_edge:
             cv2.putText(frame, "TOO CLOSE TO EDGE!", (50, 300), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
-            # ここでロボット制御などを入れるなら実装
+        if self.distance_controller is not None:
+            status = self.distance_controller.status
+            cv2.putText(frame, f"Motor: {status.command:+.2f} m/s", (50, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
         
         self.state_timer += 1
         
         # プログレスバー風表示 (Result画面に合わせて下部に全幅で表示)
         h, w = frame.shape[:2]
-        progress = self.state_timer / self.config.ADJUST_FRAMES
+        progress = self.state_timer / self._frames(self.config.ADJUST_DURATION_SEC)
         # 下部20pxのバー
         cv2.rectangle(frame, (0, h-20), (int(w * progress), h), (0, 255, 0), -1)
         
         cv2.putText(frame, "Adjusting...", (50, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
 
-        if self.state_timer > self.config.ADJUST_FRAMES:
+        if self.state_timer > self._frames(self.config.ADJUST_DURATION_SEC):
             self._transition_to(AppState.TAKE_PICTURE)
 
     def _handle_take_picture(self, frame):
@@ -261,8 +598,9 @@ class PhotoBoothApp:
         
         # 1. タイムアウト処理 (操作がない場合、READYに戻る)
         self.state_timer += 1
-        if self.state_timer > self.config.TAKE_PICTURE_TIMEOUT_FRAMES and not self.is_counting_down:
-            print("タイムアウト: 操作がありませんでした。")
+        if self.state_timer > self._frames(self.config.TAKE_PICTURE_TIMEOUT_SEC) and not self.is_counting_down:
+            events.log("timeout", "タイムアウト: 操作がありませんでした。")
+            metrics.timeouts_total.inc()
             self._transition_to(AppState.READY)
             return
 
@@ -271,7 +609,7 @@ class PhotoBoothApp:
             self.countdown_timer -= 1
             
             # 残り秒数の計算と表示
-            remaining_sec = math.ceil(self.countdown_timer / self.config.FPS)
+            remaining_sec = math.ceil(self.countdown_timer / self.active_fps)
             
             # 画面中央に大きくカウントダウン表示
             h, w = frame.shape[:2]
@@ -282,30 +620,53 @@ class PhotoBoothApp:
                 self._perform_capture(frame)
         else:
             # 3. ジェスチャー待ち
-            # 5フレームに1回だけ推論
-            if self.state_timer % 5 == 0: 
-                with profiler.measure("detect_circle_gesture"):
-                    self.last_frame_with_pose, self.last_gesture_detected = detect_circle_gesture(frame)
-            
-            # 描画結果を反映 (キャッシュから)
-            # キャッシュされたフレームがない場合（最初の数フレームなど）は現在のフレームを使用
-            frame[:] = self.last_frame_with_pose if self.last_frame_with_pose is not None else frame.copy()
+            self._update_gesture(frame)
             
             cv2.putText(frame, f"Pose for Picture! ({self.taken_pictures_count + 1}/{self.config.MAX_PICTURE})", 
                         (30, 80), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
             cv2.putText(frame, "Make Circle to Snap", (30, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (200, 200, 200), 2)
 
-            if self.last_gesture_detected:
-                print("撮影ジェスチャー検知: カウントダウン開始")
+            if self._gesture_detected():
+                events.log("gesture", "撮影ジェスチャー検知: カウントダウン開始", frame_seq=self.frame_seq)
+                metrics.gestures_total.inc()
                 self.is_counting_down = True
-                self.countdown_timer = self.config.COUNTDOWN_FRAMES
+                self.countdown_timer = self._frames(self.config.COUNTDOWN_SEC)
+                if self.burst is not None:
+                    self.burst.arm(self.last_gesture_result)
+
+    def _update_gesture(self, frame):
+        """丸ジェスチャーの推論 (通常5フレームに1回。高負荷時は間隔を延ばす) と、キャッシュした結果の描画"""
+        if self.state_timer % self._inference_interval() == 0:
+            detector = self.gesture_detector
+            if self.state == AppState.READY and self.gesture_cascade is not None:
+                detector = self.gesture_cascade
+            with profiler.measure("detect_circle_gesture"):
+                self.last_gesture_result = self._perceive(self.gesture_cache, detector, frame)
+        
+        # 描画結果を反映 (キャッシュした結果を現在のフレームに重ねる)
+        renderer.draw_gesture(frame, self.last_gesture_result, cheap=self.perf_level.cheap_overlays)
+
+    def _detect_presence(self, frame, seq: int = -1, imgsz: int = None):
+        """カスケード1段目: 人物検出"""
+        return self.distance_detector(frame, self.config.MARGIN, seq=seq, imgsz=imgsz)
+
+    def _detect_pose(self, frame, seq: int = -1, imgsz: int = None):
+        """カスケード2段目: 姿勢推定とジェスチャー判定"""
+        return self.gesture_detector(frame, seq=seq, imgsz=imgsz)
+
+    def _gesture_detected(self) -> bool:
+        return self.last_gesture_result is not None and self.last_gesture_result.gesture_detected
 
     def _perform_capture(self, frame):
         """撮影実行処理"""
         # シャッターエフェクト（画面を白くするなど）を入れると良い
-        print("パシャッ！ (撮影)")
+        events.log("capture", "パシャッ！ (撮影)", count=self.taken_pictures_count + 1, frame_seq=self.frame_seq)
+        if self.burst is not None:
+            # ここから後のフレームも連写に加え、揃ったら別スレッドで選定・保存する
+            self.burst.shutter()
         
         self.taken_pictures_count += 1
+        metrics.photos_total.inc()
         
         if self.taken_pictures_count >= self.config.MAX_PICTURE:
             self._transition_to(AppState.RESULT)
@@ -315,10 +676,10 @@ class PhotoBoothApp:
     def _handle_cooldown(self, frame):
         """PICTURE_COOLDOWN: 連続撮影防止と確認用"""
         self.state_timer += 1
-        self._shutter_flash(frame, self.state_timer)
+        self._shutter_flash(frame, self.state_timer, duration=self._frames(SHUTTER_FLASH_SEC))
         cv2.putText(frame, "Nice Shot!", (100, 200), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 255, 255), 3)
         
-        if self.state_timer > self.config.COOLDOWN_FRAMES:
+        if self.state_timer > self._frames(self.config.COOLDOWN_DURATION_SEC):
             self._transition_to(AppState.TAKE_PICTURE)
 
     def _handle_result(self, frame):
@@ -330,14 +691,17 @@ class PhotoBoothApp:
         cv2.putText(frame, "Thank you for using.", (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
         
         # 残り時間のバー
-        remaining_ratio = 1.0 - (self.state_timer / self.config.RESULT_FRAMES)
+        remaining_ratio = 1.0 - (self.state_timer / self._frames(self.config.RESULT_DURATION_SEC))
         cv2.rectangle(frame, (0, frame.shape[0]-20), (int(frame.shape[1] * remaining_ratio), frame.shape[0]), (0, 100, 255), -1)
 
-        if self.state_timer > self.config.RESULT_FRAMES:
+        if self.state_timer > self._frames(self.config.RESULT_DURATION_SEC):
             self._transition_to(AppState.READY)
 
     def _transition_to(self, new_state):
-        print(f"Phase Change: {self.state.name} -> {new_state.name}")
+        events.log("phase_change", f"{self.state.name} -> {new_state.name}", src=self.state.name, dst=new_state.name)
+        metrics.transitions_total.labels(new_state.name).inc()
+        if self.state == AppState.READY and new_state == AppState.ADJUST:
+            metrics.sessions_total.inc()
         self.state = new_state
         self.state_timer = 0
         self.is_counting_down = False # 状態遷移時にカウントダウンはリセット
@@ -345,13 +709,57 @@ class PhotoBoothApp:
         # 状態遷移時にジェスチャーキャッシュをリセット
         # これをしないと、前の状態の「検出済み」フラグが残ってしまい
         # 次の状態で即座に反応してしまう可能性がある
-        self.last_gesture_detected = False
-        self.last_frame_with_pose = None
-        self.last_adjust_frame = None
-        self.last_is_at_edge = False
+        self.last_gesture_result = None
+        self.last_adjust_result = None
+        self.gesture_cache.clear()
+        self.distance_cache.clear()
+        if self.gesture_cascade is not None:
+            self.gesture_cascade.reset()
         
         if new_state == AppState.READY:
              self.taken_pictures_count = 0
+             if self.burst is not None:
+                 self.burst.disarm()
+
+        # 距離制御はADJUSTの間だけ動かす
+        if self.distance_controller is not None:
+            if new_state == AppState.ADJUST:
+                self.distance_controller.engage()
+            else:
+                self.distance_controller.disengage()
+
+        self._queue_capture_profile(new_state)
+
+    def _queue_capture_profile(self, state):
+        """状態のキャプチャ設定を決め、タイマーのFPSを切り替える。カメラへの適用は遷移時のフレームを表示した後に行う"""
+        if self.capture_switcher is None:
+            return
+        profile = self.capture_switcher.profile_for(state.name)
+        self.active_fps = self.capture_switcher.fps_of(profile)
+        self._pending_profile = profile
+
+    def _apply_capture_profile(self):
+        """保留中のキャプチャ設定をカメラへ適用する"""
+        if self._pending_profile is None:
+            return
+        profile, self._pending_profile = self._pending_profile, None
+        self._switch_capture_profile(profile)
+        metrics.fps.labels("camera").set(self.active_fps)
+
+    def _switch_capture_profile(self, profile):
+        """キャプチャ設定を切り替え、解像度が変わったら生YUYVのバッファを作り直す"""
+        if self.capture_switcher.switch(profile) and self.yuyv_capture is not None:
+            self.yuyv_capture = YuyvCapture(self.cap, profile.width, profile.height)
+            if not self.yuyv_capture.enable():
+                self.yuyv_capture = None
+
+    def _frames(self, seconds: float) -> int:
+        """秒数を現在の状態のFPSでフレーム数に換算する"""
+        return int(seconds * self.active_fps)
+
+    def _inference_interval(self) -> int:
+        """推論間隔 (フレーム)。FPSを上げた状態でも1秒あたりの推論回数が変わらないように換算する"""
+        return max(1, round(self.perf_level.inference_interval * self.active_fps / self.config.FPS))
 
     def _draw_ui(self, frame):
         cv2.putText(frame, f"Phase: {self.state.name}", (10, 30), 
@@ -359,7 +767,7 @@ class PhotoBoothApp:
         
         # タイムアウトまでの残り時間表示 (TAKE_PICTUREのみ)
         if self.state == AppState.TAKE_PICTURE and not self.is_counting_down:
-            remaining = int((self.config.TAKE_PICTURE_TIMEOUT_FRAMES - self.state_timer) / self.config.FPS)
+            remaining = int((self._frames(self.config.TAKE_PICTURE_TIMEOUT_SEC) - self.state_timer) / self.active_fps)
             cv2.putText(frame, f"Timeout: {remaining}s", (frame.shape[1]-200, 30), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
@@ -368,9 +776,27 @@ class PhotoBoothApp:
 
     def _cleanup(self):
         print("後処理を実行します...")
+        profiler.report_counters()
+        self.latency.report()
+        if self.gesture_cascade is not None:
+            self.gesture_cascade.report()
+        if self.capture_switcher is not None:
+            self.capture_switcher.report()
+        if self.capture_supervisor is not None:
+            self.capture_supervisor.report()
+        metrics.stop_server()
+        if self.distance_controller is not None:
+            self.distance_controller.stop()
+        if self.burst is not None:
+            self.burst.close()
+        if self.blackbox is not None:
+            self.blackbox.close()
+        if self.pipeline:
+            self.pipeline.stop()
         if self.cap:
             self.cap.release()
         cv2.destroyAllWindows()
+        events.close()
         print("終了")
 
     def _is_raspberry_pi(self) -> bool:
@@ -392,28 +818,27 @@ class PhotoBoothApp:
 
     def _shutter_flash_rect(self, frame, alpha=1.0):
         if alpha > 0.01: # alphaが十分に大きい場合のみ実行
-            h, w = frame.shape[:2]
-
-            overlay = frame.copy()
-            cv2.rectangle(
-                overlay,
-                (0, 0),
-                (w, h),
-                (255, 255, 255),
-                thickness=-1
-            )
-
-            frame[:] = cv2.addWeighted(
-                overlay,
-                alpha,
-                frame,
-                1 - alpha,
-                0
-            )
+            # 白とのブレンドを量子化alphaごとのLUTでその場で適用 (中間バッファなし)
+            effects.flash(frame, alpha)
 
     def read_latest(self, cap):
+        if self.pipeline is not None:
+            return self.pipeline.read_latest()
+        if self.yuyv_capture is not None:
+            ret, yuyv_frame = self.yuyv_capture.read()
+            if not ret:
+                self.latest_gray = None
+                return False, None
+            # グレースケール処理用にY面 (ゼロコピー) を保持し、BGR変換は表示・推論用に1回だけ行う
+            self.latest_gray = yuyv_frame.gray
+            with profiler.measure("yuyv2bgr"):
+                return True, yuyv_frame.bgr()
         return cap.read()
 
+    def _gray_or(self, frame):
+        """類似度判定などのグレースケール処理に使う画像。Y面があればそれを、なければフレームを返す"""
+        return self.latest_gray if self.latest_gray is not None else frame
+
 
 
 if __name__ == "__main__":
@@ -1,64 +1,56 @@
 import cv2
-from ultralytics import YOLO # type: ignore
 from profiler import profiler
 from model_loader import load_model
+from renderer import draw_person_boxes
     
-model = load_model("yolo11n", task="detect")
-def detect_person_distance2sideedge(frame, margin: int):
-    """_summary_
+# モデルは初回推論時にロードする (マルチプロセス構成のUIプロセスではロード不要のため)
+model = None
 
-    Args:
-        frame: _description_
+def get_detect_model(accuracy_floor: float = None, refuse_stale: bool = False, backend: str = "auto"):
+    """
+    人物検出モデルを取得する (初回のみロード)。accuracy_floorは量子化バリアント選択時の精度の下限、
+    refuse_staleは古いエクスポートを使わないかどうか、backendは推論バックエンド (model_loader.BACKENDS)
+    """
+    global model
+    if model is None:
+        model = load_model("yolo11n", task="detect", accuracy_floor=accuracy_floor, refuse_stale=refuse_stale,
+                           backend=backend)
+    return model
 
-    Returns:
-        _type_: _description_
+def detect_person_distance2sideedge(frame, margin: int, seq: int = -1, imgsz: int = None):
     """
+    人物を検出し、画面の左右端 (margin以内) に近づいているか判定する。
 
-    # 画像サイズの取得 (高さ, 幅)
-    h, w = frame.shape[:2]
+    Args:
+        frame: 入力フレーム (変更しない)
+        margin: 画面端とみなすピクセル幅
+        seq: 元フレームのシーケンス番号
+        imgsz: 推論の入力サイズ (Noneならモデルの既定値)
 
-    # 2. 推論 (人クラスのみ)
+    Returns:
+        PerceptionResult: bboxと各人の端判定 (edge_flags)。描画は renderer.draw_person_boxes で行う。
+    """
+    # 推論 (人クラスのみ)
     with profiler.measure("distance_inference"):
-        results = model(frame, classes=[0], verbose=False)
-    boxes = results[0].boxes
-
-    # --- 判定ロジック: 端にいるか？ ---
-    for box in boxes:
-        # 座標を取得 (float -> int変換)
-        x1, y1, x2, y2 = map(int, box.xyxy[0])
-        
-        # 端判定フラグ
-        is_at_edge = False
-
-        # 左端 or 右端に触れているかチェック
-        if (x1 < margin) or (x2 > w - margin):
-            is_at_edge = True
-
-        # 描画の分岐
-        if is_at_edge:
-            # 端にいる場合: 赤い枠 + 警告ラベル
-            color = (0, 0, 255) # Red
-            label = "Too Close to Edge"
-        else:
-            # 正常: 緑の枠
-            color = (0, 255, 0) # Green
-            label = "Person"
-
-        # 枠とテキストの描画
-        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-        cv2.putText(frame, label, (x1, y1 - 10), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-    # マージンエリアを可視化（デバッグ用：グレーの薄い線）
-    # 左、右、上、下の境界線を描画
-    cv2.line(frame, (margin, 0), (margin, h), (200, 200, 200), 1)
-    cv2.line(frame, (w - margin, 0), (w- margin, h), (200, 200, 200), 1)
-
-    return [frame, is_at_edge]
+        result = get_detect_model().predict(frame, seq, imgsz=imgsz, classes=[0])
+    return _judge_edges(result, frame.shape[1], margin)
+
+def detect_person_distance2sideedge_batch(frames, margin: int, seqs=None):
+    """複数フレーム (複数カメラ) をまとめて推論する。戻り値は detect_person_distance2sideedge の結果のリスト"""
+    seqs = seqs if seqs is not None else [-1] * len(frames)
+    with profiler.measure(f"distance_inference_batch{len(frames)}"):
+        results = get_detect_model().predict_batch(frames, seqs, classes=[0])
+    return [_judge_edges(r, f.shape[1], margin) for r, f in zip(results, frames)]
+
+def _judge_edges(result, w, margin):
+    """--- 判定ロジック: 端にいるか？ ---"""
+    # 左端 or 右端に触れているかチェック
+    x1 = result.boxes[:, 0]
+    x2 = result.boxes[:, 2]
+    result.edge_flags = (x1 < margin) | (x2 > w - margin)
+    return result
 
 if __name__ == "__main__":
-        # 1. モデル読み込み
-    model = load_model("yolo11n", task="detect")
     cap = cv2.VideoCapture(0)
     if not cap.isOpened():
         print("エラー: カメラを開けませんでした。")
@@ -72,7 +64,8 @@ if __name__ == "__main__":
         ret, frame = cap.read()
         if not ret:
             break
-        frame, is_at_edge = detect_person_distance2sideedge(frame, margin)
+        result = detect_person_distance2sideedge(frame, margin)
+        draw_person_boxes(frame, result, margin)
         cv2.imshow("Custom Detection", frame)
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+フォトブースの稼働状況を集計するメトリクス・レジストリと、Prometheus形式で公開するHTTPエンドポイント。
+
+多数のブースを ssh せずに監視できるよう、
+  - カウンタ: セッション数、撮影枚数、ジェスチャー検出数、タイムアウト数、フレーム読み込み失敗数
+  - ヒストグラム: 処理段階ごとのレイテンシ (profiler.measure の計測値)
+  - ゲージ: FPS、モデルのロード時間
+をプロセス内に保持し、``http://127.0.0.1:<port>/metrics`` で返す。
+
+記録 (inc / observe / set) はメインループから毎フレーム呼ばれるため、ロックを取らず
+事前に確保したリストの要素を書き換えるだけにしている。ラベル付きの子メトリクスは
+初回だけ生成し (ここだけロックを取る)、以降は辞書から引くだけ。
+値の読み出しはHTTPスレッドが行うが、書き込み中の値を読んでも1回分ずれるだけで壊れることはない。
+
+使用例:
+    import metrics
+    metrics.photos_total.inc()
+    metrics.stage_seconds.labels("cap_read").observe(0.012)
+    metrics.start_server(9108)
+"""
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 処理段階のレイテンシ用のバケット境界 (秒)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# カメラの切断時間用のバケット境界 (秒)
+OUTAGE_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """単調増加するカウンタ"""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: int = 1):
+        self.value += n
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Gauge:
+    """任意の値を上書きするゲージ"""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Histogram:
+    """
+    固定バケットのヒストグラム。
+    バケットごとの度数リストは生成時に確保し、observe() は該当要素を1つ加算するだけ。
+    """
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1) # 最後の要素は +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        counts = list(self.counts) # 出力中に書き換わっても累積値が矛盾しないようにコピー
+        cumulative = 0
+        for bound, n in zip(self.bounds + (float("inf"),), counts):
+            cumulative += n
+            yield f"{name}_bucket", labels + (("le", _format_value(bound)),), cumulative
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, cumulative
+
+
+class MetricFamily:
+    """
+    同じ名前のメトリクスの集まり。label_name を指定するとラベル値ごとに子メトリクスを持つ。
+    ラベルなしの場合は inc / set / observe を直接呼べる。
+    """
+    def __init__(self, name: str, help_text: str, kind: str, factory, label_name: str = None):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_name = label_name
+        self._factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+        if label_name is None:
+            self._default = factory()
+            self._children[None] = self._default
+
+    def labels(self, value):
+        """ラベル値に対応する子メトリクスを返す (初回のみ生成)"""
+        child = self._children.get(value)
+        if child is None:
+            with self._lock:
+                child = self._children.get(value)
+                if child is None:
+                    child = self._factory()
+                    self._children[value] = child
+        return child
+
+    # ラベルなしメトリクス用のショートカット
+    def inc(self, n: int = 1):
+        self._default.inc(n)
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    @property
+    def value(self):
+        return self._default.value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for label_value, child in list(self._children.items()):
+            labels = () if self.label_name is None else ((self.label_name, label_value),)
+            for name, sample_labels, value in child.samples(self.name, labels):
+                if sample_labels:
+                    label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in sample_labels)
+                    lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{name} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.families = []
+        # 出力時に呼ばれ、追加の行を返す関数 (profiler のカウンタなど)
+        self.collectors = []
+
+    def counter(self, name: str, help_text: str, label_name: str = None) -> MetricFamily:
+        return self._register(MetricFamily(name, help_text, "counter", Counter, label_name))
+
+    def gauge(self, name: str, help_text: str, label_name: str = None) -> MetricFamily:
+        return self._register(MetricFamily(name, help_text, "gauge", Gauge, label_name))
+
+    def histogram(self, name: str, help_text: str, label_name: str = None, buckets=LATENCY_BUCKETS) -> MetricFamily:
+        return self._register(MetricFamily(name, help_text, "histogram", lambda: Histogram(buckets), label_name))
+
+    def _register(self, family):
+        self.families.append(family)
+        return family
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式で出力する"""
+        lines = []
+        for family in self.families:
+            lines.extend(family.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# --- フォトブースのメトリクス ---
+sessions_total = registry.counter("autoshutter_sessions_total", "Sessions started (READY -> ADJUST).")
+photos_total = registry.counter("autoshutter_photos_total", "Photos taken.")
+gestures_total = registry.counter("autoshutter_gestures_total", "Circle gestures that triggered an action.")
+timeouts_total = registry.counter("autoshutter_timeouts_total", "TAKE_PICTURE timeouts back to READY.")
+read_failures_total = registry.counter("autoshutter_capture_read_failures_total", "Failed camera reads.")
+transitions_total = registry.counter("autoshutter_state_transitions_total", "State transitions by target state.", "state")
+stage_seconds = registry.histogram("autoshutter_stage_seconds", "Latency of profiled stages.", "stage")
+fps = registry.gauge("autoshutter_fps", "Frames per second by source (loop, camera).", "source")
+model_load_seconds = registry.gauge("autoshutter_model_load_seconds", "Model load time.", "model")
+governor_level = registry.gauge("autoshutter_governor_level", "Current degradation level (0 = normal).")
+governor_changes_total = registry.counter("autoshutter_governor_changes_total", "Governor level changes by new level.", "level")
+temperature_celsius = registry.gauge("autoshutter_temperature_celsius", "Highest thermal zone temperature.")
+cpu_percent = registry.gauge("autoshutter_cpu_percent", "System CPU utilisation.")
+control_latency_seconds = registry.histogram("autoshutter_control_latency_seconds", "Age of the margin measurement when a distance command is issued.")
+control_command = registry.gauge("autoshutter_control_command", "Last distance command in m/s (positive = move back).")
+control_overruns_total = registry.counter("autoshutter_control_overruns_total", "Distance control periods that missed their deadline.")
+capture_up = registry.gauge("autoshutter_capture_up", "1 while the camera delivers frames, 0 during an outage.")
+capture_reconnects_total = registry.counter("autoshutter_capture_reconnects_total", "Camera reopen attempts.")
+capture_outage_seconds = registry.histogram("autoshutter_capture_outage_seconds", "Duration of camera outages (last frame -> reconnected).", buckets=OUTAGE_BUCKETS)
+latency_seconds = registry.histogram("autoshutter_latency_seconds", "Frame and overlay latency by path (capture_to_inference, inference, overlay_age, frame_age, glass_to_glass).", "path")
+log_events_dropped_total = registry.counter("autoshutter_log_events_dropped_total", "Log events dropped because the event log ring was full.")
+log_events_suppressed_total = registry.counter("autoshutter_log_events_suppressed_total", "Repeated log events suppressed by the rate limit.")
+
+
+def observe_stage(label: str, elapsed: float):
+    """profiler のリスナー: 計測値を段階ごとのヒストグラムへ記録する"""
+    stage_seconds.labels(label).observe(elapsed)
+
+
+_bound_profilers = set()
+
+
+def bind_profiler(profiler):
+    """profiler.measure の計測値とカウンタをメトリクスとして公開する (何度呼んでも1回だけ登録される)"""
+    if id(profiler) in _bound_profilers:
+        return
+    _bound_profilers.add(id(profiler))
+    profiler.add_listener(observe_stage)
+
+    def collect_profiler_counters():
+        name = "autoshutter_profile_events_total"
+        lines = [f"# HELP {name} Event counters recorded by the profiler.", f"# TYPE {name} counter"]
+        for label, value in sorted(profiler.counters.copy().items()):
+            lines.append(f'{name}{{event="{_escape(label)}"}} {value}')
+        return lines
+
+    registry.collectors.append(collect_profiler_counters)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # アクセスのたびに標準エラーへ出力しない
+        pass
+
+
+class MetricsServer:
+    """メトリクスを返すHTTPサーバー。デーモンスレッドで動くのでメインループをブロックしない"""
+    def __init__(self, port: int, host: str = "127.0.0.1", registry: MetricsRegistry = registry):
+        self.httpd = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.registry = registry
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_server = None
+
+
+def start_server(port: int, host: str = "127.0.0.1"):
+    """
+    メトリクスサーバーを起動する (起動済みならそれを返す)。
+    ポートが使えない場合は警告を出してNoneを返し、アプリは継続する。
+    """
+    global _server
+    if _server is not None:
+        return _server
+    try:
+        _server = MetricsServer(port, host).start()
+    except OSError as e:
+        print(f"[Metrics] Warning: could not start metrics server on {host}:{port}: {e}")
+        return None
+    print(f"[Metrics] Serving Prometheus metrics at http://{host}:{_server.port}/metrics")
+    return _server
+
+
+def stop_server():
+    global _server
+    if _server is not None:
+        _server.stop()
+        _server = None
@@ -1,32 +1,239 @@
 import os
-from ultralytics import YOLO
+import json
+import time
+import hashlib
+import platform
+from importlib import metadata
 
-def load_model(model_basename: str, task: str = None):
+import metrics
+
+# 量子化バリアントのフォルダ接尾辞と、各フォルダに書かれる評価結果のファイル名
+# (export_logic.py / evaluate_variants.py で生成される)
+VARIANT_SUFFIXES = {"fp32": "", "fp16": "_fp16", "int8": "_int8"}
+VARIANT_METADATA_FILE = "variant.json"
+
+# エクスポート時の設定 (元の.ptのハッシュ・imgsz・half・int8・ultralyticsのバージョン) を記録するファイル
+# (export_logic.py が各フォルダに書き込む)
+EXPORT_MANIFEST_FILE = "export_manifest.json"
+
+# ONNXエクスポートのフォルダ接尾辞とファイル名
+ONNX_SUFFIX = "_onnx_model"
+ONNX_MODEL_FILE = "model.onnx"
+
+# 選べるバックエンド ("onnxruntime" と "opencv" はONNXモデルの実行エンジン) と、
+# benchmark_backends.py が最速のバックエンドを記録するファイル
+BACKENDS = ("pt", "ncnn", "onnxruntime", "opencv")
+BACKEND_BENCHMARK_FILE = "backend_benchmark.json"
+
+# ジェスチャー判定のバランス精度 (FP32基準、evaluate_variants.py を参照) の既定の下限
+DEFAULT_ACCURACY_FLOOR = 0.95
+
+def _read_json(path: str):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[ModelLoader] Warning: failed to read {path}: {e}")
+        return None
+
+def read_variant_metadata(path: str):
+    """バリアントフォルダの評価結果 (accuracy, latency_ms など) を読み込む。なければNone"""
+    return _read_json(os.path.join(path, VARIANT_METADATA_FILE))
+
+def read_export_manifest(path: str):
+    """エクスポートフォルダのマニフェストを読み込む。なければNone (マニフェスト導入前のエクスポート)"""
+    return _read_json(os.path.join(path, EXPORT_MANIFEST_FILE))
+
+def file_sha256(path: str) -> str:
+    """ファイル内容のSHA-256 (16進)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def ultralytics_version():
+    """インストールされている ultralytics のバージョン (import せずに調べる)。なければNone"""
+    try:
+        return metadata.version("ultralytics")
+    except metadata.PackageNotFoundError:
+        return None
+
+def stale_export_reasons(path: str, expected: dict) -> list:
+    """
+    エクスポートフォルダのマニフェストを期待値と比べ、一致しない項目の説明を返す。
+    空リストならエクスポートは最新。マニフェストがなければ、それ自体を理由として返す。
+    """
+    manifest = read_export_manifest(path)
+    if manifest is None:
+        return [f"no {EXPORT_MANIFEST_FILE}"]
+    return [f"{key} {manifest.get(key)!r} != current {value!r}"
+            for key, value in expected.items() if manifest.get(key) != value]
+
+def check_export(path: str, model_basename: str) -> list:
+    """
+    NCNNエクスポートが現在の .pt と ultralytics から作られたものかを調べる。
+    :return: 古いと判断した理由のリスト (空なら最新)
+    """
+    expected = {}
+    pt_path = f"{model_basename}.pt"
+    if os.path.exists(pt_path):
+        expected["source_sha256"] = file_sha256(pt_path)
+    version = ultralytics_version()
+    if version is not None:
+        expected["ultralytics"] = version
+    return stale_export_reasons(path, expected)
+
+def select_variant(model_basename: str, accuracy_floor: float = DEFAULT_ACCURACY_FLOOR):
+    """
+    エクスポート済みのNCNNバリアントから、精度の下限を満たす最速のものを選ぶ。
+
+    評価結果 (variant.json) のない量子化バリアントは精度が不明なので候補にしない。
+    FP32は基準そのものなので、評価結果がなくても候補にする (ただし速度比較では最後)。
+
+    Returns:
+        str or None: 選ばれたフォルダのパス。NCNNモデルが1つもなければNone
+    """
+    base = f"{model_basename}_ncnn_model"
+    candidates = []
+    for precision, suffix in VARIANT_SUFFIXES.items():
+        path = base + suffix
+        if not os.path.exists(path):
+            continue
+        meta = read_variant_metadata(path)
+        if meta is None:
+            if precision == "fp32":
+                candidates.append((float("inf"), path))
+            continue
+        if precision != "fp32" and "metrics" not in meta:
+            # 単純な一致率で評価した古いメタデータは、ジェスチャーを検出しないバリアントも通してしまう
+            print(f"[ModelLoader] {path}: evaluated with the old agreement metric. "
+                  "Re-run evaluate_variants.py. Skipped.")
+            continue
+        if meta.get("accuracy", 0.0) < accuracy_floor:
+            print(f"[ModelLoader] {path}: accuracy {meta.get('accuracy')} < floor {accuracy_floor}. Skipped.")
+            continue
+        candidates.append((meta.get("latency_ms", float("inf")), path))
+
+    if not candidates:
+        return None
+    return min(candidates)[1]
+
+def onnx_dir(model_basename: str) -> str:
+    """ONNXエクスポートのフォルダ (export_logic.py --onnx で生成される)"""
+    return f"{model_basename}{ONNX_SUFFIX}"
+
+def onnx_engines():
+    """このマシンで使えるONNXの実行エンジン (速い順の想定)"""
+    engines = []
+    try:
+        metadata.version("onnxruntime")
+        engines.append("onnxruntime")
+    except metadata.PackageNotFoundError:
+        pass
+    engines.append("opencv")
+    return engines
+
+def available_backends(model_basename: str, accuracy_floor: float = DEFAULT_ACCURACY_FLOOR) -> list:
+    """このモデルについて、ファイルがそろっていて実行できるバックエンド名のリスト"""
+    found = []
+    if os.path.exists(f"{model_basename}.pt"):
+        found.append("pt")
+    if select_variant(model_basename, accuracy_floor) is not None:
+        found.append("ncnn")
+    if os.path.exists(os.path.join(onnx_dir(model_basename), ONNX_MODEL_FILE)):
+        found.extend(onnx_engines())
+    return found
+
+def recorded_winner(model_basename: str):
+    """benchmark_backends.py がこのマシンで記録した最速のバックエンド。なければNone"""
+    record = _read_json(BACKEND_BENCHMARK_FILE)
+    if not record or record.get("machine") != platform.machine():
+        return None
+    return record.get("winner", {}).get(model_basename)
+
+def _warn_if_stale(path: str, model_basename: str, refuse_stale: bool) -> bool:
+    """エクスポートが古ければ警告する。refuse_stale なら True (使わない) を返す"""
+    stale = check_export(path, model_basename)
+    if not stale:
+        return False
+    action = "Falling back to PT" if refuse_stale else "Re-export with: python src/export_logic.py"
+    print(f"[ModelLoader] Warning: {path} is stale ({'; '.join(stale)}). {action}")
+    return refuse_stale
+
+def load_model(model_basename: str, task: str = None, accuracy_floor: float = None, refuse_stale: bool = False,
+               backend: str = "auto"):
     """
     モデルをロードするヘルパー関数。
-    NCNNフォーマットのモデルディレクトリ（{model_basename}_ncnn_model）が存在すればそれを読み込み、
-    なければ通常のPtモデル（{model_basename}.pt）を読み込む。
+    NCNNフォーマットのモデルディレクトリ（{model_basename}_ncnn_model[_fp16|_int8]）が存在すればそれを読み込み、
+    なければ通常のPtモデル（{model_basename}.pt）を読み込む。.ptもなければONNX ({model_basename}_onnx_model) を使う。
+    NCNNの量子化バリアントが複数ある場合は、精度の下限を満たす最速のものを選ぶ。
+    benchmark_backends.py がこのマシンで最速のバックエンドを記録していれば、それを優先する。
 
     Args:
         model_basename (str): 拡張子なしのモデル名 (例: "yolo11n-pose")
-        task (str, optional): タスク名 ("pose", "detect"など)。NCNNロード時に推奨される。
+        task (str, optional): タスク名 ("pose", "detect"など)。NCNN・ONNXロード時に必要。
+        accuracy_floor (float, optional): バリアント選択時の精度の下限。省略時は DEFAULT_ACCURACY_FLOOR
+        refuse_stale (bool, optional): エクスポートが古い (.pt や ultralytics が変わった) とき、
+            警告だけでなく読み込みを拒否して .pt を使う
+        backend (str, optional): "auto" または BACKENDS のいずれか
 
     Returns:
-        YOLO: ロードされたモデルインスタンス
+        InferenceBackend: ロードされたモデル (predict で PerceptionResult を返す)
     """
-    
-    # NCNNモデルのパス (export_ncnn.pyで生成されるフォルダ名)
-    ncnn_path = f"{model_basename}_ncnn_model"
-    pt_path = f"{model_basename}.pt"
+    if accuracy_floor is None:
+        accuracy_floor = DEFAULT_ACCURACY_FLOOR
+    if backend != "auto" and backend not in BACKENDS:
+        raise ValueError(f"unknown backend '{backend}' (expected 'auto' or one of {', '.join(BACKENDS)})")
+
+    available = available_backends(model_basename, accuracy_floor)
+    if backend != "auto" and backend not in available:
+        print(f"[ModelLoader] Warning: backend '{backend}' is not available for {model_basename}. Choosing automatically.")
+        backend = "auto"
+    if backend == "auto":
+        winner = recorded_winner(model_basename)
+        if winner in available:
+            print(f"[ModelLoader] Using benchmark winner for {model_basename}: {winner}")
+            backend = winner
+        else:
+            # 既定の優先順: NCNN -> .pt -> ONNX (.pt を配布しない環境向け)
+            backend = next((b for b in ("ncnn", "pt", *onnx_engines()) if b in available), "pt")
+
+    # エクスポートが古くて使えない場合は .pt に戻す
+    if backend == "ncnn":
+        path = select_variant(model_basename, accuracy_floor)
+        if path is None or _warn_if_stale(path, model_basename, refuse_stale):
+            backend = "pt"
+    elif backend in ("onnxruntime", "opencv"):
+        path = onnx_dir(model_basename)
+        if _warn_if_stale(path, model_basename, refuse_stale):
+            backend = "pt"
 
     # カレントディレクトリからの相対パス、もしくは絶対パスの考慮が必要だが
     # ここでは実行ディレクトリ直下を想定
-    
-    if os.path.exists(ncnn_path):
-        print(f"[ModelLoader] NCNN model found: {ncnn_path}")
-        # NCNNモデルのロード
-        # task引数はNCNNの場合に警告抑制のために指定推奨
-        return YOLO(ncnn_path, task=task)
+    started = time.perf_counter()
+    if backend in ("onnxruntime", "opencv"):
+        # torch も ultralytics も読み込まない
+        from backends import OnnxBackend
+        manifest = read_export_manifest(path) or {}
+        print(f"[ModelLoader] ONNX model found: {path} ({backend})")
+        model = OnnxBackend(os.path.join(path, ONNX_MODEL_FILE), task, manifest.get("imgsz", 640), engine=backend)
+        label = os.path.basename(path)
     else:
-        print(f"[ModelLoader] NCNN model not found. Falling back to PT: {pt_path}")
-        return YOLO(pt_path)
+        # ultralytics (torch) のインポートは重いため、実際にロードするときだけ行う
+        from ultralytics import YOLO
+        from backends import UltralyticsBackend
+        if backend == "ncnn":
+            print(f"[ModelLoader] NCNN model found: {path}")
+            # task引数はNCNNの場合に警告抑制のために指定推奨
+            model = UltralyticsBackend(YOLO(path, task=task), "ncnn", batch_capable=False)
+            label = os.path.basename(path)
+        else:
+            pt_path = f"{model_basename}.pt"
+            print(f"[ModelLoader] Loading PT model: {pt_path}")
+            model = UltralyticsBackend(YOLO(pt_path), "pt", batch_capable=True)
+            label = pt_path
+    metrics.model_load_seconds.labels(label).set(time.perf_counter() - started)
+    return model
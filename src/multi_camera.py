@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+1台のPCで複数のブース (カメラ) を動かすマルチカメラ構成。
+
+各カメラは独自の PhotoBoothApp (状態機械) を専用スレッドで動かす。
+推論要求は共有の BatchInferenceServer に集められ、同じタイミングの要求を
+1回のフォワード (バッチN) でまとめて推論することで、1回あたりのオーバーヘッドを分散する。
+
+使用例:
+    python src/multi_camera.py 0 1
+"""
+import sys
+import time
+import queue
+import threading
+from collections import deque
+from dataclasses import replace
+
+import cv2
+import numpy as np
+
+from main import Config, PhotoBoothApp
+from profiler import profiler
+from event_log import events
+import metrics
+from detect_circle_gesture import detect_circle_gesture_batch, get_pose_model
+from measure_distance import detect_person_distance2sideedge_batch, get_detect_model
+
+
+class BatchInferenceServer:
+    """
+    複数スレッドからの推論要求をまとめてバッチ推論するサーバ。
+    最初の要求が来てから max_wait_sec 待つか max_batch 件集まった時点でまとめて推論する。
+    """
+    def __init__(self, name: str, batch_fn, max_batch: int, max_wait_sec: float = 0.01):
+        """
+        :param batch_fn: 入力のリストを受け取り、結果のリストを返す関数
+        :param max_batch: 1回のフォワードでまとめる最大件数 (通常はカメラ台数)
+        :param max_wait_sec: 後続の要求を待つ最大時間
+        """
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait_sec = max_wait_sec
+        self.requests = queue.Queue()
+        self.batch_sizes = deque(maxlen=500)
+        self._thread = threading.Thread(target=self._serve, name=f"batch-{name}", daemon=True)
+        self._running = False
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._thread.join(timeout=1.0)
+
+    def submit(self, item):
+        """推論を要求し、結果が出るまでブロックする"""
+        request = [item, None, threading.Event()]
+        self.requests.put(request)
+        request[2].wait()
+        if isinstance(request[1], Exception):
+            raise request[1]
+        return request[1]
+
+    def _serve(self):
+        while self._running:
+            try:
+                first = self.requests.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait_sec
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.batch_sizes.append(len(batch))
+            try:
+                results = self.batch_fn([req[0] for req in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for req, result in zip(batch, results):
+                req[1] = result
+                req[2].set()
+
+
+class CameraBooth(threading.Thread):
+    """1台のカメラと、その状態機械 (PhotoBoothApp) を動かすスレッド"""
+    def __init__(self, config: Config, gesture_server: BatchInferenceServer, distance_server: BatchInferenceServer):
+        super().__init__(name=f"booth-{config.CAMERA_INDEX}", daemon=True)
+        self.app = PhotoBoothApp(config)
+        self.app.gesture_detector = self._detect_gesture
+        self.app.gesture_cascade = None # バッチ推論サーバーを使うためカスケードは使わない
+        self.app.distance_detector = self._detect_distance
+        self.gesture_server = gesture_server
+        self.distance_server = distance_server
+
+        self.latest_frame = None
+        self.running = False
+
+        # カメラごとの計測値
+        self.frame_count = 0
+        self.loop_latencies = deque(maxlen=500)
+        self.inference_latencies = deque(maxlen=500)
+        self.started_at = None
+
+    def _detect_gesture(self, frame, seq: int = -1, imgsz: int = None):
+        # バッチはカメラ間で共有するため、推論サイズ (imgsz) はカメラごとには変えない
+        start = time.perf_counter()
+        result = self.gesture_server.submit(frame)
+        self.inference_latencies.append(time.perf_counter() - start)
+        result.seq = seq
+        return result
+
+    def _detect_distance(self, frame, margin, seq: int = -1, imgsz: int = None):
+        start = time.perf_counter()
+        result = self.distance_server.submit(frame)
+        self.inference_latencies.append(time.perf_counter() - start)
+        result.seq = seq
+        return result
+
+    def open(self):
+        self.app.open_camera()
+
+    def run(self):
+        self.running = True
+        self.started_at = time.perf_counter()
+        while self.running:
+            wait = self.step()
+            if wait > 0:
+                time.sleep(wait)
+
+    def step(self) -> float:
+        """
+        1フレーム分の処理を行う。
+        :return: 次のフレームまで待つ時間 (秒)。状態ごとのキャプチャ設定のFPSに合わせる
+        """
+        start_time = time.perf_counter()
+        supervisor = self.app.capture_supervisor
+        ret, frame = supervisor.read()
+        if not ret:
+            # 切断中は再接続中の画面を出し、再接続の時刻まで待つ (空回りしない)
+            if not supervisor.connected:
+                config = self.app.config
+                self.latest_frame = supervisor.placeholder(config.RESOLUTION_WIDTH, config.RESOLUTION_HEIGHT)
+            return supervisor.wait_hint()
+
+        self.latest_frame = self.app.process_frame(frame)
+        # 状態遷移があればカメラのFPSを切り替える (タイマーは app.active_fps でフレーム数に換算している)
+        self.app._apply_capture_profile()
+        elapsed = time.perf_counter() - start_time
+        self.loop_latencies.append(elapsed)
+        self.frame_count += 1
+        return (1.0 / self.app.active_fps) - elapsed
+
+    def stats(self) -> dict:
+        """カメラごとのFPSとレイテンシ (ms) を返す"""
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        loop = np.array(self.loop_latencies or [0.0]) * 1000.0
+        infer = np.array(self.inference_latencies or [0.0]) * 1000.0
+        return {
+            "fps": self.frame_count / elapsed if elapsed > 0 else 0.0,
+            "loop_p50_ms": float(np.percentile(loop, 50)),
+            "loop_p95_ms": float(np.percentile(loop, 95)),
+            "inference_p50_ms": float(np.percentile(infer, 50)),
+        }
+
+
+class MultiCameraPhotoBooth:
+    """複数のCameraBoothをまとめて起動し、メインスレッドで表示を担当する"""
+    STATS_INTERVAL_SEC = 10.0
+
+    def __init__(self, camera_indices, base_config: Config = None, max_wait_sec: float = 0.01):
+        base = base_config if base_config is not None else Config()
+        self.configs = [
+            replace(base, CAMERA_INDEX=index, WINDOW_NAME=f"{base.WINDOW_NAME} [{index}]")
+            for index in camera_indices
+        ]
+        n = len(self.configs)
+        self.gesture_server = BatchInferenceServer("gesture", detect_circle_gesture_batch, n, max_wait_sec)
+        self.distance_server = BatchInferenceServer(
+            "distance", lambda frames: detect_person_distance2sideedge_batch(frames, base.MARGIN), n, max_wait_sec)
+        self.booths = [CameraBooth(c, self.gesture_server, self.distance_server) for c in self.configs]
+
+    def initialize(self):
+        print("--- マルチカメラ構成で初期化中 ---")
+        events.start(self.configs[0].EVENT_LOG_PATH)
+        # メトリクスは全カメラ分をまとめて1つのエンドポイントで公開する
+        metrics.bind_profiler(profiler)
+        if self.configs[0].METRICS_PORT:
+            metrics.start_server(self.configs[0].METRICS_PORT)
+        # モデルは全カメラで共有する
+        print("AIモデルをロード中...")
+        base = self.configs[0]
+        get_pose_model(base.MODEL_ACCURACY_FLOOR, base.REFUSE_STALE_EXPORTS, base.INFERENCE_BACKEND)
+        get_detect_model(base.MODEL_ACCURACY_FLOOR, base.REFUSE_STALE_EXPORTS, base.INFERENCE_BACKEND)
+        for booth in self.booths:
+            booth.open()
+            cv2.namedWindow(booth.app.config.WINDOW_NAME, cv2.WINDOW_NORMAL)
+        print(f"初期化完了。{len(self.booths)}台のカメラで開始します。")
+
+    def run(self):
+        self.gesture_server.start()
+        self.distance_server.start()
+        for booth in self.booths:
+            booth.start()
+
+        last_stats = time.perf_counter()
+        try:
+            while True:
+                # imshow/waitKey はメインスレッドで行う必要がある
+                for booth in self.booths:
+                    if booth.latest_frame is not None:
+                        cv2.imshow(booth.app.config.WINDOW_NAME, booth.latest_frame)
+                if cv2.waitKey(10) & 0xFF == ord('q'):
+                    break
+
+                if time.perf_counter() - last_stats > self.STATS_INTERVAL_SEC:
+                    self.print_stats()
+                    last_stats = time.perf_counter()
+        finally:
+            self._cleanup()
+
+    def print_stats(self):
+        for booth in self.booths:
+            s = booth.stats()
+            print(f"[camera {booth.app.config.CAMERA_INDEX}] fps={s['fps']:.1f} "
+                  f"loop p50={s['loop_p50_ms']:.1f}ms p95={s['loop_p95_ms']:.1f}ms "
+                  f"inference p50={s['inference_p50_ms']:.1f}ms")
+        for server in (self.gesture_server, self.distance_server):
+            if server.batch_sizes:
+                print(f"[batch {server.name}] 平均バッチサイズ={np.mean(server.batch_sizes):.2f}")
+
+    def _cleanup(self):
+        print("後処理を実行します...")
+        for booth in self.booths:
+            booth.running = False
+        for booth in self.booths:
+            booth.join(timeout=2.0)
+            if booth.app.cap:
+                booth.app.cap.release()
+        self.gesture_server.stop()
+        self.distance_server.stop()
+        self.print_stats()
+        profiler.report_counters()
+        metrics.stop_server()
+        cv2.destroyAllWindows()
+        events.close()
+        print("終了")
+
+
+if __name__ == "__main__":
+    indices = [int(arg) for arg in sys.argv[1:]] or [0, 1]
+    booth = MultiCameraPhotoBooth(indices)
+    booth.initialize()
+    booth.run()
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+キャプチャ・推論・描画(UI)を別プロセスに分けるパイプライン。
+
+GILのせいで1プロセスでは全処理が1コアを取り合うため、
+  - キャプチャプロセス: カメラから読み込み、共有メモリのリングバッファへ書き込む
+  - 推論プロセス: リングから最新フレームを取り出して姿勢推定/人物検出を行う
+  - UIプロセス (メインプロセス): リングから表示用フレームを取り出し、状態遷移と描画を行う
+に分割する。プロセス間のキューにはシーケンス番号・キーポイント・bboxなどの小さなデータだけを流す。
+"""
+import queue
+import time
+import multiprocessing as mp
+
+import cv2
+import numpy as np
+
+from event_log import events
+from frame_ring import SharedFrameRing
+from perception import PerceptionResult
+
+# 推論プロセスへの要求タスク
+TASK_NONE = 0
+TASK_GESTURE = 1
+TASK_DISTANCE = 2
+
+
+def _put_latest(q, item):
+    """キューが満杯なら古い要素を捨ててでも最新の要素を入れる"""
+    try:
+        q.put_nowait(item)
+    except queue.Full:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            pass
+
+
+class SyntheticSource:
+    """カメラの代わりに合成フレームを一定FPSで返すソース (ベンチマーク用)"""
+    def __init__(self, shape=(480, 640, 3), fps: float = 30.0):
+        self.shape = shape
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.frame = np.full(shape, 90, dtype=np.uint8)
+        self.index = 0
+        self.next_time = time.perf_counter()
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        # カメラと同様に次のフレーム時刻までブロックする
+        now = time.perf_counter()
+        if self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time = max(self.next_time + self.interval, time.perf_counter())
+
+        h, w = self.shape[:2]
+        x = (self.index * 8) % (w - 80)
+        self.frame[:] = 90
+        cv2.rectangle(self.frame, (x, h // 3), (x + 80, h // 3 + 160), (40, 160, 220), -1)
+        self.index += 1
+        return True, self.frame
+
+    def release(self):
+        pass
+
+
+def open_source(source, camera_settings):
+    """source が "synthetic" なら合成ソース、それ以外はカメラインデックスとして開く"""
+    if source == "synthetic":
+        return SyntheticSource(fps=camera_settings.get("fps", 30))
+
+    cap = cv2.VideoCapture(source)
+    props = {
+        "width": cv2.CAP_PROP_FRAME_WIDTH,
+        "height": cv2.CAP_PROP_FRAME_HEIGHT,
+        "fps": cv2.CAP_PROP_FPS,
+        "auto_exposure": cv2.CAP_PROP_AUTO_EXPOSURE,
+        "buffersize": cv2.CAP_PROP_BUFFERSIZE,
+        "exposure": cv2.CAP_PROP_EXPOSURE,
+    }
+    for key, prop in props.items():
+        if key in camera_settings:
+            cap.set(prop, camera_settings[key])
+    return cap
+
+
+def capture_worker(source, camera_settings, ring_name, slots, shape, frame_queue, perception_queue, stop_event):
+    """キャプチャプロセス: フレームをリングへ書き込み、シーケンス番号を各プロセスへ通知する"""
+    ring = SharedFrameRing.attach(ring_name, slots=slots, shape=shape)
+    cap = open_source(source, camera_settings)
+    try:
+        for _ in range(camera_settings.get("warmup_frames", 0)):
+            cap.read()
+
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret or frame.shape != ring.shape:
+                time.sleep(0.01)
+                continue
+            seq, _ = ring.write(frame, time.monotonic_ns())
+            _put_latest(frame_queue, seq)
+            _put_latest(perception_queue, seq)
+    finally:
+        cap.release()
+        ring.close()
+
+
+def perception_worker(ring_name, slots, shape, perception_queue, result_queue, task, margin, simulate_ms, stop_event,
+                      model_options=None):
+    """
+    推論プロセス: 要求されたタスクを最新フレームに対して実行し、結果のメタデータだけを返す。
+    model_options は get_pose_model / get_detect_model の引数 (accuracy_floor, refuse_stale, backend)
+    """
+    ring = SharedFrameRing.attach(ring_name, slots=slots, shape=shape)
+    raw = np.empty(shape, dtype=np.uint8)
+    frame = np.empty(shape, dtype=np.uint8)
+    # 推論関数の profiler.measure はこのプロセスのイベントログに記録するので、書き込みスレッドを動かしておく
+    # (動かさないとリングが満杯になって捨て続ける)。ファイルはUIプロセスのものなので、コンソールにだけ出す
+    events.start()
+
+    if simulate_ms is None:
+        # モデルは推論プロセスでのみロードする。検出関数は引数なしでモデルを取得するので、
+        # UIの設定 (バックエンド・精度の下限など) で先にロードしておく
+        from detect_circle_gesture import detect_circle_gesture, get_pose_model
+        from measure_distance import detect_person_distance2sideedge, get_detect_model
+        get_pose_model(**(model_options or {}))
+        get_detect_model(**(model_options or {}))
+
+    try:
+        while not stop_event.is_set():
+            try:
+                seq = perception_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            current_task = task.value
+            if current_task == TASK_NONE:
+                continue
+            if not ring.read_into(seq, raw):
+                continue
+            # UIと同じ座標系にするため左右反転
+            cv2.flip(raw, 1, dst=frame)
+
+            capture_ns = ring.capture_ns(seq)
+            started_ns = time.monotonic_ns()
+            if simulate_ms is not None:
+                _busy_wait(simulate_ms / 1000.0)
+                result = PerceptionResult(seq=seq)
+            elif current_task == TASK_GESTURE:
+                result = detect_circle_gesture(frame, seq=seq)
+            else:
+                result = detect_person_distance2sideedge(frame, margin, seq=seq)
+            # CLOCK_MONOTONIC はプロセス間で共通なので、そのままUIプロセスの時刻と比べられる
+            result.captured_at = capture_ns / 1e9 if capture_ns is not None else None
+            result.inference_started = started_ns / 1e9
+            # PerceptionResult は配列だけを持つので、キューで送っても数百バイト程度
+            _put_latest(result_queue, {
+                "task": current_task, "result": result,
+                "capture_ns": capture_ns, "inference_ns": time.monotonic_ns() - started_ns,
+            })
+    finally:
+        ring.close()
+        events.close()
+
+
+def _busy_wait(seconds):
+    """GILを握ったままCPUを消費する (推論の後処理を模擬する)"""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class MultiProcessPipeline:
+    """
+    PhotoBoothApp から使うマルチプロセス・パイプライン。
+    ``read_latest()`` がカメラの代わりに、``detect_circle_gesture()`` / ``detect_person_distance2sideedge()``
+    が単一プロセス版の検出関数の代わりになる (推論プロセスの最新の PerceptionResult を返す)。
+    """
+    def __init__(self, source, camera_settings, shape=(480, 640, 3), slots: int = 8,
+                 margin: int = 50, simulate_ms=None, accuracy_floor: float = None, refuse_stale: bool = False,
+                 backend: str = "auto"):
+        """
+        :param source: カメラインデックス、または "synthetic"
+        :param camera_settings: カメラに設定する値 (width, height, fps, exposure など)
+        :param simulate_ms: 指定すると推論の代わりにこの時間だけCPUを消費する (ベンチマーク用)
+        :param accuracy_floor: 推論プロセスでモデルをロードするときの量子化バリアントの精度の下限
+        :param refuse_stale: 古いエクスポートを使わない
+        :param backend: 推論バックエンド (model_loader.BACKENDS または "auto")
+        """
+        self.source = source
+        self.camera_settings = camera_settings
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.margin = margin
+        self.simulate_ms = simulate_ms
+        self.model_options = {"accuracy_floor": accuracy_floor, "refuse_stale": refuse_stale, "backend": backend}
+
+        self.ring = None
+        self.processes = []
+        self.frame = np.empty(self.shape, dtype=np.uint8)
+        self.last_seq = -1
+        self.last_results = {}
+
+    def start(self):
+        ctx = mp.get_context("spawn")
+        self.ring = SharedFrameRing.create(slots=self.slots, shape=self.shape)
+        self.stop_event = ctx.Event()
+        self.task = ctx.Value("i", TASK_NONE, lock=False)
+        self.frame_queue = ctx.Queue(maxsize=2)
+        self.perception_queue = ctx.Queue(maxsize=1)
+        self.result_queue = ctx.Queue(maxsize=4)
+
+        self.processes = [
+            ctx.Process(target=capture_worker, name="capture", daemon=True,
+                        args=(self.source, self.camera_settings, self.ring.name, self.slots, self.shape,
+                              self.frame_queue, self.perception_queue, self.stop_event)),
+            ctx.Process(target=perception_worker, name="perception", daemon=True,
+                        args=(self.ring.name, self.slots, self.shape, self.perception_queue,
+                              self.result_queue, self.task, self.margin, self.simulate_ms, self.stop_event,
+                              self.model_options)),
+        ]
+        for p in self.processes:
+            p.start()
+
+    def read_latest(self, timeout: float = 1.0):
+        """最新フレームをUI用バッファへコピーして返す。戻り値は cap.read() と同じ形式"""
+        deadline = time.monotonic() + timeout
+        while True:
+            self._poll_results()
+            seq = self._drain(self.frame_queue)
+            if seq is not None and self.ring.read_into(seq, self.frame):
+                self.last_seq = seq
+                return True, self.frame
+            if time.monotonic() > deadline:
+                return False, None
+            time.sleep(0.001)
+
+    def capture_ns(self, seq=None):
+        return self.ring.capture_ns(self.last_seq if seq is None else seq)
+
+    def _drain(self, q, block_timeout: float = 0.05):
+        """キューから最新の要素だけを取り出す"""
+        try:
+            item = q.get(timeout=block_timeout)
+        except queue.Empty:
+            return None
+        while True:
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                return item
+
+    def _poll_results(self):
+        while True:
+            try:
+                result = self.result_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.last_results[result["task"]] = result
+
+    def clear_results(self):
+        """届いている推論結果を捨てる (次の利用者に前の利用者の結果を返さないため)"""
+        self._poll_results()
+        self.last_results.clear()
+
+    def latest_result(self, task_id: int):
+        self._poll_results()
+        return self.last_results.get(task_id)
+
+    def detect_circle_gesture(self, frame, seq: int = -1, imgsz: int = None):
+        """推論プロセスの最新のジェスチャー推論結果を返す (まだなければ空の結果)。imgszは推論プロセス側の設定に従うため無視する"""
+        self.task.value = TASK_GESTURE
+        latest = self.latest_result(TASK_GESTURE)
+        return latest["result"] if latest is not None else PerceptionResult()
+
+    def detect_person_distance2sideedge(self, frame, margin: int, seq: int = -1, imgsz: int = None):
+        """推論プロセスの最新の人物検出結果を返す (まだなければ空の結果)。imgszは無視する"""
+        self.task.value = TASK_DISTANCE
+        latest = self.latest_result(TASK_DISTANCE)
+        return latest["result"] if latest is not None else PerceptionResult()
+
+    def stop(self):
+        if not self.processes:
+            return
+        self.stop_event.set()
+        for p in self.processes:
+            p.join(timeout=2.0)
+            if p.is_alive():
+                p.terminate()
+        self.processes = []
+        for q in (self.frame_queue, self.perception_queue, self.result_queue):
+            q.cancel_join_thread()
+        self.ring.close()
+        self.ring = None
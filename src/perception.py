@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+推論結果をコンパクトに保持するデータ型。
+
+検出関数は描画済みフレームの代わりにこの結果を返し、描画は renderer が担当する。
+PhotoBoothApp のキャッシュにはフレーム (640x480x3 = 約900KB) ではなく、
+数百バイトの配列だけが残る。
+"""
+import time
+import numpy as np
+
+_EMPTY_BOXES = np.zeros((0, 4), dtype=np.float32)
+_EMPTY_SCORES = np.zeros((0,), dtype=np.float32)
+_EMPTY_FLAGS = np.zeros((0,), dtype=bool)
+
+
+class PerceptionResult:
+    """
+    1フレーム分の推論結果。
+
+    boxes         : (N, 4) float32  xyxy
+    keypoints     : (N, 17, 3) float32  (x, y, 信頼度)。人物検出モデルの場合はNone
+    scores        : (N,) float32  検出の信頼度
+    gesture_flags : (N,) bool  丸ジェスチャーをしているか
+    edge_flags    : (N,) bool  画面の左右端に近すぎるか
+    gestures      : (N, G) bool  ジェスチャーごとの判定 (列は detect_circle_gesture.GESTURES.names の順)。未判定ならNone
+    gesture_scores: (N, G) float32  ジェスチャーごとのスコア (0-1)。未判定ならNone
+    seq           : 元フレームのシーケンス番号 (不明なら -1)
+    timestamp     : 推論完了時刻 (time.monotonic)
+    captured_at   : 元フレームのキャプチャ時刻 (time.monotonic)。不明ならNone
+    inference_started: 推論開始時刻 (time.monotonic)。不明ならNone
+    """
+    __slots__ = ("boxes", "keypoints", "scores", "gesture_flags", "edge_flags", "gestures", "gesture_scores",
+                 "seq", "timestamp", "captured_at", "inference_started")
+
+    def __init__(self, boxes=None, keypoints=None, scores=None, gesture_flags=None, edge_flags=None,
+                 seq: int = -1, timestamp: float = None, captured_at: float = None, inference_started: float = None):
+        self.boxes = _EMPTY_BOXES if boxes is None else boxes
+        self.keypoints = keypoints
+        self.scores = _EMPTY_SCORES if scores is None else scores
+        n = len(self.boxes)
+        self.gesture_flags = np.zeros(n, dtype=bool) if gesture_flags is None else gesture_flags
+        self.edge_flags = np.zeros(n, dtype=bool) if edge_flags is None else edge_flags
+        self.gestures = None
+        self.gesture_scores = None
+        self.seq = seq
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        self.captured_at = captured_at
+        self.inference_started = inference_started
+
+    @classmethod
+    def from_ultralytics(cls, result, seq: int = -1):
+        """ultralytics の Results から配列だけを取り出す"""
+        boxes = result.boxes
+        if boxes is not None and len(boxes):
+            xyxy = boxes.xyxy.cpu().numpy().astype(np.float32, copy=False)
+            scores = boxes.conf.cpu().numpy().astype(np.float32, copy=False)
+        else:
+            xyxy, scores = _EMPTY_BOXES, _EMPTY_SCORES
+
+        keypoints = None
+        if getattr(result, "keypoints", None) is not None:
+            if result.keypoints.data.shape[1] > 0:
+                keypoints = result.keypoints.data.cpu().numpy().astype(np.float32, copy=False)
+            else:
+                keypoints = np.zeros((0, 17, 3), dtype=np.float32)
+        return cls(xyxy, keypoints, scores, seq=seq)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @property
+    def gesture_detected(self) -> bool:
+        """誰か1人でも丸ジェスチャーをしているか"""
+        return bool(self.gesture_flags.any())
+
+    @property
+    def is_at_edge(self) -> bool:
+        """誰か1人でも画面端に近すぎるか"""
+        return bool(self.edge_flags.any())
+
+    @property
+    def nbytes(self) -> int:
+        total = self.boxes.nbytes + self.scores.nbytes + self.gesture_flags.nbytes + self.edge_flags.nbytes
+        for array in (self.keypoints, self.gestures, self.gesture_scores):
+            if array is not None:
+                total += array.nbytes
+        return total
+
+    def __repr__(self):
+        return (f"PerceptionResult(people={len(self)}, gesture={self.gesture_detected}, "
+                f"at_edge={self.is_at_edge}, seq={self.seq})")
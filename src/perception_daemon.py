@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+常駐する推論サービス。
+
+UI (main.py) を再起動するたびに ultralytics と2つのYOLOモデルのロード、カメラのウォームアップが走り、
+数十秒ブースが止まる。カメラとモデルを持つ部分をこのデーモンとして常駐させておき、
+PhotoBoothApp はそこへ接続 (attach) するだけにすれば、UIの再起動は1秒もかからない。
+
+構成 (multiprocess_pipeline.MultiProcessPipeline をそのまま使う):
+  - キャプチャプロセス・推論プロセスはデーモンが起動したまま保持する
+  - フレーム: 共有メモリのリングバッファ (SharedFrameRing)。UIはリングに直接 attach して読む
+  - 推論結果・制御: Unixドメインソケット。メッセージは 4バイト長 + pickle
+  - 最後のUIが切断したら推論を止めて結果を捨て、次のUIには再接続後にキャプチャしたフレームの結果だけを返す
+    (前のセッションのジェスチャー検出結果で、新しいUIが撮影を始めてしまわないように)
+    (ソケットは所有者だけが読み書きできる権限 0600 で作る。ローカルの同一ユーザー専用)
+
+起動:
+    python src/perception_daemon.py                   # Config の既定値 (カメラ・解像度・露出) で起動
+    python src/perception_daemon.py --synthetic       # カメラなし (合成フレーム・推論の模擬) で動作確認
+UIは Config.PERCEPTION_SOCKET にソケットのパスを指定すると接続する (接続できなければ通常どおり単独で起動する)。
+"""
+import os
+import time
+import pickle
+import signal
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+
+from multiprocessing import resource_tracker
+
+import numpy as np
+
+from frame_ring import SharedFrameRing
+from multiprocess_pipeline import MultiProcessPipeline, TASK_NONE, TASK_GESTURE, TASK_DISTANCE
+from perception import PerceptionResult
+
+DEFAULT_SOCKET = "/tmp/autoshutter-perception.sock"
+_LENGTH = struct.Struct("!I")
+
+
+def send_message(sock, message):
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def recv_message(sock):
+    """1メッセージ受け取る。相手が切断していればNone"""
+    header = _recv_exact(sock, _LENGTH.size)
+    if header is None:
+        return None
+    payload = _recv_exact(sock, _LENGTH.unpack(header)[0])
+    return None if payload is None else pickle.loads(payload)
+
+
+def _recv_exact(sock, size: int):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """クライアント (UI) 1つ分の接続"""
+    def handle(self):
+        daemon = self.server.owner
+        with daemon._lock:
+            daemon.clients += 1
+        print(f"[PerceptionDaemon] UIが接続しました (接続数 {daemon.clients})")
+        try:
+            while True:
+                message = recv_message(self.request)
+                if message is None:
+                    break
+                reply = daemon.handle(message)
+                if reply is None:
+                    break
+                send_message(self.request, reply)
+        except OSError:
+            pass
+        finally:
+            with daemon._lock:
+                daemon.clients -= 1
+                if daemon.clients == 0:
+                    daemon.end_session() # 誰も見ていなければ推論を止める
+            print(f"[PerceptionDaemon] UIが切断しました (接続数 {daemon.clients})")
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class PerceptionDaemon:
+    def __init__(self, socket_path: str, source, camera_settings: dict, shape, margin: int = 50, simulate_ms=None,
+                 accuracy_floor: float = None, refuse_stale: bool = False, backend: str = "auto"):
+        """accuracy_floor / refuse_stale / backend は推論プロセスでのモデルのロードに使う (MultiProcessPipeline を参照)"""
+        self.socket_path = socket_path
+        self.pipeline = MultiProcessPipeline(source, camera_settings, shape=shape, margin=margin,
+                                             simulate_ms=simulate_ms, accuracy_floor=accuracy_floor,
+                                             refuse_stale=refuse_stale, backend=backend)
+        self.server = None
+        self.clients = 0
+        self.session_started_ns = 0 # これより前にキャプチャしたフレームの結果は返さない
+        self._lock = threading.Lock() # 接続数と結果キューの読み出しはスレッド間で排他する
+
+    def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path) # 前回異常終了したときのソケットファイル
+        self.pipeline.start()
+        old_umask = os.umask(0o177)
+        try:
+            self.server = _Server(self.socket_path, _Handler)
+        finally:
+            os.umask(old_umask)
+        self.server.owner = self
+        threading.Thread(target=self.server.serve_forever, name="perception-daemon", daemon=True).start()
+        print(f"[PerceptionDaemon] {self.socket_path} で待機中 (ring {self.pipeline.ring.name})")
+
+    def set_task(self, task: int):
+        self.pipeline.task.value = task
+
+    def end_session(self):
+        """推論を止め、それまでの結果を捨てる。推論中だったフレームの結果も後から届くので、時刻でも除外する"""
+        self.set_task(TASK_NONE)
+        self.pipeline.clear_results()
+        self.session_started_ns = time.monotonic_ns()
+
+    def handle(self, message: dict):
+        """要求を処理して返信を返す。Noneなら接続を閉じる"""
+        op = message.get("op")
+        if op == "hello":
+            return {"ring": self.pipeline.ring.name, "slots": self.pipeline.slots, "shape": self.pipeline.shape,
+                    "margin": self.pipeline.margin, "pid": os.getpid()}
+        if op == "result":
+            task = message["task"]
+            self.set_task(task)
+            with self._lock:
+                latest = self.pipeline.latest_result(task)
+                if latest is not None and (latest["capture_ns"] or 0) < self.session_started_ns:
+                    latest = None
+            return {"result": latest["result"] if latest is not None else None}
+        if op == "release":
+            return None
+        return {"error": f"unknown op '{op}'"}
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.pipeline.stop()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class PerceptionClient:
+    """
+    PhotoBoothApp から使うデーモンへの接続。MultiProcessPipeline と同じメソッドを持ち、差し替えて使う。
+    stop() はデーモンから切り離すだけで、カメラとモデルはデーモンに残る。
+    """
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: float = 2.0):
+        self.socket_path = socket_path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+        info = self._request({"op": "hello"})
+        self.shape = tuple(info["shape"])
+        self.ring = SharedFrameRing.attach(info["ring"], slots=info["slots"], shape=self.shape)
+        if info["pid"] != os.getpid():
+            # attach した共有メモリも resource_tracker に登録され、UIの終了時に削除されてしまうため登録を外す
+            # (共有メモリの持ち主はデーモン)
+            resource_tracker.unregister(self.ring.shm._name, "shared_memory")
+        self.frame = np.empty(self.shape, dtype=np.uint8)
+        self.last_seq = -1
+        self.connected = True
+
+    @classmethod
+    def try_attach(cls, socket_path: str, timeout: float = 2.0):
+        """デーモンが動いていれば接続したクライアントを、動いていなければNoneを返す"""
+        if not os.path.exists(socket_path):
+            return None
+        try:
+            return cls(socket_path, timeout)
+        except (OSError, EOFError) as e:
+            print(f"[PerceptionClient] デーモンに接続できませんでした: {e}")
+            return None
+
+    def _request(self, message):
+        send_message(self.sock, message)
+        reply = recv_message(self.sock)
+        if reply is None:
+            raise ConnectionError("perception daemon closed the connection")
+        return reply
+
+    def read_latest(self, timeout: float = 1.0):
+        """リングの最新フレームをUI用バッファへコピーして返す。戻り値は cap.read() と同じ形式"""
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = self.ring.latest_seq()
+            if seq > self.last_seq and self.ring.read_into(seq, self.frame):
+                self.last_seq = seq
+                return True, self.frame
+            if time.monotonic() > deadline:
+                return False, None
+            time.sleep(0.001)
+
+    def capture_ns(self, seq=None):
+        return self.ring.capture_ns(self.last_seq if seq is None else seq)
+
+    def _result(self, task: int) -> PerceptionResult:
+        if not self.connected:
+            return PerceptionResult()
+        try:
+            result = self._request({"op": "result", "task": task})["result"]
+        except (OSError, ConnectionError) as e:
+            print(f"[PerceptionClient] デーモンとの接続が切れました: {e}")
+            self.connected = False
+            return PerceptionResult()
+        return result if result is not None else PerceptionResult()
+
+    def detect_circle_gesture(self, frame, seq: int = -1, imgsz: int = None):
+        """デーモンの最新のジェスチャー推論結果を返す。imgszはデーモン側の設定に従うため無視する"""
+        return self._result(TASK_GESTURE)
+
+    def detect_person_distance2sideedge(self, frame, margin: int, seq: int = -1, imgsz: int = None):
+        """デーモンの最新の人物検出結果を返す。margin・imgszはデーモン側の設定に従う"""
+        return self._result(TASK_DISTANCE)
+
+    def stop(self):
+        """デーモンから切り離す (デーモンは動き続ける)"""
+        if self.connected:
+            try:
+                send_message(self.sock, {"op": "release"})
+            except OSError:
+                pass
+        self.connected = False
+        self.sock.close()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+def main():
+    from main import Config, pipeline_camera_settings
+
+    parser = argparse.ArgumentParser(description="カメラとモデルを保持する常駐推論サービス")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--synthetic", action="store_true", help="カメラの代わりに合成フレーム、推論の代わりに模擬処理を使う")
+    parser.add_argument("--simulate-ms", type=float, default=20.0, help="--synthetic 時の模擬推論時間")
+    args = parser.parse_args()
+
+    config = Config()
+    source = "synthetic" if args.synthetic else config.CAMERA_INDEX
+    daemon = PerceptionDaemon(args.socket, source, pipeline_camera_settings(config),
+                              shape=(config.RESOLUTION_HEIGHT, config.RESOLUTION_WIDTH, 3), margin=config.MARGIN,
+                              simulate_ms=args.simulate_ms if args.synthetic else None,
+                              accuracy_floor=config.MODEL_ACCURACY_FLOOR, refuse_stale=config.REFUSE_STALE_EXPORTS,
+                              backend=config.INFERENCE_BACKEND)
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+    daemon.start()
+    try:
+        while not stopped.wait(0.5):
+            pass
+    finally:
+        print("[PerceptionDaemon] 終了します...")
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
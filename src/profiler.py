@@ -1,6 +1,8 @@
 import time
 from contextlib import contextmanager
 
+from event_log import events
+
 class ProfileLogger:
     """
     指定されたブロックの実行時間を計測して出力するクラス
@@ -11,10 +13,31 @@ class ProfileLogger:
     """
     def __init__(self, debug: bool = True):
         self.debug = debug
+        # キャッシュのヒット/ミスなど、回数を数えるだけの指標
+        self.counters = {}
+        # 計測値を受け取る関数 (label, elapsed) のリスト。metrics などが登録する
+        self.listeners = []
+
+    def add_listener(self, fn):
+        """measure() の計測値を受け取る関数を登録する (debugがFalseでも呼ばれる)"""
+        if fn not in self.listeners:
+            self.listeners.append(fn)
+
+    def count(self, label: str, n: int = 1):
+        """カウンタを加算する (debugに関係なく常に記録)"""
+        self.counters[label] = self.counters.get(label, 0) + n
+
+    def get_count(self, label: str) -> int:
+        return self.counters.get(label, 0)
+
+    def report_counters(self):
+        """記録されたカウンタをまとめて出力する"""
+        for label in sorted(self.counters):
+            print(f"[PROFILE] {label}: {self.counters[label]}")
 
     @contextmanager
     def measure(self, label: str):
-        if not self.debug:
+        if not self.debug and not self.listeners:
             yield
             return
 
@@ -23,8 +46,11 @@ class ProfileLogger:
             yield
         finally:
             elapsed = time.perf_counter() - start_time
-            # 10ms以上かかった処理を目立たせるなどしても良いが、まずは全て出す
-            print(f"[PROFILE] {label}: {elapsed:.4f} sec")
+            for listener in self.listeners:
+                listener(label, elapsed)
+            if self.debug:
+                # 描画ループを止めないようイベントログへ流す (同じ段階は間引かれ、値はメトリクスに全件残る)
+                events.log("profile", level="debug", key=("profile", label), stage=label, sec=round(elapsed, 4))
 
 # シングルトンとしてインスタンス化（必要に応じてimportして使う）
 profiler = ProfileLogger(debug=True)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+PerceptionResult をフレームに描画するレンダラー。
+
+推論 (detect_circle_gesture / detect_person_distance2sideedge) と描画を分離し、
+推論しないフレームでもキャッシュした結果を現在のフレームに重ねられるようにする。
+
+描画は人ごとのループではなく、全員分の配列からまとめて行う:
+  - ボーン・手首の線・人物の枠: 全員分の頂点配列を作り、色ごとに cv2.polylines を1回だけ呼ぶ
+  - 関節: 座標を一度にまとめて整数のリストにし、cv2.circle を呼ぶだけにする
+    (事前に描いた丸を NumPy の添字代入で貼る方法は、画素数が多く cv2.circle より遅かった)
+"""
+import cv2
+import numpy as np
+
+# 腕の関節インデックス: 5,6=肩, 7,8=肘, 9,10=手首
+ARM_JOINTS = np.array([5, 6, 7, 8, 9, 10])
+# 腕のボーンは 肩 -> 肘 -> 手首 の折れ線 (左腕・右腕) として描く
+ARM_CHAINS = np.array([[5, 7, 9], [6, 8, 10]])
+WRISTS = np.array([9, 10])
+KEYPOINT_CONF = 0.5
+
+JOINT_RADIUS = 6
+JOINT_COLOR = (0, 255, 255)
+BONE_COLOR = (0, 255, 0)
+ALERT_COLOR = (0, 0, 255)
+GUIDE_COLOR = (200, 200, 200)
+
+
+def draw_gesture(frame, result, cheap: bool = False):
+    """
+    姿勢推定結果 (腕の関節とボーン) と、丸ジェスチャー検出時のフィードバックを描画する。
+    cheap=True なら関節とボーンを省略し、検出時のフィードバックだけを描く (高負荷時用)。
+    """
+    if result is None or result.keypoints is None or len(result.keypoints) == 0:
+        return frame
+
+    keypoints = result.keypoints
+    # 腕の信頼度が低い人は描画しない
+    visible = keypoints[:, ARM_JOINTS, 2].min(axis=1) >= KEYPOINT_CONF
+    if not visible.any():
+        return frame
+    # 視覚化のため、座標を整数に変換
+    coords = keypoints[visible, :, :2].astype(np.int32)
+    detected = np.asarray(result.gesture_flags)[visible]
+
+    if not cheap:
+        # 関節を丸で描画し、その上に腕の線を描画
+        for x, y in coords[:, ARM_JOINTS].reshape(-1, 2).tolist():
+            cv2.circle(frame, (x, y), JOINT_RADIUS, JOINT_COLOR, -1)
+        # (添字で取り出した配列はメモリ上で連続しておらず、cv2.polylines が受け付けないため詰め直す)
+        cv2.polylines(frame, np.ascontiguousarray(coords[:, ARM_CHAINS].reshape(-1, 3, 2)), False, BONE_COLOR, 2)
+
+    if detected.any():
+        # 検出時のフィードバック描画と、検出された人の手首同士を結ぶ線
+        cv2.putText(frame, "MARU (CIRCLE) DETECTED!", (50, 100),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, ALERT_COLOR, 3)
+        cv2.polylines(frame, np.ascontiguousarray(coords[detected][:, WRISTS]), False, ALERT_COLOR, 4)
+    return frame
+
+
+def _box_polygons(boxes) -> np.ndarray:
+    """xyxy (N, 4) を cv2.polylines 用の四角形の頂点 (N, 4, 2) int32 に変換する"""
+    x1, y1, x2, y2 = boxes.astype(np.int32).T
+    return np.stack([np.stack([x1, y1], 1), np.stack([x2, y1], 1),
+                     np.stack([x2, y2], 1), np.stack([x1, y2], 1)], axis=1)
+
+
+def draw_person_boxes(frame, result, margin: int, cheap: bool = False):
+    """人物検出結果の枠・ラベルとマージンのガイド線を描画する。cheap=True ならラベルを省略する"""
+    h, w = frame.shape[:2]
+
+    if result is not None and len(result):
+        polygons = _box_polygons(result.boxes)
+        edge = np.asarray(result.edge_flags, dtype=bool)
+        # 端にいる人は赤い枠 + 警告ラベル、それ以外は緑の枠
+        for flags, color, label in ((~edge, BONE_COLOR, "Person"), (edge, ALERT_COLOR, "Too Close to Edge")):
+            if not flags.any():
+                continue
+            cv2.polylines(frame, polygons[flags], True, color, 2)
+            if cheap:
+                continue
+            for x1, y1 in polygons[flags][:, 0].tolist():
+                cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    # マージンエリアを可視化（デバッグ用：グレーの薄い線）
+    # 左、右の境界線を描画 (2本の cv2.line は数µsで、事前に描いたマスクを合成するより速い)
+    cv2.line(frame, (margin, 0), (margin, h), GUIDE_COLOR, 1)
+    cv2.line(frame, (w - margin, 0), (w - margin, h), GUIDE_COLOR, 1)
+    return frame
@@ -16,6 +16,35 @@ def on_trackbar_change(val):
     # 値は直接 cv2.getTrackbarPos で取得する
     pass
 
+def make_dynamic_background(far_background, scale_factor: float, frame_size):
+    """
+    最初の「遠景」背景画像から、現在のスケールファクターに合わせてクロップ＆リサイズした背景を生成する。
+    :param far_background: 遠景の背景画像 (グレースケール)
+    :param scale_factor: 1.0 (等倍) - SCALE_FACTOR_MAX
+    :param frame_size: 出力サイズ (幅, 高さ)
+    :return: 動的に生成された背景画像
+    """
+    # クロップする領域のサイズを計算
+    # 例: スケールファクターが2.0なら、元の画像の半分のサイズをクロップ
+    crop_w = int(far_background.shape[1] / scale_factor)
+    crop_h = int(far_background.shape[0] / scale_factor)
+
+    # クロップ領域の中心座標
+    center_x = far_background.shape[1] // 2
+    center_y = far_background.shape[0] // 2
+
+    # クロップ領域の左上座標
+    x1 = max(0, center_x - crop_w // 2)
+    y1 = max(0, center_y - crop_h // 2)
+    x2 = min(far_background.shape[1], x1 + crop_w)
+    y2 = min(far_background.shape[0], y1 + crop_h)
+
+    # クロップ
+    cropped_bg = far_background[y1:y2, x1:x2]
+
+    # リサイズして現在のフレームサイズに合わせる
+    return cv2.resize(cropped_bg, tuple(frame_size), interpolation=cv2.INTER_LINEAR)
+
 def main():
     """
     カメラからの映像をリアルタイムで表示し、
@@ -87,37 +116,11 @@ def main():
             current_scale_factor = 1.0 + (trackbar_pos / 100.0) * (SCALE_FACTOR_MAX - 1.0)
 
             # --- 動的背景の生成 ---
-            # 最初の「遠景」背景画像から、現在のスケールファクターに合わせてクロップ＆リサイズ
-            
-            # クロップする領域のサイズを計算
-            # 例: スケールファクターが2.0なら、元の画像の半分のサイズをクロップ
-            crop_w = int(initial_far_background.shape[1] / current_scale_factor)
-            crop_h = int(initial_far_background.shape[0] / current_scale_factor)
-
-            # クロップ領域の中心座標
-            center_x = initial_far_background.shape[1] // 2
-            center_y = initial_far_background.shape[0] // 2
-
-            # クロップ領域の左上座標
-            x1 = max(0, center_x - crop_w // 2)
-            y1 = max(0, center_y - crop_h // 2)
-            x2 = min(initial_far_background.shape[1], x1 + crop_w)
-            y2 = min(initial_far_background.shape[0], y1 + crop_h)
-            
-            # クロップ領域がフレームサイズと一致しない場合の調整
-            # (例: crop_wが奇数の場合など)
-            crop_w = x2 - x1
-            crop_h = y2 - y1
-
-            # クロップ
-            cropped_bg = initial_far_background[y1:y2, x1:x2]
-
-            # リサイズして現在のフレームサイズに合わせる
-            # これが動的に生成された背景となる
-            dynamic_background_gray = cv2.resize(cropped_bg, (frame_w, frame_h), interpolation=cv2.INTER_LINEAR)
+            dynamic_background_gray = make_dynamic_background(
+                initial_far_background, current_scale_factor, (frame_w, frame_h))
             
             # --- 動的背景を背景差分器にセット ---
-            subtractor.set_background(cv2.cvtColor(dynamic_background_gray, cv2.COLOR_GRAY2BGR)) # BGRに変換して渡す
+            subtractor.set_background(dynamic_background_gray) # グレースケールのまま渡せる
             
             # --- 前景マスクの取得 ---
             thresh = subtractor.get_foreground_mask(frame)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+YUYVカメラの生フレームを読み、輝度(Y)面をそのまま使うための高速パス。
+
+通常 OpenCV は YUYV を BGR に変換して返し、背景差分やフレーム類似度などの
+グレースケール処理はそれを再び GRAY に変換している。
+CAP_PROP_CONVERT_RGB=0 で生の YUYV (H, W, 2) を受け取れば、Y面は
+``raw[:, :, 0]`` のストライド付きビューとしてコピーなしで取り出せる。
+BGR変換は表示や姿勢推定に使うフレームでだけ行う。
+"""
+import cv2
+import numpy as np
+
+
+class YuyvFrame:
+    """生のYUYVフレーム。Y面はゼロコピーのビュー、BGRは必要になったときに一度だけ変換する"""
+    __slots__ = ("raw", "_bgr", "_bgr_buffer")
+
+    def __init__(self, raw, bgr_buffer=None):
+        """
+        :param raw: shape (H, W, 2) の uint8 配列 (Y0 U Y1 V ...)
+        :param bgr_buffer: BGR変換の出力先 (再利用するバッファ)。Noneなら変換時に確保する
+        """
+        self.raw = raw
+        self._bgr = None
+        self._bgr_buffer = bgr_buffer
+
+    @property
+    def gray(self) -> np.ndarray:
+        """輝度面 (H, W)。rawを共有するストライド付きビューでコピーしない"""
+        return self.raw[:, :, 0]
+
+    @property
+    def shape(self):
+        h, w = self.raw.shape[:2]
+        return (h, w, 3)
+
+    def bgr(self) -> np.ndarray:
+        """BGRに変換したフレーム (初回のみ変換し、以降は同じ配列を返す)"""
+        if self._bgr is None:
+            self._bgr = cv2.cvtColor(self.raw, cv2.COLOR_YUV2BGR_YUYV, dst=self._bgr_buffer)
+        return self._bgr
+
+
+def as_gray(frame) -> np.ndarray:
+    """
+    グレースケール処理の入力を統一する。
+    YuyvFrame ならY面のビュー、2次元配列ならそのまま、BGRならGRAYに変換して返す。
+    """
+    if isinstance(frame, YuyvFrame):
+        return frame.gray
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+class YuyvCapture:
+    """
+    VideoCapture を生YUYVモードで読むラッパー。
+    カメラやバックエンドが生フォーマットに対応していない場合は enable() が False を返す。
+    """
+    def __init__(self, cap, width: int, height: int):
+        self.cap = cap
+        self.width = width
+        self.height = height
+        # BGR変換の出力先は毎フレーム使い回す (表示フレームは次のreadまでに使い終わる前提)
+        self._bgr_buffer = np.empty((height, width, 3), dtype=np.uint8)
+
+    def enable(self) -> bool:
+        """YUYVかつRGB変換なしに設定し、実際に生データが返ってくるか確認する"""
+        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"YUYV"))
+        if not self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+            return False
+        ret, raw = self.cap.read()
+        if not ret or self._as_yuyv(raw) is None:
+            self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+            return False
+        return True
+
+    def _as_yuyv(self, raw):
+        """バックエンドによって (1, H*W*2) や (H, W, 2) で返るため、(H, W, 2) のビューに揃える"""
+        if raw is None or raw.size != self.width * self.height * 2:
+            return None
+        return raw.reshape(self.height, self.width, 2)
+
+    def read(self):
+        """
+        :return: (ret, YuyvFrame)
+        """
+        ret, raw = self.cap.read()
+        if not ret:
+            return False, None
+        yuyv = self._as_yuyv(raw)
+        if yuyv is None:
+            return False, None
+        return True, YuyvFrame(yuyv, self._bgr_buffer)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+テスト共通の設定。
+
+- src/ を import パスに追加する (アプリは src/ 直下のモジュールをフラットに import している)
+- perf フィクスチャ: 処理時間を計測し、tests/perf_baseline.json のベースラインと比較する
+
+パフォーマンス回帰テストのしくみ:
+    マシンの速さの違いを吸収するため、計測時間は固定の較正処理 (ブラー・リサイズ・NumPy演算)
+    の時間で割った「相対時間」で比較する。較正処理は対象の直前に毎回計測し直すので、
+    他プロセスの負荷などで一時的に遅くなっても両方に同じように影響する。
+    相対時間がベースラインの (1 + 許容率) 倍を超えたら失敗。
+
+環境変数:
+    PERF_TOLERANCE=0.5         許容する遅延の割合 (既定 0.5 = 50%)
+    PERF_UPDATE_BASELINE=1     失敗させずに計測値でベースラインを書き換える
+    PERF_DISABLE=1             計測値の比較を行わない (動作確認のみ)
+"""
+import os
+import sys
+import json
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf_baseline.json")
+DEFAULT_TOLERANCE = 0.5
+
+# スレッド数による揺らぎを避けるため、計測は1スレッドで行う
+cv2.setNumThreads(1)
+
+
+def _calibration_workload(frame, gray, out):
+    cv2.GaussianBlur(gray, (31, 31), 0, dst=out)
+    cv2.resize(frame, (320, 240), interpolation=cv2.INTER_AREA)
+    np.sum(frame, dtype=np.int64)
+
+
+def _time_per_call(fn, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number
+
+
+class PerfRecorder:
+    def __init__(self):
+        self.tolerance = float(os.environ.get("PERF_TOLERANCE", DEFAULT_TOLERANCE))
+        self.update = os.environ.get("PERF_UPDATE_BASELINE") == "1"
+        self.disabled = os.environ.get("PERF_DISABLE") == "1"
+        self.baseline = {}
+        if os.path.exists(BASELINE_FILE):
+            with open(BASELINE_FILE, "r") as f:
+                self.baseline = json.load(f)
+        self.measured = {}
+
+        rng = np.random.default_rng(0)
+        frame = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        out = np.empty_like(gray)
+        self._calibrate = lambda: _calibration_workload(frame, gray, out)
+
+    def __call__(self, name: str, fn, number: int = 50, repeat: int = 7) -> float:
+        """
+        fnの1回あたりの処理時間を計測し、ベースラインより遅ければテストを失敗させる。
+        較正処理と対象を交互にrepeat回計測し、相対時間の最小値 (外乱の最も少ない値) を採用する。
+        :return: 相対時間 (処理時間 / 較正処理の時間)
+        """
+        fn() # ウォームアップ (キャッシュやLUTの初回生成を除く)
+        relative = float("inf")
+        for _ in range(repeat):
+            calibration = _time_per_call(self._calibrate, 5)
+            relative = min(relative, _time_per_call(fn, number) / calibration)
+        self.measured[name] = round(relative, 4)
+
+        if self.update or self.disabled:
+            return relative
+        expected = self.baseline.get(name)
+        if expected is None:
+            pytest.skip(f"{name}: ベースラインがありません (PERF_UPDATE_BASELINE=1 で記録できます)")
+        limit = expected * (1.0 + self.tolerance)
+        assert relative <= limit, (
+            f"{name} が遅くなっています: 相対時間 {relative:.3f} > 許容値 {limit:.3f} "
+            f"(ベースライン {expected:.3f}, 許容率 {self.tolerance:.0%})")
+        return relative
+
+    def save(self):
+        data = dict(self.baseline)
+        data.update(self.measured)
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(dict(sorted(data.items())), f, indent=2)
+            f.write("\n")
+
+
+_recorder = None
+
+
+@pytest.fixture(scope="session")
+def perf():
+    global _recorder
+    if _recorder is None:
+        _recorder = PerfRecorder()
+    return _recorder
+
+
+@pytest.fixture(autouse=True)
+def quiet_profiler():
+    """テスト中は profiler の逐次出力を止める"""
+    from profiler import profiler
+    debug = profiler.debug
+    profiler.debug = False
+    yield
+    profiler.debug = debug
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if _recorder is not None and _recorder.update and _recorder.measured:
+        _recorder.save()
+        print(f"\nベースラインを更新しました: {BASELINE_FILE}")
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+テスト用の合成データ。
+
+カメラ・モデルファイル・GPUなしで推論後処理を動かせるよう、決定的な合成フレームと
+ultralytics の Results を模した出力 (boxes.xyxy / boxes.conf / keypoints.data) を作る。
+"""
+import numpy as np
+
+
+def synthetic_frame(seed: int = 0, shape=(480, 640, 3)) -> np.ndarray:
+    """乱数のシードを固定した合成フレーム (なめらかな背景 + ノイズ + 人物に見立てた矩形)"""
+    rng = np.random.default_rng(seed)
+    h, w = shape[:2]
+    gradient = np.linspace(60, 180, w, dtype=np.float32)[None, :, None]
+    frame = np.broadcast_to(gradient, shape).astype(np.float32)
+    frame = frame + rng.normal(0, 6, shape).astype(np.float32)
+    x = int(rng.integers(80, w - 200))
+    frame[h // 4: h // 4 + 260, x: x + 120] = (40, 160, 220)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def make_pose(cx: float, cy: float, scale: float = 40.0, circle: bool = True) -> np.ndarray:
+    """
+    1人分のキーポイント (17, 3) を作る。cyは肩の高さ。
+    circle=True なら丸ジェスチャー (手首・肘が肩より上で手首同士が近い)、Falseなら腕を下ろした姿勢。
+    """
+    kpts = np.zeros((17, 3), dtype=np.float32)
+    kpts[:, 2] = 0.9
+    kpts[0] = (cx, cy - 1.5 * scale, 0.9) # 鼻
+    kpts[5] = (cx + scale, cy, 0.9)       # 左肩
+    kpts[6] = (cx - scale, cy, 0.9)       # 右肩
+    if circle:
+        kpts[7] = (cx + 1.3 * scale, cy - scale, 0.9)
+        kpts[8] = (cx - 1.3 * scale, cy - scale, 0.9)
+        kpts[9] = (cx + 0.3 * scale, cy - 2.2 * scale, 0.9)
+        kpts[10] = (cx - 0.3 * scale, cy - 2.2 * scale, 0.9)
+    else:
+        kpts[7] = (cx + 1.2 * scale, cy + scale, 0.9)
+        kpts[8] = (cx - 1.2 * scale, cy + scale, 0.9)
+        kpts[9] = (cx + 1.2 * scale, cy + 2 * scale, 0.9)
+        kpts[10] = (cx - 1.2 * scale, cy + 2 * scale, 0.9)
+    for i in range(11, 17): # 腰・膝・足首
+        side = 1 if i % 2 else -1
+        kpts[i] = (cx + side * 0.6 * scale, cy + (i - 9) // 2 * 1.5 * scale, 0.9)
+    return kpts
+
+
+class FakeTensor:
+    """torch.Tensor の代わり。.cpu().numpy() で配列を返す"""
+    def __init__(self, array):
+        self._array = np.asarray(array, dtype=np.float32)
+
+    @property
+    def shape(self):
+        return self._array.shape
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._array
+
+
+class FakeBoxes:
+    def __init__(self, xyxy, conf):
+        self.xyxy = FakeTensor(xyxy)
+        self.conf = FakeTensor(conf)
+
+    def __len__(self):
+        return self.xyxy.shape[0]
+
+
+class FakeKeypoints:
+    def __init__(self, data):
+        self.data = FakeTensor(data)
+
+
+class FakeResults:
+    def __init__(self, boxes, scores, keypoints=None):
+        self.boxes = FakeBoxes(boxes, scores)
+        self.keypoints = FakeKeypoints(keypoints) if keypoints is not None else None
+
+
+class FakeModel:
+    """YOLO モデルの代わりに、毎回同じ Results を返す"""
+
+    def __init__(self, results: FakeResults):
+        self.results = results
+        self.calls = 0
+
+    def __call__(self, frame, **kwargs):
+        self.calls += 1
+        return [self.results]
+
+
+def pose_results(people: int = 4) -> FakeResults:
+    """people人分の姿勢推定結果 (偶数番目の人が丸ジェスチャー)"""
+    kpts = np.stack([make_pose(100 + i * 140, 260, circle=(i % 2 == 0)) for i in range(people)])
+    boxes = np.stack([[k[:, 0].min() - 10, k[:, 1].min() - 10, k[:, 0].max() + 10, k[:, 1].max() + 10]
+                      for k in kpts])
+    return FakeResults(boxes, np.full(people, 0.9), kpts)
+
+
+def detect_results(people: int = 4, width: int = 640) -> FakeResults:
+    """people人分の人物検出結果 (左端・右端に1人ずつ、残りは中央付近)"""
+    boxes = []
+    for i in range(people):
+        if i == 0:
+            boxes.append([10, 100, 120, 460])
+        elif i == 1:
+            boxes.append([width - 120, 100, width - 5, 460])
+        else:
+            x = 150 + (i - 2) * 90
+            boxes.append([x, 120, x + 80, 450])
+    return FakeResults(np.array(boxes, dtype=np.float32), np.full(people, 0.8))
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""ONNXバックエンドの前処理 (レターボックス) と後処理 (生出力のデコード)"""
+import numpy as np
+
+from backends import decode, letterbox, preprocess
+from fakes import make_pose, synthetic_frame
+
+
+def raw_output(anchors, num_classes, num_keypoints=0):
+    """(cx, cy, w, h, クラススコア, キーポイント) のリストを YOLO11 の生出力 (チャンネル数, アンカー数) にする"""
+    rows = []
+    for cx, cy, w, h, scores, kpts in anchors:
+        row = np.zeros(4 + num_classes + num_keypoints * 3, dtype=np.float32)
+        row[:4] = (cx, cy, w, h)
+        row[4:4 + num_classes] = scores
+        if num_keypoints:
+            row[4 + num_classes:] = kpts.reshape(-1)
+        rows.append(row)
+    return np.stack(rows).T
+
+
+def test_letterbox_geometry():
+    frame = synthetic_frame() # 480x640
+    image, scale, pad = letterbox(frame, 320)
+    assert image.shape == (320, 320, 3)
+    assert scale == 0.5 and pad == (0, 40)
+    assert (image[:40] == 114).all() and (image[-40:] == 114).all()
+    blob, _, _ = preprocess(frame, 320)
+    assert blob.shape == (1, 3, 320, 320) and blob.dtype == np.float32
+    assert np.allclose(blob[0, :, 100, 100], image[100, 100, ::-1] / 255.0)
+
+
+def test_decode_pose_restores_frame_coordinates():
+    scale, pad = 0.5, (0, 40) # 640x480 のフレームを 320 に入れた場合
+    kpts = make_pose(300, 260, circle=True)
+    model_kpts = kpts.copy()
+    model_kpts[:, :2] = kpts[:, :2] * scale + pad
+    box = np.array([200, 100, 400, 460], dtype=np.float32)
+    cx, cy = (box[:2] + box[2:]) / 2 * scale + pad
+    w, h = (box[2:] - box[:2]) * scale
+    output = raw_output([
+        (cx, cy, w, h, [0.9], model_kpts),
+        (cx + 1, cy + 1, w, h, [0.8], model_kpts), # 重複 (NMSで消える)
+        (50, 50, 20, 20, [0.1], model_kpts),       # 信頼度が低い
+    ], num_classes=1, num_keypoints=17)
+
+    result = decode(output, scale, pad, (480, 640), num_keypoints=17, seq=4)
+    assert len(result) == 1 and result.seq == 4
+    assert np.allclose(result.boxes[0], box, atol=1e-3)
+    assert np.allclose(result.keypoints[0], kpts, atol=1e-3)
+    assert np.isclose(result.scores[0], 0.9)
+
+
+def test_decode_detect_filters_classes():
+    scores_person = np.zeros(80, dtype=np.float32)
+    scores_person[0] = 0.8
+    scores_car = np.zeros(80, dtype=np.float32)
+    scores_car[2] = 0.9
+    output = raw_output([(100, 100, 50, 100, scores_person, None), (102, 100, 50, 100, scores_car, None)], 80)
+
+    assert len(decode(output, 1.0, (0, 0), (480, 640))) == 2 # 別クラスなので重なっていても残る
+    people = decode(output, 1.0, (0, 0), (480, 640), classes=[0])
+    assert len(people) == 1 and people.keypoints is None
+    assert np.allclose(people.boxes[0], [75, 50, 125, 150])
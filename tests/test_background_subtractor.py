@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""統計的背景差分: 画面の一部だけの照明の変化は時間をかけて背景に戻り、立ち止まった人はすぐには溶けない"""
+import cv2
+import numpy as np
+
+from background_subtractor import StatisticalBackgroundSubtractor
+from fakes import synthetic_frame
+
+
+def foreground_ratio(subtractor, frame):
+    return (subtractor.get_foreground_mask(frame) > 0).mean()
+
+
+def test_partial_illumination_change_is_absorbed():
+    background = synthetic_frame(seed=10)
+    subtractor = StatisticalBackgroundSubtractor()
+    subtractor.initialize_background(background)
+    # 左側 40% だけ明るくなる (片側からの日差し)。中央値は動かないので rebase されない
+    lit = background.astype(np.int16)
+    lit[:, :256] += 40
+    lit = np.clip(lit, 0, 255).astype(np.uint8)
+
+    assert foreground_ratio(subtractor, lit) > 0.35
+    for _ in range(200):
+        ratio = foreground_ratio(subtractor, lit)
+    assert subtractor.rebases == 0
+    assert ratio < 0.01
+
+
+def test_standing_person_is_not_absorbed_quickly():
+    background = synthetic_frame(seed=10)
+    subtractor = StatisticalBackgroundSubtractor()
+    subtractor.initialize_background(background)
+    person = background.copy()
+    cv2.rectangle(person, (250, 100), (400, 460), (30, 30, 160), -1)
+
+    first = foreground_ratio(subtractor, person)
+    for _ in range(200):
+        ratio = foreground_ratio(subtractor, person)
+    assert ratio > first * 0.5
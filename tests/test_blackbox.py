@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""ブラックボックスのリングファイルの書き込み・読み出し"""
+import numpy as np
+import pytest
+
+from blackbox import BlackBoxReader, BlackBoxRecorder, SOURCE_GESTURE, frame_durations, state_fps
+from main import Config, PhotoBoothApp
+from perception import PerceptionResult
+from fakes import synthetic_frame
+
+
+def test_ring_wraps_in_order_and_survives_reopen(tmp_path):
+    path = str(tmp_path / "box.ring")
+    recorder = BlackBoxRecorder(path, seconds=2, fps=2, size=(32, 24)) # 容量4
+    frame = synthetic_frame()
+    result = PerceptionResult(np.array([[64, 48, 320, 480]], dtype=np.float32), seq=3)
+    result.gesture_flags[:] = True
+    for seq in range(6):
+        recorder.record(frame, seq, 100.0 + seq, state=2, result=result, source=SOURCE_GESTURE, frame_ms=1.5)
+    recorder.close()
+
+    events = BlackBoxReader(path).timeline({2: "READY"})
+    assert [e["seq"] for e in events] == [2, 3, 4, 5]
+    assert events[0]["state"] == "READY" and events[0]["source"] == "gesture"
+    assert events[0]["boxes"] == [[0.1, 0.1, 0.5, 1.0]]
+    assert events[0]["gesture_flags"] == [True]
+
+    # 同じ構成で開き直すと続きから書く
+    recorder = BlackBoxRecorder(path, seconds=2, fps=2, size=(32, 24))
+    recorder.record(frame, 6, 106.0, state=1)
+    assert [e["seq"] for e in BlackBoxReader(path).timeline()] == [3, 4, 5, 6]
+
+
+def test_capacity_and_playback_follow_the_capture_fps():
+    # 撮影前後は15FPSになるので、容量は最も高いFPSで決める
+    assert PhotoBoothApp(Config(METRICS_PORT=0))._max_capture_fps() == 15.0
+    assert PhotoBoothApp(Config(METRICS_PORT=0, STATE_CAPTURE_PROFILES=False))._max_capture_fps() == 5.0
+
+    # READY (5FPS) -> TAKE_PICTURE (15FPS) の記録。間隔は固定のFPSではなく記録時刻から求める
+    timestamps = [0.0, 0.2, 0.4, 0.6, 0.6 + 1 / 15, 0.6 + 2 / 15, 30.0]
+    states = ["READY"] * 4 + ["TAKE_PICTURE"] * 3
+    timeline = [{"timestamp": t, "state": s} for t, s in zip(timestamps, states)]
+    durations = frame_durations(timestamps, fps=15)
+    assert np.allclose(durations[:5], [0.2, 0.2, 0.2, 1 / 15, 1 / 15])
+    assert durations[5] == 1.0 # 記録が途切れた間隔は切り詰める
+    assert durations[6] == pytest.approx(1 / 15)
+    fps = state_fps(timeline)
+    assert fps["READY"] == pytest.approx(5.0)
+    assert fps["TAKE_PICTURE"] == pytest.approx(15.0)
+
+
+@pytest.mark.perf
+def test_record_perf(perf, tmp_path):
+    recorder = BlackBoxRecorder(str(tmp_path / "box.ring"), seconds=10, fps=5)
+    frame = synthetic_frame()
+    result = PerceptionResult(np.array([[64, 48, 320, 480], [400, 40, 600, 470]], dtype=np.float32), seq=1)
+    perf("blackbox_record", lambda: recorder.record(frame, 1, 0.0, 2, result, SOURCE_GESTURE, 5.0))
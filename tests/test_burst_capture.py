@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""連写: シャッター前後のフレームの収集、ブレたフレームを避けた選定、バッファの使い回し"""
+import cv2
+import numpy as np
+
+from burst_capture import BurstCapture, score_frame
+from detect_circle_gesture import _judge
+from main import Config
+from perception import PerceptionResult
+
+SHAPE = (120, 160, 3)
+
+
+def textured(blur: int = 0):
+    rng = np.random.default_rng(0)
+    # JPEGで保存しても見分けがつくように、8pxのブロック模様にする
+    blocks = rng.integers(0, 256, (SHAPE[0] // 8, SHAPE[1] // 8, 3), dtype=np.uint8)
+    frame = cv2.resize(blocks, (SHAPE[1], SHAPE[0]), interpolation=cv2.INTER_NEAREST)
+    if blur:
+        frame = cv2.GaussianBlur(frame, (0, 0), blur)
+    return frame
+
+
+def person(face: bool = True):
+    """姿勢推定 (detect_circle_gesture) と同じ形の結果。edge_flags は設定されない"""
+    keypoints = np.zeros((1, 17, 3), dtype=np.float32)
+    keypoints[0, :3] = [[80, 40, 0.9 if face else 0.1], [85, 35, 0.9], [75, 35, 0.9]]
+    return _judge(PerceptionResult(np.array([[40, 10, 120, 115]], dtype=np.float32), keypoints))
+
+
+def test_score_prefers_sharp_visible_subjects_away_from_edge():
+    sharp, blurred = textured(), textured(blur=3)
+    margin = 20 # 幅160の画面で、bbox (x 40-120) は端から離れている
+    assert score_frame(sharp, person(), margin) > score_frame(blurred, person(), margin)
+    assert score_frame(sharp, person(), margin) > score_frame(sharp, person(face=False), margin)
+    assert score_frame(sharp, None, margin) > 0
+
+
+def test_edge_penalty_uses_boxes_of_pose_results():
+    sharp = textured()
+    result = person()
+    assert not result.is_at_edge # 姿勢推定の結果は端の判定を持たない
+    # 同じ結果でも、端とみなす幅に bbox が入れば減点する
+    assert score_frame(sharp, result, margin=50) < score_frame(sharp, result, margin=20)
+
+
+def test_burst_keeps_frames_around_shutter_and_saves_the_sharpest(tmp_path):
+    burst = BurstCapture(SHAPE, frames=5, before=2, out_dir=str(tmp_path))
+    burst.arm(person())
+    # カウントダウン中 (ブレている)。シャッター前は直近3枚 (before + シャッターのフレーム) だけ残る
+    for blur in (4, 4, 4, 3, 3):
+        burst.add(textured(blur))
+    burst.add(textured(2))
+    burst.shutter()
+    assert burst.pool.available == 10 - 3
+    burst.add(textured())    # シャッター直後、ぶれが収まった
+    burst.add(textured(1))
+    assert not burst.collecting
+    burst.add(textured())    # 揃った後のフレームは使わない
+
+    path = burst.wait()
+    assert path is not None and path.startswith(str(tmp_path))
+    saved = cv2.imread(path).astype(np.int16)
+    diff = {blur: np.abs(saved - textured(blur)).mean() for blur in (0, 1, 2)}
+    assert min(diff, key=diff.get) == 0 # ぶれていないフレームが選ばれる
+    assert burst.last_elapsed < Config.COOLDOWN_DURATION_SEC
+    assert burst.pool.available == 10
+    burst.close()
+
+
+def test_disarm_returns_buffers():
+    burst = BurstCapture(SHAPE, frames=3, before=1)
+    burst.arm()
+    burst.add(textured())
+    burst.add(textured())
+    burst.disarm()
+    burst.add(textured())
+    assert burst.pool.available == 6
+    assert not burst.busy
+    burst.close()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""状態ごとのキャプチャ設定の検証・切り替えと、実FPSでのタイマー換算"""
+import cv2
+import numpy as np
+
+from capture_profiles import CaptureProfile, CaptureProfileSwitcher
+from main import AppState, Config, PhotoBoothApp
+
+
+class FakeCapture:
+    """set() を記録し、max_fps と対応解像度に丸めて配信するカメラ"""
+    def __init__(self, sizes=((640, 480),), max_fps=30):
+        self.sizes = sizes
+        self.max_fps = max_fps
+        self.props = {cv2.CAP_PROP_FRAME_WIDTH: 640, cv2.CAP_PROP_FRAME_HEIGHT: 480, cv2.CAP_PROP_FPS: 5}
+        self.calls = []
+
+    def set(self, prop, value):
+        self.calls.append(prop)
+        if prop == cv2.CAP_PROP_FPS:
+            value = min(value, self.max_fps)
+        self.props[prop] = value
+        return True
+
+    def get(self, prop):
+        if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+            size = (self.props[cv2.CAP_PROP_FRAME_WIDTH], self.props[cv2.CAP_PROP_FRAME_HEIGHT])
+            if size not in self.sizes:
+                size = self.sizes[0]
+            return size[0] if prop == cv2.CAP_PROP_FRAME_WIDTH else size[1]
+        return self.props.get(prop, 0)
+
+    def read(self):
+        return True, np.zeros((int(self.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(self.get(cv2.CAP_PROP_FRAME_WIDTH)), 3),
+                              dtype=np.uint8)
+
+
+BASE = CaptureProfile(640, 480, 5, 80)
+PROFILES = {"READY": CaptureProfile(640, 480, 5), "TAKE_PICTURE": CaptureProfile(640, 480, 30),
+            "RESULT": CaptureProfile(1280, 720, 5)}
+
+
+def test_validation_is_cached_and_falls_back(tmp_path):
+    cache = str(tmp_path / "profiles.json")
+    cap = FakeCapture(max_fps=15)
+    switcher = CaptureProfileSwitcher(cap, "cam", BASE, PROFILES, cache_path=cache)
+    switcher.validate_all()
+
+    # 30FPSは出ないので実FPS (15) でタイマーを換算し、対応していない解像度は base を使う
+    assert switcher.fps_of(switcher.profile_for("TAKE_PICTURE")) == 15.0
+    assert switcher.profile_for("RESULT") == BASE
+    assert switcher.current == BASE
+
+    cap.calls.clear()
+    CaptureProfileSwitcher(cap, "cam", BASE, PROFILES, cache_path=cache).validate_all()
+    assert cap.calls == [] # 2回目はキャッシュを使う
+
+
+def test_switch_sets_only_changed_properties(tmp_path):
+    cap = FakeCapture()
+    switcher = CaptureProfileSwitcher(cap, "cam", BASE, PROFILES, cache_path=str(tmp_path / "p.json"))
+    assert not switcher.switch(switcher.profile_for("READY")) # base と同じ (露出は base のまま)
+    assert cap.calls == []
+    switcher.switch(switcher.profile_for("TAKE_PICTURE"))
+    assert cap.calls == [cv2.CAP_PROP_FPS]
+    assert len(switcher.switch_times) == 1
+
+
+def test_timers_follow_active_fps(tmp_path):
+    app = PhotoBoothApp(Config(METRICS_PORT=0, GOVERNOR_ENABLED=False))
+    app.capture_switcher = CaptureProfileSwitcher(FakeCapture(), "cam", BASE, PROFILES,
+                                                  cache_path=str(tmp_path / "p.json"))
+    app._transition_to(AppState.TAKE_PICTURE)
+    assert app.active_fps == 30.0
+    assert app._frames(app.config.TAKE_PICTURE_TIMEOUT_SEC) == 900
+    # FPSを上げても1秒あたりの推論回数は変わらない (5FPSで5フレームに1回 -> 30FPSで30フレームに1回)
+    assert app._inference_interval() == 30
+    app._apply_capture_profile()
+    assert app.capture_switcher.current.fps == 30
+
+
+class FakeYuyvCapture(FakeCapture):
+    """CAP_PROP_CONVERT_RGB=0 なら現在の解像度の生YUYV (H, W, 2) を返すカメラ"""
+    def isOpened(self):
+        return True
+
+    def read(self):
+        ret, frame = super().read()
+        if self.props.get(cv2.CAP_PROP_CONVERT_RGB, 1) == 0:
+            return ret, np.zeros(frame.shape[:2] + (2,), dtype=np.uint8)
+        return ret, frame
+
+
+def test_reconnect_rebuilds_yuyv_capture_for_the_state_resolution(tmp_path, monkeypatch):
+    import main
+    cap = FakeYuyvCapture(sizes=((640, 480), (1280, 720)))
+    monkeypatch.setattr(main.cv2, "VideoCapture", lambda index: cap)
+    app = PhotoBoothApp(Config(METRICS_PORT=0, GOVERNOR_ENABLED=False, RAW_YUYV_CAPTURE=True))
+    app.capture_switcher = CaptureProfileSwitcher(cap, "cam", BASE, PROFILES, cache_path=str(tmp_path / "p.json"))
+    app.state = AppState.RESULT
+
+    # 再接続後は base (640x480) から RESULT の 1280x720 に切り替わるので、生YUYVのバッファも合わせる
+    assert app._reopen_camera()
+    assert app.capture_switcher.current.width == 1280
+    assert (app.yuyv_capture.width, app.yuyv_capture.height) == (1280, 720)
+    ret, frame = app.read_latest(app.cap)
+    assert ret and frame.shape == (720, 1280, 3)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""カメラ読み込みの監視: 切断の判定、指数バックオフでの再接続、切断時間の記録"""
+import numpy as np
+
+import metrics
+from capture_supervisor import CaptureSupervisor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyCamera:
+    """plugged が False の間は読み込みに失敗し、開き直しも失敗するカメラ"""
+    def __init__(self):
+        self.plugged = True
+        self.reads = 0
+        self.reopens = 0
+
+    def read(self):
+        self.reads += 1
+        return (True, np.zeros((4, 4, 3), dtype=np.uint8)) if self.plugged else (False, None)
+
+    def reopen(self):
+        self.reopens += 1
+        return self.plugged
+
+
+def make(clock, camera):
+    return CaptureSupervisor(camera.read, camera.reopen, max_failures=3, frame_timeout_sec=10.0,
+                             backoff_initial_sec=1.0, backoff_max_sec=4.0, clock=clock)
+
+
+def test_outage_backs_off_without_touching_the_camera():
+    clock, camera = FakeClock(), FlakyCamera()
+    supervisor = make(clock, camera)
+    assert supervisor.read()[0]
+
+    camera.plugged = False
+    for _ in range(3):
+        clock.now += 0.1
+        assert not supervisor.read()[0]
+    assert not supervisor.connected
+    reads = camera.reads
+
+    # 再接続の時刻までは読み込みも開き直しもしない
+    for _ in range(50):
+        assert supervisor.read() == (False, None)
+    assert (camera.reads, camera.reopens) == (reads, 0)
+    assert 0.0 < supervisor.wait_hint() <= 0.1
+
+    # 開き直しに失敗するたびに待ち時間が倍になる (上限あり)
+    waits = []
+    for _ in range(4):
+        clock.now = supervisor.next_attempt
+        supervisor.read()
+        waits.append(supervisor.backoff)
+    assert waits == [2.0, 4.0, 4.0, 4.0]
+    assert camera.reopens == 4
+
+
+def test_reconnect_records_outage_from_last_frame():
+    clock, camera = FakeClock(), FlakyCamera()
+    supervisor = make(clock, camera)
+    supervisor.read()
+    before = metrics.capture_outage_seconds.labels(None).count
+
+    camera.plugged = False
+    clock.now = 1.0
+    for _ in range(3):
+        supervisor.read()
+    camera.plugged = True
+    clock.now = supervisor.next_attempt
+    assert supervisor.read()[0]
+    assert supervisor.connected
+    assert supervisor.outages == [2.0] # 最後のフレーム (t=0) から再接続 (t=2) まで
+    assert metrics.capture_outage_seconds.labels(None).count == before + 1
+
+
+def test_placeholder_is_drawn_once_per_size():
+    supervisor = make(FakeClock(), FlakyCamera())
+    frame = supervisor.placeholder(320, 240)
+    assert frame.shape == (240, 320, 3)
+    assert supervisor.placeholder(320, 240) is frame
+    assert supervisor.placeholder(640, 480) is not frame
+
+
+def test_read_that_returns_late_triggers_a_reopen():
+    clock, camera = FakeClock(), FlakyCamera()
+    supervisor = make(clock, camera)
+    supervisor.read()
+
+    def hanging_read():
+        clock.now += 12.0 # frame_timeout_sec (10秒) より長く戻らなかった
+        return camera.read()
+    supervisor._read = hanging_read
+    assert supervisor.read()[0] # 届いたフレームは使う
+    assert not supervisor.connected
+
+    supervisor._read = camera.read
+    clock.now = supervisor.next_attempt
+    assert supervisor.read()[0]
+    assert camera.reopens == 1 and supervisor.connected
+    assert supervisor.outages == [13.0] # 固まる前の最後のフレーム (t=0) から再接続まで
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""GestureCascade の段ごとの通過判定と統計"""
+import numpy as np
+
+from cascade import GestureCascade
+from perception import PerceptionResult
+from fakes import synthetic_frame
+
+
+class Recorder:
+    """呼び出しを記録し、指定した結果を返す検出関数"""
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def __call__(self, frame, seq=-1, imgsz=None):
+        self.calls.append(imgsz)
+        return self.result
+
+
+def presence(*boxes):
+    return PerceptionResult(np.array(boxes, dtype=np.float32).reshape(-1, 4))
+
+
+def test_rejects_empty_and_implausible_people():
+    frame = synthetic_frame()
+    pose = Recorder(presence([100, 100, 200, 400]))
+    # 小さすぎる人物 (遠い) と、上端が画面下部にある人物 (頭と腕が画面外)
+    stage1 = Recorder(presence([10, 10, 40, 60], [300, 400, 400, 480]))
+    cascade = GestureCascade(stage1, pose, stage1_imgsz=192)
+
+    result = cascade(frame, seq=5)
+    assert len(result) == 0 and result.seq == 5
+    assert stage1.calls == [192]
+    assert pose.calls == []
+
+    stage1.result = presence()
+    cascade(frame)
+    assert pose.calls == []
+    assert cascade.stats()["stage1_pass_rate"] == 0.0
+
+
+def test_runs_pose_when_plausible_and_holds():
+    frame = synthetic_frame()
+    pose = Recorder(presence([100, 100, 200, 400]))
+    stage1 = Recorder(presence([100, 80, 220, 470]))
+    cascade = GestureCascade(stage1, pose, hold_calls=2)
+
+    assert len(cascade(frame, imgsz=320)) == 1
+    assert pose.calls == [320]
+    # 姿勢推定で人が見えている間は1段目を省略する
+    cascade(frame)
+    cascade(frame)
+    assert len(stage1.calls) == 1
+    # いなくなったら、保持回数を使い切った後に1段目へ戻る
+    pose.result = presence()
+    cascade(frame)
+    cascade(frame)
+    assert len(stage1.calls) == 2
+
+    stats = cascade.stats()
+    assert stats["calls"] == 5
+    assert stats["stage2_rate"] == 1.0
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""距離制御: 余白の追跡、PIDの anti-windup、シミュレーションでの収束と測定->指令の遅れの記録"""
+import numpy as np
+
+import metrics
+from distance_control import (PID, DistanceController, MarginTracker, SimulatedActuator, SimulatedPlant,
+                              measure_margin, simulate)
+from perception import PerceptionResult
+
+
+def test_measure_margin_uses_the_tighter_side_of_the_group():
+    result = PerceptionResult(np.array([[40, 0, 200, 400], [300, 0, 560, 400]], dtype=np.float32))
+    assert measure_margin(result, 640) == 40.0
+    assert measure_margin(PerceptionResult(), 640) is None
+
+
+def test_tracker_ignores_repeated_results_and_expires():
+    tracker = MarginTracker(max_extrapolation_sec=0.5, max_age_sec=2.0)
+    tracker.update(100.0, 0.0, seq=1)
+    tracker.update(110.0, 1.0, seq=2)
+    position = tracker.position
+    tracker.update(200.0, 1.0, seq=2) # キャッシュから返った同じ結果
+    assert tracker.position == position
+
+    near, measured_at = tracker.estimate(1.2)
+    capped, _ = tracker.estimate(2.5)
+    assert measured_at == 1.0
+    assert capped == tracker.position + tracker.velocity * 0.5 # 外挿は max_extrapolation_sec まで
+    assert near != capped
+    assert tracker.estimate(3.5) == (None, None)
+
+
+def test_pid_does_not_wind_up_while_saturated():
+    pid = PID(kp=0.01, ki=0.01, output_limit=0.3, integral_limit=0.3)
+    for _ in range(200):
+        assert pid.update(100.0, 0.0, 0.05) == 0.3
+    assert pid.saturated
+    assert pid.integral == 0.0 # 飽和している間は積分しない
+    # 誤差の符号が変わったら、溜まった積分に引きずられずにすぐ逆向きの指令になる
+    assert pid.update(-10.0, 110.0, 0.05) < 0
+
+
+def test_simulated_loop_settles_within_tolerance_without_overshoot():
+    trace = simulate(seconds=15.0, start_distance_m=0.8, target_margin=100.0)
+    margins = np.array([margin for _, margin, _ in trace])
+    assert margins[0] < 0 # 近すぎて画面からはみ出した状態から始める
+    assert abs(margins[-1] - 100.0) <= 20.0
+    assert margins.max() <= 120.0
+    assert trace[-1][2] == 0.0 # 不感帯に入ったら止まる
+
+
+def test_controller_records_measurement_age_and_stops_when_lost():
+    plant = SimulatedPlant(distance_m=0.8)
+    controller = DistanceController(SimulatedActuator(plant), clock=lambda: 0.0)
+    before = metrics.control_latency_seconds.labels(None).count
+
+    assert controller.step(0.0) == 0.0 # engage 前は何もしない
+    controller.engage()
+    box = np.array([[10.0, 0.0, 630.0, 480.0]], dtype=np.float32)
+    controller.observe(PerceptionResult(box, seq=0, timestamp=1.0), 640)
+    assert controller.step(1.25) > 0 # 余白が足りない -> 後退
+    assert controller.status.latency_sec == 0.25
+    assert metrics.control_latency_seconds.labels(None).count == before + 1
+
+    assert controller.step(10.0) == 0.0 # 測定が古すぎる -> 停止
+    controller.disengage()
+    assert plant.target_velocity == 0.0
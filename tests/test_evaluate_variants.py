@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""量子化バリアントの精度: 一度もジェスチャーを検出しないバリアントが下限を満たさないこと"""
+from evaluate_variants import accuracy_of
+
+
+def test_never_firing_variant_fails_the_floor():
+    # 100フレーム中、基準でジェスチャーありは5フレーム。単純な一致率なら 0.95 になる
+    reference = [i < 5 for i in range(100)]
+    silent = [False] * 100
+    scores = accuracy_of(silent, reference, "pose")
+    assert scores["agreement"] == 0.95
+    assert scores["recall"] == 0.0
+    assert scores["accuracy"] == 0.5
+
+    one_miss = [i < 4 for i in range(100)]
+    assert accuracy_of(one_miss, reference, "pose")["accuracy"] == 0.9
+
+
+def test_pose_without_positive_frames_is_not_validated():
+    assert accuracy_of([False] * 10, [False] * 10, "pose")["accuracy"] == 0.0
+
+
+def test_detect_uses_count_and_edge_decisions():
+    reference = [(1, False)] * 8 + [(2, True)] * 2
+    decisions = [(1, False)] * 8 + [(2, False)] * 2 # 端にいる人を見逃す
+    scores = accuracy_of(decisions, reference, "detect")
+    assert scores["count_agreement"] == 1.0
+    assert scores["accuracy"] == 0.5
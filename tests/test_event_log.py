@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""イベントログ (間引き・リング満杯時の破棄・ファイルのローテーション) のテスト"""
+import json
+
+from event_log import EventLogger
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records_are_written_as_json_lines(tmp_path):
+    path = tmp_path / "logs" / "events.jsonl"
+    logger = EventLogger(echo=False)
+    logger.start(str(path))
+    logger.log("phase_change", "READY -> ADJUST", src="READY", dst="ADJUST")
+    logger.log("capture", "パシャッ！", count=1)
+    logger.close()
+
+    records = read_records(path)
+    assert [r["event"] for r in records] == ["phase_change", "capture"]
+    assert records[0]["dst"] == "ADJUST"
+    assert records[1]["msg"] == "パシャッ！"
+    assert records[1]["level"] == "info"
+
+
+def test_repeated_events_are_suppressed_and_counted(tmp_path):
+    clock = FakeClock()
+    logger = EventLogger(rate_limit_sec=1.0, echo=False, clock=clock)
+    assert logger.log("read_failure", "失敗")
+    for _ in range(5):
+        clock.now += 0.1
+        assert not logger.log("read_failure", "失敗")
+    assert logger.log("read_failure", "別のメッセージ") # キーが違えば間引かない
+    clock.now += 1.0
+    assert logger.log("read_failure", "失敗")
+    logger.start(str(tmp_path / "events.jsonl"))
+    logger.close()
+
+    records = read_records(tmp_path / "events.jsonl")
+    assert len(records) == 3
+    assert "suppressed" not in records[0]
+    assert records[2]["suppressed"] == 5
+    assert logger.suppressed == 5
+
+
+def test_full_ring_drops_instead_of_blocking(tmp_path):
+    logger = EventLogger(capacity=4, rate_limit_sec=0, echo=False)
+    accepted = [logger.log("profile", stage=i) for i in range(10)]
+    assert accepted == [True] * 4 + [False] * 6
+    assert logger.dropped == 6
+
+    logger.start(str(tmp_path / "events.jsonl"))
+    logger.close()
+    records = read_records(tmp_path / "events.jsonl")
+    assert [r["stage"] for r in records[:4]] == [0, 1, 2, 3]
+    assert records[-1]["event"] == "log_dropped"
+    assert records[-1]["dropped"] == 6
+
+
+def test_file_is_rotated(tmp_path):
+    path = tmp_path / "events.jsonl"
+    logger = EventLogger(rate_limit_sec=0, max_bytes=200, backups=2, echo=False)
+    for i in range(12):
+        logger.log("profile", "x" * 40, i=i)
+        if i % 4 == 3:
+            # 4件ずつ書き出す (毎回 max_bytes を超えるのでローテーションする)
+            logger.start(str(path))
+            logger.close()
+
+    assert (tmp_path / "events.jsonl.1").exists()
+    assert (tmp_path / "events.jsonl.2").exists()
+    assert not (tmp_path / "events.jsonl.3").exists()
+    assert read_records(path) == []
+    assert [r["i"] for r in read_records(tmp_path / "events.jsonl.1")] == [8, 9, 10, 11]
+    assert [r["i"] for r in read_records(tmp_path / "events.jsonl.2")] == [4, 5, 6, 7]
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""ジェスチャールールのDSLとベクトル化評価"""
+import math
+
+import numpy as np
+import pytest
+
+from gesture_rules import compile_gestures, parse_rule
+from fakes import make_pose
+
+
+def reference_circle(kpts) -> bool:
+    """ルールエンジン導入前の手書きの丸ジェスチャー判定"""
+    ls, rs, le, re_, lw, rw = (kpts[i] for i in (5, 6, 7, 8, 9, 10))
+    if min(ls[2], rs[2], le[2], re_[2], lw[2], rw[2]) < 0.5:
+        return False
+    wrists_above = lw[1] < le[1] and rw[1] < re_[1]
+    elbows_above = le[1] < ls[1] and re_[1] < rs[1]
+    wrist_dist = math.hypot(lw[0] - rw[0], lw[1] - rw[1])
+    shoulder_width = math.hypot(ls[0] - rs[0], ls[1] - rs[1])
+    return bool(wrists_above and elbows_above and wrist_dist < shoulder_width * 1.2)
+
+
+@pytest.fixture(scope="module")
+def gestures():
+    return compile_gestures()
+
+
+def test_circle_matches_reference(gestures):
+    rng = np.random.default_rng(0)
+    kpts = rng.uniform(0, 480, (3000, 17, 3)).astype(np.float32)
+    kpts[:, :, 2] = rng.uniform(0.3, 1.0, (3000, 17))
+    kpts = np.concatenate([kpts, np.stack([make_pose(300, 300, circle=c) for c in (True, False)])])
+
+    matches, scores = gestures.evaluate(kpts)
+    expected = np.array([reference_circle(k) for k in kpts])
+    circle = gestures.index("circle")
+    assert expected.sum() > 0
+    assert np.array_equal(matches[:, circle], expected)
+    assert matches.shape == scores.shape == (len(kpts), len(gestures.names))
+    assert ((scores >= 0) & (scores <= 1)).all()
+
+
+def test_multiple_gestures_in_one_pass(gestures):
+    hands_up = make_pose(320, 300, circle=False)
+    hands_up[9] = (420, 180, 0.9) # 左手首を頭より上、外側へ
+    hands_up[10] = (220, 180, 0.9)
+    point_left = make_pose(320, 300, circle=False)
+    point_left[8] = (250, 300, 0.9) # 右腕を肩の高さで画面左へ伸ばす
+    point_left[10] = (180, 305, 0.9)
+    low_conf = make_pose(320, 300, circle=True)
+    low_conf[9, 2] = 0.2
+
+    kpts = np.stack([make_pose(320, 300, circle=True), hands_up, point_left, low_conf])
+    matches, _ = gestures.evaluate(kpts)
+    names = gestures.names
+    assert [names[i] for i in np.flatnonzero(matches[0])] == ["circle"]
+    assert [names[i] for i in np.flatnonzero(matches[1])] == ["hands_up"]
+    assert [names[i] for i in np.flatnonzero(matches[2])] == ["point_left"]
+    assert not matches[3].any()
+
+
+def test_empty_input(gestures):
+    matches, scores = gestures.evaluate(np.zeros((0, 17, 3), dtype=np.float32))
+    assert matches.shape == scores.shape == (0, len(gestures.names))
+
+
+def test_parse_errors():
+    assert parse_rule("nose above l_hip by 0.5")[0] == "order"
+    assert parse_rule("dy(l_wrist, l_shoulder) < 0.5 * dist(l_shoulder, r_shoulder)")[0] == "metric"
+    with pytest.raises(ValueError):
+        parse_rule("l_thumb above nose")
+    with pytest.raises(ValueError):
+        parse_rule("l_wrist near r_wrist")
+
+
+@pytest.mark.perf
+def test_evaluate_perf(perf, gestures):
+    kpts = np.stack([make_pose(80 * i + 60, 300, circle=(i % 2 == 0)) for i in range(8)])
+    perf("gesture_rules_evaluate_8people", lambda: gestures.evaluate(kpts), number=200)
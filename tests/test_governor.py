@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""PerformanceGovernor のレベル遷移 (FakeSensorで温度・負荷を与える)"""
+import pytest
+
+import metrics
+from governor import LEVELS, FakeSensor, PerformanceGovernor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_governor(sensor, clock):
+    return PerformanceGovernor(sensor, sample_interval_sec=1.0, min_dwell_sec=5.0, clock=clock)
+
+
+def step(governor, clock, seconds=1.0):
+    clock.now += seconds
+    return governor.update()
+
+
+def test_steps_up_one_level_per_sample(clock):
+    sensor = FakeSensor(temp_c=85.0, cpu_percent=20.0)
+    governor = make_governor(sensor, clock)
+    names = [step(governor, clock).name for _ in range(4)]
+    assert names == ["warm", "hot", "critical", "critical"]
+    assert metrics.governor_level.value == len(LEVELS) - 1
+
+
+def test_does_not_sample_between_intervals(clock):
+    sensor = FakeSensor(temp_c=85.0)
+    governor = make_governor(sensor, clock)
+    assert step(governor, clock).name == "warm"
+    # 同じサンプリング間隔内の呼び出しではセンサーを読まない
+    assert step(governor, clock, 0.1).name == "warm"
+
+
+def test_cpu_load_alone_raises_level(clock):
+    governor = make_governor(FakeSensor(temp_c=None, cpu_percent=90.0), clock)
+    assert step(governor, clock).name == "warm"
+    assert step(governor, clock).name == "warm" # 92%未満なので hot には上がらない
+
+
+def test_hysteresis_and_recovery(clock):
+    sensor = FakeSensor(temp_c=73.0)
+    governor = make_governor(sensor, clock)
+    step(governor, clock)
+    assert step(governor, clock).name == "hot"
+
+    # hot の閾値 (72C) を少し下回っただけでは下がらない
+    sensor.set(temp_c=69.0)
+    for _ in range(10):
+        assert step(governor, clock).name == "hot"
+
+    # ヒステリシス分 (5C) 以上下がれば、滞在時間ごとに1段ずつ戻る
+    sensor.set(temp_c=55.0, cpu_percent=10.0)
+    assert step(governor, clock).name == "warm"
+    assert step(governor, clock).name == "warm" # 最短滞在時間内
+    assert step(governor, clock, 5.0).name == "normal"
+
+
+def test_level_changes_are_counted(clock):
+    before = metrics.governor_changes_total.labels("warm").value
+    governor = make_governor(FakeSensor(temp_c=66.0), clock)
+    step(governor, clock)
+    assert metrics.governor_changes_total.labels("warm").value == before + 1
+    assert metrics.temperature_celsius.value == 66.0
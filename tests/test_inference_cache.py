@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""推論結果キャッシュ: 同じシーンでは推論を省略し、TTL切れと局所的な動き (腕を上げる) では推論し直す"""
+import cv2
+import numpy as np
+
+import inference_cache
+from inference_cache import InferenceCache
+
+
+def person_frame(arms_up: bool, seed: int = 0) -> np.ndarray:
+    """640x480の合成シーン: 背景 + 立っている人。arms_up=True なら頭上で両腕の丸を作る"""
+    rng = np.random.default_rng(seed)
+    frame = np.full((480, 640, 3), 150, dtype=np.uint8)
+    frame = np.clip(frame + rng.normal(0, 4, frame.shape), 0, 255).astype(np.uint8)
+    cx = 320
+    cv2.rectangle(frame, (cx - 40, 200), (cx + 40, 400), (60, 60, 140), -1) # 胴体
+    cv2.circle(frame, (cx, 170), 25, (120, 150, 190), -1)                   # 頭
+    if arms_up:
+        cv2.ellipse(frame, (cx, 150), (70, 60), 0, 180, 360, (60, 60, 140), 18) # 頭上の丸
+        cv2.line(frame, (cx - 70, 150), (cx - 40, 210), (60, 60, 140), 18)
+        cv2.line(frame, (cx + 70, 150), (cx + 40, 210), (60, 60, 140), 18)
+    else:
+        cv2.line(frame, (cx - 45, 210), (cx - 55, 350), (60, 60, 140), 18)
+        cv2.line(frame, (cx + 45, 210), (cx + 55, 350), (60, 60, 140), 18)
+    return frame
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def counting_detector():
+    calls = []
+
+    def detect(frame):
+        calls.append(1)
+        return len(calls)
+    return detect, calls
+
+
+def test_hit_on_unchanged_scene(monkeypatch):
+    monkeypatch.setattr(inference_cache.time, "monotonic", Clock())
+    cache = InferenceCache("test_hit")
+    detect, calls = counting_detector()
+    first = cache.get_or_compute(person_frame(False, seed=1), detect, None)
+    # センサーノイズだけが違うフレームでは推論しない
+    assert cache.get_or_compute(person_frame(False, seed=2), detect, None) == first
+    assert len(calls) == 1
+
+
+def test_miss_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(inference_cache.time, "monotonic", clock)
+    cache = InferenceCache("test_ttl", ttl_sec=2.0)
+    detect, calls = counting_detector()
+    frame = person_frame(False)
+    cache.get_or_compute(frame, detect, None)
+    clock.now += 2.5
+    assert cache.get_or_compute(frame, detect, None) == 2
+
+
+def test_miss_on_localized_arm_raise(monkeypatch):
+    monkeypatch.setattr(inference_cache.time, "monotonic", Clock())
+    cache = InferenceCache("test_arms")
+    detect, calls = counting_detector()
+    down, up = person_frame(False), person_frame(True)
+    cache.get_or_compute(down, detect, None)
+    # 画面全体の平均の差は小さい (腕の部分だけが変わる) が、ブロックごとの最大の差で検出できる
+    signature = cache.signature(up)
+    assert cv2.norm(signature, cache._cached_signature, cv2.NORM_L1) / signature.size < 3.0
+    assert cache.get_or_compute(up, detect, None) == 2
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""遅延の計測: キャプチャ時刻の伝搬、キャッシュされた結果の古さ、画面フラッシュによる自己テスト"""
+import time
+
+import numpy as np
+
+from latency import FlashProbe, LatencyTracker
+from main import Config, PhotoBoothApp
+from perception import PerceptionResult
+from fakes import synthetic_frame
+
+
+def test_results_carry_capture_time_and_cached_overlay_ages():
+    app = PhotoBoothApp(Config(METRICS_PORT=0, GESTURE_CASCADE=False, GOVERNOR_ENABLED=False))
+    calls = []
+
+    def detector(frame, seq: int = -1, imgsz: int = None):
+        calls.append(seq)
+        return PerceptionResult(seq=seq)
+
+    app.gesture_detector = detector
+    frame = synthetic_frame(seed=1)
+    captured = time.monotonic() - 0.2
+    app.process_frame(frame, captured)
+    result = app.last_gesture_result
+    assert result.captured_at == captured
+    assert result.inference_started >= captured
+
+    # 同じシーンが続くとキャッシュが使われ、表示中の結果は最初のフレームのまま古くなっていく
+    for i in range(1, 6):
+        app.process_frame(frame, captured + i * 0.2)
+    assert calls == [0]
+    assert app.last_gesture_result is result
+    assert len(app.latency.samples["capture_to_inference"]) == 1
+
+    app.latency.on_display(app.frame_captured_at, app._displayed_result()[0], now=captured + 1.05)
+    assert np.isclose(app.latency.samples["overlay_age"][-1], 1.05)
+    assert np.isclose(app.latency.samples["frame_age"][-1], 0.05)
+
+
+class ScreenFacingCamera:
+    """表示した明るさを delay 秒遅れて写す (時計は1回読むごとに step 秒進む)"""
+    def __init__(self, delay: float, step: float = 0.01):
+        self.now = 0.0
+        self.delay = delay
+        self.step = step
+        self.changes = [(0.0, 0)]
+
+    def clock(self):
+        return self.now
+
+    def show(self, value):
+        self.changes.append((self.now, value))
+
+    def read(self):
+        self.now += self.step
+        visible = [value for t, value in self.changes if t <= self.now - self.delay]
+        value = visible[-1] if visible else 0
+        return True, np.full((4, 4, 3), value, dtype=np.uint8)
+
+
+def test_flash_probe_measures_screen_to_camera_delay():
+    camera = ScreenFacingCamera(delay=0.12)
+    tracker = LatencyTracker()
+    results = FlashProbe(camera.show, camera.read, camera.clock).run(trials=3, tracker=tracker)
+    assert len(results) == 3
+    assert all(0.12 <= r <= 0.14 for r in results)
+    assert len(tracker.samples["glass_to_glass"]) == 3
+
+
+def test_flash_probe_reports_when_screen_is_not_visible():
+    camera = ScreenFacingCamera(delay=10.0)
+    assert FlashProbe(camera.show, camera.read, camera.clock, settle_sec=0.1, timeout_sec=0.5).trial() is None
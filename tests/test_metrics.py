@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""メトリクス: Prometheus のテキスト形式、ラベルのエスケープ、累積ヒストグラム、profiler の公開、HTTPエンドポイント"""
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+from metrics import MetricsRegistry, MetricsServer
+from profiler import ProfileLogger
+
+
+def test_counter_and_gauge_text_format():
+    registry = MetricsRegistry()
+    photos = registry.counter("test_photos_total", "Photos taken.")
+    fps = registry.gauge("test_fps", "Frames per second.", "source")
+    photos.inc()
+    photos.inc(2)
+    fps.labels("loop").set(14.5)
+    fps.labels("camera").set(30)
+
+    assert registry.render().splitlines() == [
+        "# HELP test_photos_total Photos taken.",
+        "# TYPE test_photos_total counter",
+        "test_photos_total 3",
+        "# HELP test_fps Frames per second.",
+        "# TYPE test_fps gauge",
+        'test_fps{source="loop"} 14.5',
+        'test_fps{source="camera"} 30',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    family = registry.counter("test_events_total", "Events.", "event")
+    family.labels('say "hi"\\now\nnext').inc()
+    assert 'test_events_total{event="say \\"hi\\"\\\\now\\nnext"} 1' in registry.render().splitlines()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_seconds", "Latency.", "stage", buckets=(0.25, 1.0, 4.0))
+    child = latency.labels("read")
+    for value in (0.125, 0.25, 0.5, 2.0, 8.0):
+        child.observe(value)
+
+    lines = registry.render().splitlines()
+    # 境界ちょうどの値 (0.25) はそのバケットに入る (le = 以下)
+    assert lines[2:] == [
+        'test_seconds_bucket{stage="read",le="0.25"} 2',
+        'test_seconds_bucket{stage="read",le="1.0"} 3',
+        'test_seconds_bucket{stage="read",le="4.0"} 4',
+        'test_seconds_bucket{stage="read",le="+Inf"} 5',
+        'test_seconds_sum{stage="read"} 10.875',
+        'test_seconds_count{stage="read"} 5',
+    ]
+
+
+def test_bind_profiler_exports_stages_and_counters(monkeypatch):
+    monkeypatch.setattr(metrics.registry, "collectors", list(metrics.registry.collectors))
+    monkeypatch.setattr(metrics, "_bound_profilers", set())
+    profiler = ProfileLogger(debug=False)
+    metrics.bind_profiler(profiler)
+    metrics.bind_profiler(profiler) # 2回目は登録しない
+    assert profiler.listeners == [metrics.observe_stage]
+
+    before = metrics.stage_seconds.labels("test_bind_stage").count
+    with profiler.measure("test_bind_stage"):
+        pass
+    profiler.count("cache_hit", 3)
+    profiler.count('quote"d')
+
+    assert metrics.stage_seconds.labels("test_bind_stage").count == before + 1
+    lines = metrics.registry.render().splitlines()
+    assert lines.count("# TYPE autoshutter_profile_events_total counter") == 1
+    assert 'autoshutter_profile_events_total{event="cache_hit"} 3' in lines
+    assert 'autoshutter_profile_events_total{event="quote\\"d"} 1' in lines
+
+
+def test_server_serves_metrics_over_http():
+    registry = MetricsRegistry()
+    registry.counter("test_http_total", "Requests.").inc(7)
+    server = MetricsServer(0, registry=registry).start()
+    try:
+        url = f"http://127.0.0.1:{server.port}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            assert response.status == 200
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            body = response.read().decode("utf-8")
+        assert "test_http_total 7\n" in body
+
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+        assert e.value.code == 404
+    finally:
+        server.stop()
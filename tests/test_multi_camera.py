@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""マルチカメラ構成のブースが、状態ごとのキャプチャ設定のFPSでカメラとループを動かすかのテスト"""
+import cv2
+import numpy as np
+
+from capture_profiles import CaptureProfile, CaptureProfileSwitcher
+from capture_supervisor import CaptureSupervisor
+from fakes import make_pose
+from main import AppState, Config
+from multi_camera import CameraBooth
+from perception import PerceptionResult
+from test_capture_profiles import FakeCapture
+
+
+class GestureServer:
+    """常に丸ジェスチャーを返す推論サーバーの代わり"""
+    def submit(self, frame):
+        kpts = make_pose(320, 300)[None]
+        return PerceptionResult(np.array([[200, 100, 440, 460]], dtype=np.float32), kpts,
+                                gesture_flags=np.array([True]))
+
+
+def test_booth_runs_take_picture_at_profile_fps(tmp_path):
+    config = Config(METRICS_PORT=0, GOVERNOR_ENABLED=False, COUNTDOWN_SEC=1.0, MAX_PICTURE=1)
+    booth = CameraBooth(config, GestureServer(), None)
+    app = booth.app
+    cap = FakeCapture()
+    base = CaptureProfile(640, 480, 5, 80)
+    app.capture_switcher = CaptureProfileSwitcher(
+        cap, "cam", base, {"READY": base, "TAKE_PICTURE": CaptureProfile(640, 480, 15)},
+        cache_path=str(tmp_path / "profiles.json"))
+    app.capture_supervisor = CaptureSupervisor(cap.read, lambda: True)
+
+    app._transition_to(AppState.TAKE_PICTURE)
+    wait = booth.step()
+    # 遷移後の最初のフレームでカメラを15FPSにし、ループも15FPSの間隔で回す
+    assert cap.get(cv2.CAP_PROP_FPS) == 15
+    assert wait <= 1.0 / 15
+
+    frames = 1
+    while app.state == AppState.TAKE_PICTURE and frames < 100:
+        booth.step()
+        frames += 1
+    assert app.state == AppState.RESULT
+    assert app.taken_pictures_count == 1
+    # ジェスチャー推論 (1秒に1回) + 1秒のカウントダウン = 15FPSで約30フレーム (2秒)
+    assert frames <= 2 * 15 + 1
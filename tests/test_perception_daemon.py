@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""常駐推論サービス: UIの接続・切断を繰り返してもカメラ (リング) と推論が動き続ける"""
+import time
+
+from perception_daemon import PerceptionClient, PerceptionDaemon
+
+
+def test_clients_attach_and_detach_while_daemon_keeps_running(tmp_path):
+    socket_path = str(tmp_path / "perception.sock")
+    daemon = PerceptionDaemon(socket_path, "synthetic", {"fps": 30, "warmup_frames": 0}, shape=(480, 640, 3),
+                              simulate_ms=5.0)
+    daemon.start()
+    try:
+        assert PerceptionClient.try_attach(str(tmp_path / "missing.sock")) is None
+
+        last_seq = -1
+        detached_at = None
+        for _ in range(2): # UIの再起動を模擬する
+            started = time.perf_counter()
+            client = PerceptionClient.try_attach(socket_path)
+            assert client is not None
+            assert time.perf_counter() - started < 1.0
+
+            ret, frame = client.read_latest(timeout=5.0)
+            assert ret and frame.shape == (480, 640, 3)
+            assert client.last_seq > last_seq # 前のUIの切断後もフレームが進んでいる
+            last_seq = client.last_seq
+            assert client.capture_ns() is not None
+
+            deadline = time.monotonic() + 5.0
+            result = client.detect_circle_gesture(frame)
+            if detached_at is not None:
+                # 新しいUIの最初の要求に、前のUIのセッションの結果 (撮影の開始につながる) を返さない
+                assert result.captured_at is None or result.captured_at > detached_at
+            while result.captured_at is None and time.monotonic() < deadline:
+                time.sleep(0.02)
+                result = client.detect_circle_gesture(frame)
+            assert result.captured_at is not None # 推論プロセスの結果がソケット経由で届く
+            client.stop()
+            time.sleep(0.1)
+            detached_at = time.monotonic()
+            assert daemon.pipeline.last_results == {}
+        assert daemon.pipeline.task.value == 0 # UIがいなくなったら推論を止める
+    finally:
+        daemon.stop()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""背景差分・動的背景生成・シャッターエフェクト・UI描画の処理時間のテスト"""
+import numpy as np
+import pytest
+
+from background_subtractor import AdaptiveBackgroundSubtractor, FixedBackgroundSubtractor, StatisticalBackgroundSubtractor
+from burst_capture import BurstCapture
+from main import AppState, Config, PhotoBoothApp
+from test_dynamic_background import make_dynamic_background
+from fakes import synthetic_frame
+
+pytestmark = pytest.mark.perf
+
+
+@pytest.fixture
+def background():
+    return synthetic_frame(seed=10)
+
+
+@pytest.fixture
+def frame():
+    return synthetic_frame(seed=11)
+
+
+@pytest.fixture
+def app():
+    return PhotoBoothApp(Config(METRICS_PORT=0))
+
+
+def test_fixed_background_subtractor(perf, background, frame):
+    subtractor = FixedBackgroundSubtractor()
+    subtractor.set_background(background)
+    mask = subtractor.get_foreground_mask(frame)
+    assert mask.shape == frame.shape[:2]
+    assert mask.any()
+    perf("fixed_background_subtractor", lambda: subtractor.get_foreground_mask(frame))
+
+
+def test_adaptive_background_subtractor(perf, background, frame):
+    subtractor = AdaptiveBackgroundSubtractor()
+    subtractor.initialize_background(background)
+    assert subtractor.get_foreground_mask(frame).shape == frame.shape[:2]
+    perf("adaptive_background_subtractor", lambda: subtractor.get_foreground_mask(frame))
+
+
+def test_statistical_background_subtractor(perf, background, frame):
+    subtractor = StatisticalBackgroundSubtractor()
+    subtractor.initialize_background(background)
+    assert not subtractor.get_foreground_mask(background).any()
+    # 画面全体が明るくなっても前景で埋め尽くさず、背景をずらして合わせる
+    brighter = np.clip(background.astype(np.int16) + 40, 0, 255).astype(np.uint8)
+    assert (subtractor.get_foreground_mask(brighter) > 0).mean() < 0.01
+    assert subtractor.rebases == 1
+    mask = subtractor.get_foreground_mask(frame)
+    assert mask.shape == frame.shape[:2]
+    assert mask.any()
+
+    relative = perf("statistical_background_subtractor", lambda: subtractor.get_foreground_mask(frame))
+    # 全解像度の AdaptiveBackgroundSubtractor より軽いこと
+    assert relative < perf.baseline["adaptive_background_subtractor"]
+
+
+def test_dynamic_background_crop_resize(perf, background):
+    far = background[:, :, 1].copy()
+    generated = make_dynamic_background(far, 1.5, (640, 480))
+    assert generated.shape == (480, 640)
+    # 等倍ならクロップされず元の背景と同じ
+    assert np.array_equal(make_dynamic_background(far, 1.0, (640, 480)), far)
+    perf("dynamic_background_crop_resize", lambda: make_dynamic_background(far, 1.5, (640, 480)))
+
+
+def test_shutter_flash_rect(perf, app, frame):
+    flashed = frame.copy()
+    app._shutter_flash_rect(flashed, 1.0)
+    assert (flashed == 255).all()
+
+    work = frame.copy()
+    perf("shutter_flash_rect", lambda: app._shutter_flash_rect(work, 0.5))
+
+
+def test_draw_ui(perf, app, frame):
+    app.state = AppState.TAKE_PICTURE
+    app.state_timer = 10
+    work = frame.copy()
+    app._draw_ui(work)
+    assert not np.array_equal(work, frame)
+    perf("draw_ui_take_picture", lambda: app._draw_ui(work))
+
+
+def test_burst_add(perf, frame):
+    # カウントダウン中に毎フレーム行う、事前確保したバッファへのコピー
+    burst = BurstCapture(frame.shape, frames=5, before=2)
+    burst.arm()
+    for _ in range(5):
+        burst.add(frame)
+    assert burst.pool.available == 10 - 3
+    perf("burst_add", lambda: burst.add(frame))
+    burst.close()
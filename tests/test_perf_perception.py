@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""推論の後処理 (ジェスチャー判定・画面端判定) の正しさと処理時間のテスト。モデル出力はモック"""
+import pytest
+
+import detect_circle_gesture
+import measure_distance
+from backends import UltralyticsBackend
+from fakes import FakeModel, detect_results, pose_results, synthetic_frame
+
+pytestmark = pytest.mark.perf
+
+
+@pytest.fixture
+def frame():
+    return synthetic_frame(seed=1)
+
+
+@pytest.fixture
+def fake_pose_model(monkeypatch):
+    model = FakeModel(pose_results(people=4))
+    monkeypatch.setattr(detect_circle_gesture, "pose_model", UltralyticsBackend(model, batch_capable=False))
+    return model
+
+
+@pytest.fixture
+def fake_detect_model(monkeypatch):
+    model = FakeModel(detect_results(people=4))
+    monkeypatch.setattr(measure_distance, "model", UltralyticsBackend(model, batch_capable=False))
+    return model
+
+
+def test_detect_circle_gesture_flags(frame, fake_pose_model):
+    result = detect_circle_gesture.detect_circle_gesture(frame, seq=7)
+    assert result.seq == 7
+    assert result.keypoints.shape == (4, 17, 3)
+    assert result.gesture_flags.tolist() == [True, False, True, False]
+    assert result.gesture_detected
+
+
+def test_detect_circle_gesture_perf(perf, frame, fake_pose_model):
+    perf("detect_circle_gesture_postprocess_4people",
+         lambda: detect_circle_gesture.detect_circle_gesture(frame), number=200)
+
+
+def test_detect_person_distance_edges(frame, fake_detect_model):
+    result = measure_distance.detect_person_distance2sideedge(frame, 50, seq=3)
+    assert result.seq == 3
+    assert result.edge_flags.tolist() == [True, True, False, False]
+    assert result.is_at_edge
+
+
+def test_detect_person_distance_perf(perf, frame, fake_detect_model):
+    perf("detect_person_distance2sideedge_postprocess_4people",
+         lambda: measure_distance.detect_person_distance2sideedge(frame, 50), number=200)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""まとめて描画するレンダラーが、1人ずつ cv2.circle / cv2.line で描いた結果と一致するかのテストと、人数ごとの描画時間"""
+import cv2
+import numpy as np
+import pytest
+
+import renderer
+from fakes import detect_results, make_pose, synthetic_frame
+from perception import PerceptionResult
+
+
+def crowd(people: int) -> PerceptionResult:
+    """people人を画面内に格子状に並べた姿勢推定結果 (偶数番目の人が丸ジェスチャー)"""
+    kpts = np.stack([make_pose(80 + (i % 4) * 160, 200 + (i // 4) * 40, scale=30, circle=(i % 2 == 0))
+                     for i in range(people)])
+    boxes = np.stack([[k[:, 0].min(), k[:, 1].min(), k[:, 0].max(), k[:, 1].max()] for k in kpts])
+    return PerceptionResult(boxes, kpts, gesture_flags=np.arange(people) % 2 == 0)
+
+
+def draw_gesture_per_person(frame, result):
+    """以前の実装 (1人ずつ・関節ごとに描く)。検出時の文字は重ね描きすると濃くなるため1回だけ描く"""
+    for kpts, detected in zip(result.keypoints, result.gesture_flags):
+        if kpts[renderer.ARM_JOINTS, 2].min() < 0.5:
+            continue
+        joints = {i: (int(kpts[i][0]), int(kpts[i][1])) for i in renderer.ARM_JOINTS}
+        for x, y in joints.values():
+            cv2.circle(frame, (x, y), 6, (0, 255, 255), -1)
+        for a, b in ((5, 7), (7, 9), (6, 8), (8, 10)):
+            cv2.line(frame, joints[a], joints[b], (0, 255, 0), 2)
+        if detected:
+            cv2.line(frame, joints[9], joints[10], (0, 0, 255), 4)
+    if result.gesture_detected:
+        cv2.putText(frame, "MARU (CIRCLE) DETECTED!", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 3)
+    return frame
+
+
+def test_draw_gesture_matches_per_person_drawing():
+    result = crowd(4)
+    result.keypoints[3, 9, 2] = 0.1 # 手首の信頼度が低い人は描かない
+    frame = synthetic_frame(seed=3)
+    expected = draw_gesture_per_person(frame.copy(), result)
+    actual = renderer.draw_gesture(frame.copy(), result)
+    assert np.array_equal(actual, expected)
+
+
+def test_joints_near_the_border_are_clipped():
+    result = crowd(1)
+    result.keypoints[0, renderer.ARM_JOINTS, 0] = [0, 639, 2, 637, 1, 638]
+    frame = synthetic_frame(seed=4)
+    expected = draw_gesture_per_person(frame.copy(), result)
+    assert np.array_equal(renderer.draw_gesture(frame.copy(), result), expected)
+
+
+def test_draw_person_boxes_matches_per_person_drawing():
+    fake = detect_results(people=4)
+    result = PerceptionResult(fake.boxes.xyxy.numpy(), edge_flags=np.array([True, True, False, False]))
+    frame = synthetic_frame(seed=5)
+    expected = frame.copy()
+    for box, edge in zip(result.boxes, result.edge_flags):
+        x1, y1, x2, y2 = map(int, box)
+        cv2.rectangle(expected, (x1, y1), (x2, y2), (0, 0, 255) if edge else (0, 255, 0), 2)
+    cv2.line(expected, (50, 0), (50, 480), (200, 200, 200), 1)
+    cv2.line(expected, (590, 0), (590, 480), (200, 200, 200), 1)
+
+    actual = renderer.draw_person_boxes(frame.copy(), result, 50, cheap=True)
+    assert np.array_equal(actual, expected)
+
+
+@pytest.mark.perf
+@pytest.mark.parametrize("people", [1, 4, 16])
+def test_draw_gesture_perf(perf, people):
+    result = crowd(people)
+    work = synthetic_frame(seed=6)
+    perf(f"render_gesture_{people}people", lambda: renderer.draw_gesture(work, result), number=200)
+
+
+@pytest.mark.perf
+@pytest.mark.parametrize("people", [1, 4, 16])
+def test_draw_person_boxes_perf(perf, people):
+    result = crowd(people)
+    result.edge_flags = np.arange(people) % 4 == 0
+    work = synthetic_frame(seed=7)
+    perf(f"render_person_boxes_{people}people", lambda: renderer.draw_person_boxes(work, result, 50), number=200)